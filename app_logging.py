@@ -1,20 +1,102 @@
 from __future__ import annotations
 
+import atexit
+import copy
+import json
 import logging
 import logging.handlers
+import os
+import queue
 import sys
 from pathlib import Path
 
+# Records waiting for the writer thread; beyond this they are dropped and counted instead of blocking the caller.
+LOG_QUEUE_SIZE = 10000
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
 _INITIALIZED = False
 _LOG_FILE: Path | None = None
 
 
+class JsonLineFormatter(logging.Formatter):
+    """每条记录输出一行 JSON，便于程序解析。"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """把记录放入有界队列，由后台线程写盘；队列满时丢弃并计数，调用线程从不等待。"""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The message is rendered on the calling thread, so the writer never sees arguments mutated later.
+        message = record.getMessage()
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        # Called under the handler lock, so the counter needs no lock of its own.
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped:
+            notice = logging.LogRecord(
+                "vediozip.logging",
+                logging.WARNING,
+                __file__,
+                0,
+                "Log records dropped, queue full. count=%s",
+                (self.dropped,),
+                None,
+            )
+            try:
+                self.queue.put_nowait(self.prepare(notice))
+                self.dropped = 0
+            except queue.Full:
+                pass
+
+
+class _DrainingQueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # The default put_nowait fails on a full queue at exit and the queued records would be lost.
+        self.queue.put(self._sentinel)
+
+
 def get_runtime_root() -> Path:
     if getattr(sys, "frozen", False):
         return Path(sys.executable).resolve().parent
     return Path(__file__).resolve().parent
 
 
+def get_cache_dir() -> Path:
+    cache_dir = get_runtime_root() / "cache"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
 def get_log_file_path() -> Path:
     global _LOG_FILE
     if _LOG_FILE is None:
@@ -40,20 +122,39 @@ def setup_logging() -> Path:
 
     file_handler = logging.handlers.RotatingFileHandler(
         filename=log_file,
-        maxBytes=5 * 1024 * 1024,
-        backupCount=3,
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=LOG_BACKUP_COUNT,
         encoding="utf-8",
     )
     file_handler.setFormatter(formatter)
-    root.addHandler(file_handler)
+    handlers: list[logging.Handler] = [file_handler]
+
+    # VEDIOZIP_LOG_JSON=1 also writes every record as a JSON line next to the text log.
+    json_file = log_file.with_suffix(".jsonl") if os.environ.get("VEDIOZIP_LOG_JSON") == "1" else None
+    if json_file is not None:
+        json_handler = logging.handlers.RotatingFileHandler(
+            filename=json_file,
+            maxBytes=LOG_MAX_BYTES,
+            backupCount=LOG_BACKUP_COUNT,
+            encoding="utf-8",
+        )
+        json_handler.setFormatter(JsonLineFormatter())
+        handlers.append(json_handler)
 
     if getattr(sys, "stderr", None) is not None and hasattr(sys.stderr, "write"):
         stream_handler = logging.StreamHandler(sys.stderr)
         stream_handler.setFormatter(formatter)
-        root.addHandler(stream_handler)
+        handlers.append(stream_handler)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    listener = _DrainingQueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Registered after logging's own hook, so it runs first and drains the queue before handlers close.
+    atexit.register(listener.stop)
+    root.addHandler(_NonBlockingQueueHandler(log_queue))
 
     _INITIALIZED = True
-    root.info("Logging initialized. log_file=%s", log_file)
+    root.info("Logging initialized. log_file=%s json_log=%s", log_file, json_file)
     return log_file
 
 
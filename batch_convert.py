@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import argparse
+import json
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+
+from app_logging import get_logger
+from job_store import JobStore
+from preset_tuner import DEFAULT_TARGET_SPEED
+from speed_profiles import DEFAULT_PROFILE, PROFILES
+from video_service import DEFAULT_SEGMENT_WORKERS, MAX_CONCURRENCY, TERMINAL_STATUSES, VideoConvertService
+
+logger = get_logger("vediozip.batch")
+
+
+class ZhArgumentParser(argparse.ArgumentParser):
+    """将 argparse 默认帮助中的 usage 文案替换为中文。"""
+
+    def format_help(self) -> str:
+        return super().format_help().replace("usage: ", "用法: ", 1)
+
+    def format_usage(self) -> str:
+        return super().format_usage().replace("usage: ", "用法: ", 1)
+
+
+def emit(event: str, **fields) -> None:
+    """向标准输出写一行 JSON 事件；日志走标准错误，不会混入。"""
+    sys.stdout.write(json.dumps({"event": event, "time": time.time(), **fields}, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def build_parser() -> ZhArgumentParser:
+    parser = ZhArgumentParser(
+        description="不启动 Web 服务，批量转换文件或文件夹，并以 JSON Lines 输出进度。",
+        add_help=False,
+    )
+    parser._positionals.title = "位置参数"
+    parser._optionals.title = "可选参数"
+    parser.add_argument("-h", "--help", action="help", help="显示帮助信息并退出")
+    parser.add_argument("inputs", nargs="+", help="输入视频文件或文件夹，可指定多个")
+    parser.add_argument("-o", "--output-dir", required=True, help="输出目录（不存在时自动创建）")
+    parser.add_argument("--height", type=int, default=320, help="目标高度")
+    parser.add_argument("--crf", type=int, default=23, help="视频 CRF 质量参数")
+    parser.add_argument("--preset", default="medium", help="x264 编码预设，或 auto 自动选择")
+    parser.add_argument(
+        "--profile",
+        choices=list(PROFILES),
+        default=DEFAULT_PROFILE,
+        help="速度档位：缩放算法与 x264 调优参数的组合",
+    )
+    parser.add_argument("--audio-bitrate", default="128k", help="音频码率")
+    parser.add_argument("--suffix-mode", choices=["default", "none", "custom"], default="default", help="输出文件名后缀模式")
+    parser.add_argument("--custom-suffix", default="", help="自定义后缀（--suffix-mode custom 时使用）")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help=f"同时编码的文件数（1-{MAX_CONCURRENCY}）")
+    parser.add_argument("--incremental", action="store_true", help="跳过输出清单中已是最新的文件")
+    parser.add_argument("--no-stream-copy", action="store_true", help="始终重新编码，不直接复制已满足目标的流")
+    parser.add_argument("--segment-seconds", type=int, default=0, help="长视频分段并行编码的分段时长（0 为关闭）")
+    parser.add_argument("--segment-workers", type=int, default=DEFAULT_SEGMENT_WORKERS, help="分段并行数")
+    parser.add_argument("--target-speed", type=float, default=DEFAULT_TARGET_SPEED, help="auto 预设的目标吞吐倍数")
+    parser.add_argument(
+        "--rendition",
+        action="append",
+        default=[],
+        metavar="HEIGHT[:CRF[:SUFFIX]]",
+        help="一次解码同时输出多个清晰度，可重复；指定后取代 --height",
+    )
+    parser.add_argument("--scratch-dir", default="", help="本地暂存目录：先在此编码，完成后在后台移动到输出目录")
+    parser.add_argument("--no-dedup", action="store_true", help="不识别重复的源文件，每个文件单独编码")
+    parser.add_argument("--interval", type=float, default=1.0, help="进度事件的最短间隔（秒）")
+    return parser
+
+
+def parse_rendition(value: str) -> dict:
+    height, _, rest = value.partition(":")
+    crf, _, suffix = rest.partition(":")
+    try:
+        return {"height": int(height), "crf": int(crf) if crf else None, "suffix": suffix}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无法识别的清晰度: {value}") from None
+
+
+def main() -> int:
+    parser = build_parser()
+    args = parser.parse_args()
+    try:
+        renditions = [parse_rendition(value) for value in args.rendition]
+    except argparse.ArgumentTypeError as exc:
+        parser.error(str(exc))
+    output_dir = Path(args.output_dir).expanduser()
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Each input is its own job, so the -j encode slots are split between the inputs that run at once:
+    # single files encode side by side, and one folder alone gets all of them.
+    running_jobs = max(1, min(args.jobs, len(args.inputs)))
+    concurrency = args.jobs // running_jobs
+    # Without a database an evicted job is gone, so every job of this run stays in memory until reported.
+    job_store = JobStore(max_hot=len(args.inputs), hot_ttl_seconds=float("inf"))
+    service = VideoConvertService(
+        max_running_jobs=running_jobs,
+        max_queued_jobs=len(args.inputs),
+        job_store=job_store,
+    )
+    jobs: dict[str, str] = {}
+    for source in args.inputs:
+        try:
+            job_id = service.start_job(
+                source_path=source,
+                output_dir=str(output_dir),
+                height=args.height,
+                crf=args.crf,
+                preset=args.preset,
+                audio_bitrate=args.audio_bitrate,
+                suffix_mode=args.suffix_mode,
+                custom_suffix=args.custom_suffix,
+                concurrency=concurrency,
+                incremental=args.incremental,
+                stream_copy=not args.no_stream_copy,
+                segment_seconds=args.segment_seconds,
+                segment_workers=args.segment_workers,
+                target_speed=args.target_speed,
+                renditions=renditions,
+                scratch_dir=args.scratch_dir,
+                deduplicate=not args.no_dedup,
+                profile=args.profile,
+            )
+        except ValueError as exc:
+            emit("rejected", source=source, error=str(exc))
+            continue
+        jobs[job_id] = source
+        emit("queued", job_id=job_id, source=source)
+
+    interrupted = threading.Event()
+
+    def on_interrupt(signum, frame) -> None:
+        interrupted.set()
+
+    signal.signal(signal.SIGINT, on_interrupt)
+
+    results: dict[str, str] = {}
+    revisions: dict[str, int] = {}
+    reported_files: set[tuple[str, str]] = set()
+    last_emit: dict[str, float] = {}
+    while len(results) < len(jobs):
+        if interrupted.is_set():
+            for job_id in jobs.keys() - results.keys():
+                try:
+                    service.cancel_job(job_id)
+                except ValueError:
+                    pass
+            interrupted.clear()
+
+        for job_id, source in jobs.items():
+            if job_id in results or service.get_job_revision(job_id) == revisions.get(job_id):
+                continue
+            job = service.get_job(job_id, detail=True)
+            if job is None:
+                # Not expected with the store above; still end the job rather than wait for it forever.
+                results[job_id] = "failed"
+                emit("end", job_id=job_id, source=source, status="failed", error="任务记录已丢失")
+                logger.error("Batch job lost. job_id=%s source=%s", job_id, source)
+                continue
+            revisions[job_id] = job["revision"]
+
+            for file_path, telemetry in job["file_telemetry"].items():
+                if telemetry.get("done") and (job_id, file_path) not in reported_files:
+                    reported_files.add((job_id, file_path))
+                    emit(
+                        "file",
+                        job_id=job_id,
+                        file=file_path,
+                        stream_mode=job["stream_modes"].get(file_path),
+                        telemetry=telemetry,
+                    )
+
+            now = time.monotonic()
+            if job["status"] in TERMINAL_STATUSES:
+                results[job_id] = job["status"]
+                emit(
+                    "end",
+                    job_id=job_id,
+                    source=source,
+                    status=job["status"],
+                    error=job["error"],
+                    processed_files=job["processed_files"],
+                    skipped_files=job["skipped_files"],
+                    deduplicated_files=job["deduplicated_files"],
+                    total_files=job["total_files"],
+                    elapsed_seconds=job["elapsed_seconds"],
+                    telemetry=job["telemetry"],
+                )
+            elif now - last_emit.get(job_id, 0.0) >= args.interval:
+                last_emit[job_id] = now
+                emit(
+                    "progress",
+                    job_id=job_id,
+                    source=source,
+                    status=job["status"],
+                    progress=job["progress"],
+                    processed_files=job["processed_files"],
+                    total_files=job["total_files"],
+                    discovery_complete=job["discovery_complete"],
+                    active_files=job["active_files"],
+                    speed=job["telemetry"].get("speed"),
+                    eta_seconds=job["eta_seconds"],
+                    queue_position=job["queue_position"],
+                )
+        time.sleep(0.1)
+
+    counts = {status: list(results.values()).count(status) for status in sorted(TERMINAL_STATUSES)}
+    emit("summary", jobs=len(jobs), rejected=len(args.inputs) - len(jobs), **counts)
+    logger.info("Batch finished. results=%s", counts)
+    if counts["cancelled"]:
+        return 130
+    return 0 if counts["completed"] == len(args.inputs) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+
+ESTIMATE_CONFIDENCE = 0.9
+# Two-sided 90% normal quantile.
+Z_SCORE = 1.645
+# Short trials and a handful of past files never pin the speed down better than this.
+MIN_MODEL_ERROR = 0.1
+# Used when a quantity rests on a single observation and its spread is unknown.
+SINGLE_OBSERVATION_ERROR = 0.3
+
+
+@dataclass(frozen=True)
+class SpeedModel:
+    """一类文件（相同源清晰度与编码参数）的速度与码率模型，来自试编码与历史记录。"""
+
+    speed: float
+    bitrate: float
+    time_error: float
+    size_error: float
+    trials: int
+    history: int
+
+    @classmethod
+    def from_observations(cls, observations: list[dict], trials: int) -> SpeedModel:
+        # Encode time adds up as media/speed, so speeds are combined through their inverse.
+        costs = [1.0 / item["speed"] for item in observations if item["speed"] > 0]
+        bitrates = [item["bitrate"] for item in observations]
+        cost = sum(costs) / len(costs) if costs else 0.0
+        return cls(
+            speed=1.0 / cost if cost > 0 else 0.0,
+            bitrate=sum(bitrates) / len(bitrates) if bitrates else 0.0,
+            time_error=_mean_error(costs),
+            size_error=_mean_error(bitrates),
+            trials=trials,
+            history=len(observations) - trials,
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "speed": self.speed,
+            "bitrate": self.bitrate,
+            "time_error": self.time_error,
+            "size_error": self.size_error,
+            "trials": self.trials,
+            "history": self.history,
+        }
+
+
+@dataclass(frozen=True)
+class SampledFile:
+    """抽样探测的一个文件：媒体时长、预计编码耗时（单进程秒）与输出字节数。"""
+
+    source_bytes: int
+    media_seconds: float
+    encode_seconds: float
+    output_bytes: float
+    time_error: float
+    size_error: float
+
+
+def _mean_error(values: list[float]) -> float:
+    """均值的相对标准误差，不低于 MIN_MODEL_ERROR。"""
+    if len(values) < 2:
+        return SINGLE_OBSERVATION_ERROR
+    mean = sum(values) / len(values)
+    if mean <= 0:
+        return SINGLE_OBSERVATION_ERROR
+    variance = sum((value - mean) ** 2 for value in values) / (len(values) - 1)
+    return max(MIN_MODEL_ERROR, math.sqrt(variance / len(values)) / mean)
+
+
+def _ratio_total(values: list[float], sizes: list[int], population: int, population_bytes: int) -> tuple[float, float]:
+    """按文件大小的比率估计推算总量，返回 (总量, 抽样相对误差)。"""
+    n = len(values)
+    size_sum = sum(sizes)
+    if n == 0 or size_sum <= 0:
+        return 0.0, 0.0
+    ratio = sum(values) / size_sum
+    total = ratio * population_bytes
+    if n >= population or total <= 0:
+        return total, 0.0
+    if n < 2:
+        return total, SINGLE_OBSERVATION_ERROR
+    residual = sum((value - ratio * size) ** 2 for value, size in zip(values, sizes)) / (n - 1)
+    mean_size = size_sum / n
+    # Standard error of the ratio estimator, with the finite population correction.
+    error = math.sqrt((1 - n / population) * residual / n) / mean_size * population_bytes
+    return total, error / total
+
+
+def _bounds(value: float, relative_error: float) -> dict:
+    spread = Z_SCORE * relative_error * value
+    return {"estimate": value, "low": max(0.0, value - spread), "high": value + spread}
+
+
+def estimate_batch(samples: list[SampledFile], files: int, source_bytes: int, concurrency: int) -> dict:
+    """由抽样文件推算整批的媒体时长、墙钟时间与输出大小，并给出置信区间。"""
+    sizes = [sample.source_bytes for sample in samples]
+    media, media_error = _ratio_total([sample.media_seconds for sample in samples], sizes, files, source_bytes)
+    encode, encode_error = _ratio_total([sample.encode_seconds for sample in samples], sizes, files, source_bytes)
+    output, output_error = _ratio_total([sample.output_bytes for sample in samples], sizes, files, source_bytes)
+
+    # Model errors of the classes, weighted by how much each sample contributes.
+    encode_sum = sum(sample.encode_seconds for sample in samples)
+    output_sum = sum(sample.output_bytes for sample in samples)
+    time_model = sum(sample.encode_seconds * sample.time_error for sample in samples) / encode_sum if encode_sum > 0 else 0.0
+    size_model = sum(sample.output_bytes * sample.size_error for sample in samples) / output_sum if output_sum > 0 else 0.0
+
+    # Parallel encodes split the core budget, so per-process time divides by the number running at once.
+    parallel = max(1, min(concurrency, files))
+    return {
+        "confidence": ESTIMATE_CONFIDENCE,
+        "media_seconds": _bounds(media, media_error),
+        "wall_seconds": _bounds(encode / parallel, math.hypot(encode_error, time_model)),
+        "output_bytes": _bounds(output, math.hypot(output_error, size_model)),
+    }
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from app_logging import get_logger
+from resource_policy import ResourcePolicy
+from tool_registry import ToolRegistry
+from video_service import TERMINAL_STATUSES, VideoConvertService
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = get_logger("vediozip.benchmark")
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    width: int
+    height: int
+    duration: float
+    file_count: int
+    depth: int
+
+
+SCENARIOS = [
+    Scenario(name="many-small", width=640, height=360, duration=3, file_count=24, depth=2),
+    Scenario(name="few-hd", width=1280, height=720, duration=10, file_count=4, depth=1),
+    Scenario(name="single-long-fhd", width=1920, height=1080, duration=60, file_count=1, depth=0),
+]
+QUICK_SCENARIOS = [
+    Scenario(name="many-small", width=640, height=360, duration=2, file_count=8, depth=2),
+    Scenario(name="single-hd", width=1280, height=720, duration=10, file_count=1, depth=0),
+]
+
+
+def _peak_rss_kb() -> dict:
+    # Peaks since the process started, so each scenario's service runs in a fresh process.
+    if resource is None:
+        return {"self_kb": None, "children_kb": None}
+    scale = 1 / 1024 if sys.platform == "darwin" else 1
+    return {
+        "self_kb": int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale),
+        "children_kb": int(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale),
+    }
+
+
+def generate_inputs(ffmpeg_path: Path, scenario: Scenario, root: Path) -> tuple[Path, list[Path]]:
+    """用 lavfi 测试源生成合成输入；参数相同的输入会被复用。"""
+    scenario_dir = root / f"{scenario.name}-{scenario.width}x{scenario.height}-{scenario.duration}s-{scenario.file_count}f-d{scenario.depth}"
+    files: list[Path] = []
+    for index in range(scenario.file_count):
+        folder = scenario_dir
+        for level in range(index % (scenario.depth + 1)):
+            folder = folder / f"level{level + 1}"
+        folder.mkdir(parents=True, exist_ok=True)
+        target = folder / f"clip_{index:04d}.mp4"
+        files.append(target)
+        if target.exists():
+            continue
+        cmd = [
+            str(ffmpeg_path),
+            "-y",
+            "-v",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc2=size={scenario.width}x{scenario.height}:rate=30:duration={scenario.duration}",
+            "-f",
+            "lavfi",
+            "-i",
+            f"sine=frequency={220 + index}:duration={scenario.duration}",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "ultrafast",
+            "-c:a",
+            "aac",
+            "-shortest",
+            str(target),
+        ]
+        subprocess.run(cmd, check=True)
+    return scenario_dir, files
+
+
+def run_bare_ffmpeg(ffmpeg_path: Path, files: list[Path], output_dir: Path, args: argparse.Namespace) -> float:
+    """不经过服务、逐个直接调用 ffmpeg 的基线耗时；线程数与优先级和服务的编码进程一致。"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    policy = ResourcePolicy.from_env()
+    threads = str(policy.threads_for(args.concurrency))
+    started = time.perf_counter()
+    for index, input_file in enumerate(files):
+        cmd = [
+            str(ffmpeg_path),
+            "-y",
+            "-v",
+            "error",
+            "-filter_threads",
+            threads,
+            "-i",
+            str(input_file),
+            "-vf",
+            f"scale=-2:{args.height}",
+            "-c:v",
+            "libx264",
+            "-crf",
+            str(args.crf),
+            "-preset",
+            args.preset,
+            "-c:a",
+            "aac",
+            "-b:a",
+            args.audio_bitrate,
+            "-threads",
+            threads,
+            str(output_dir / f"bare_{index:04d}.mp4"),
+        ]
+        process = subprocess.Popen(policy.wrap_command(cmd), creationflags=policy.creationflags())
+        policy.apply(process)
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, cmd)
+    return time.perf_counter() - started
+
+
+def run_service(source_dir: Path, output_dir: Path, args: argparse.Namespace) -> dict:
+    """在子进程中运行：使用独立的空缓存目录，并关闭去重与增量，每次测得的都是完整转换。"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="vediozip-benchmark-cache-") as cache_dir:
+        service = VideoConvertService(cache_dir=Path(cache_dir))
+        result = _run_service_job(service, source_dir, output_dir, args)
+    result["peak_rss_kb"] = _peak_rss_kb()
+    return result
+
+
+def _run_service_job(service: VideoConvertService, source_dir: Path, output_dir: Path, args: argparse.Namespace) -> dict:
+    started = time.perf_counter()
+    job_id = service.start_job(
+        source_path=str(source_dir),
+        output_dir=str(output_dir),
+        height=args.height,
+        crf=args.crf,
+        preset=args.preset,
+        audio_bitrate=args.audio_bitrate,
+        concurrency=args.concurrency,
+        incremental=False,
+        stream_copy=False,
+        deduplicate=False,
+    )
+    first_progress = None
+    while True:
+        job = service.get_job(job_id)
+        if first_progress is None and (job["progress"] > 0 or job["processed_files"] > 0):
+            first_progress = time.perf_counter() - started
+        if job["status"] in TERMINAL_STATUSES:
+            break
+        time.sleep(0.02)
+    wall = time.perf_counter() - started
+    if job["status"] != "completed":
+        raise RuntimeError(f"Benchmark job {job['status']}: {job['error']}")
+    return {"wall_seconds": wall, "time_to_first_progress": first_progress}
+
+
+def run_scenario(
+    ffmpeg_path: Path,
+    scenario: Scenario,
+    work_dir: Path,
+    args: argparse.Namespace,
+) -> dict:
+    scenario_dir, files = generate_inputs(ffmpeg_path, scenario, work_dir / "inputs")
+    source = files[0] if scenario.file_count == 1 else scenario_dir
+    output_root = work_dir / "outputs" / scenario.name
+    shutil.rmtree(output_root, ignore_errors=True)
+
+    media_seconds = scenario.duration * scenario.file_count
+    bare_wall = None if args.skip_bare else run_bare_ffmpeg(ffmpeg_path, files, output_root / "bare", args)
+    # Spawned rather than forked, so the peak RSS below belongs to this scenario alone.
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        service_result = pool.submit(run_service, source, output_root / "service", args).result()
+    wall = service_result["wall_seconds"]
+
+    result = {
+        "scenario": asdict(scenario),
+        "media_seconds": media_seconds,
+        "wall_seconds": wall,
+        "speed_x_realtime": media_seconds / wall if wall > 0 else None,
+        "time_to_first_progress": service_result["time_to_first_progress"],
+        "bare_ffmpeg_wall_seconds": bare_wall,
+        "overhead_per_file_seconds": None if bare_wall is None else (wall - bare_wall) / scenario.file_count,
+        "peak_rss_kb": service_result["peak_rss_kb"],
+    }
+    logger.info("Benchmark scenario done. result=%s", result)
+    if not args.keep_outputs:
+        shutil.rmtree(output_root, ignore_errors=True)
+    return result
+
+
+def compare(current: dict, baseline_file: Path) -> None:
+    baseline = json.loads(baseline_file.read_text(encoding="utf-8"))
+    previous = {item["scenario"]["name"]: item for item in baseline.get("results", [])}
+    for item in current["results"]:
+        name = item["scenario"]["name"]
+        old = previous.get(name)
+        if old is None:
+            print(f"{name}: 基线中无此场景")
+            continue
+        ratio = item["wall_seconds"] / old["wall_seconds"] if old["wall_seconds"] else float("nan")
+        print(f"{name}: 耗时 {old['wall_seconds']:.2f}s -> {item['wall_seconds']:.2f}s (x{ratio:.3f})")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="VedioZip 转换流水线基准测试（合成输入，结果输出为 JSON）。")
+    parser.add_argument("--output", default="benchmark-results.json", help="结果 JSON 路径")
+    parser.add_argument("--work-dir", help="输入/输出工作目录（默认使用临时目录，生成的输入可复用）")
+    parser.add_argument("--quick", action="store_true", help="只运行较小的场景")
+    parser.add_argument("--scenario", action="append", help="只运行指定名称的场景，可重复")
+    parser.add_argument("--height", type=int, default=320, help="目标高度")
+    parser.add_argument("--crf", type=int, default=23, help="视频 CRF 质量参数")
+    parser.add_argument("--preset", default="veryfast", help="x264 编码预设")
+    parser.add_argument("--audio-bitrate", default="128k", help="音频码率")
+    parser.add_argument("--concurrency", type=int, default=1, help="每个任务的并行文件数")
+    parser.add_argument("--skip-bare", action="store_true", help="跳过直接调用 ffmpeg 的基线测量")
+    parser.add_argument("--keep-outputs", action="store_true", help="保留转换输出")
+    parser.add_argument("--compare", help="与之前的结果 JSON 对比")
+    args = parser.parse_args()
+
+    ffmpeg_path = ToolRegistry().resolve("ffmpeg")
+    if ffmpeg_path is None:
+        print("未找到可用的 ffmpeg。", file=sys.stderr)
+        return 3
+
+    scenarios = QUICK_SCENARIOS if args.quick else SCENARIOS
+    if args.scenario:
+        scenarios = [item for item in scenarios if item.name in set(args.scenario)]
+
+    work_dir = Path(args.work_dir) if args.work_dir else Path(tempfile.gettempdir()) / "vediozip-benchmark"
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    results = []
+    for scenario in scenarios:
+        print(f"运行场景: {scenario.name}")
+        results.append(run_scenario(ffmpeg_path, scenario, work_dir, args))
+
+    report = {
+        "created_at": time.time(),
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "python": platform.python_version(),
+        },
+        "settings": {
+            "height": args.height,
+            "crf": args.crf,
+            "preset": args.preset,
+            "audio_bitrate": args.audio_bitrate,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    for item in results:
+        print(
+            f"{item['scenario']['name']}: {item['wall_seconds']:.2f}s, "
+            f"{item['speed_x_realtime']:.2f}x 实时, 首次进度 {item['time_to_first_progress']}"
+        )
+    print(f"结果已写入: {args.output}")
+
+    if args.compare:
+        compare(report, Path(args.compare))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from app_logging import get_logger
+
+MANIFEST_NAME = ".vediozip-manifest.jsonl"
+
+
+class ConversionManifest:
+    """输出目录中的增量转换清单，记录每个输出对应的源文件指纹与编码参数。
+
+    清单为追加写入的 JSON Lines，同一输出以最后一行为准，中断后可从已完成的文件继续。
+    """
+
+    def __init__(self, output_dir: Path) -> None:
+        self._logger = get_logger("vediozip.manifest")
+        self._output_dir = output_dir
+        self._path = output_dir / MANIFEST_NAME
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        self._load()
+
+    def is_up_to_date(self, input_file: Path, output_file: Path, params: dict) -> bool:
+        entry = self._entries.get(self._key(output_file))
+        if entry is None or entry.get("params") != params:
+            return False
+        try:
+            source_stat = input_file.stat()
+            output_stat = output_file.stat()
+        except OSError:
+            return False
+        return (
+            entry.get("source") == str(input_file)
+            and entry.get("source_size") == source_stat.st_size
+            and entry.get("source_mtime_ns") == source_stat.st_mtime_ns
+            and entry.get("output_size") == output_stat.st_size
+            and entry.get("output_mtime_ns") == output_stat.st_mtime_ns
+        )
+
+    def record(self, input_file: Path, output_file: Path, params: dict) -> None:
+        source_stat = input_file.stat()
+        output_stat = output_file.stat()
+        key = self._key(output_file)
+        entry = {
+            "output": key,
+            "source": str(input_file),
+            "source_size": source_stat.st_size,
+            "source_mtime_ns": source_stat.st_mtime_ns,
+            "output_size": output_stat.st_size,
+            "output_mtime_ns": output_stat.st_mtime_ns,
+            "params": params,
+            "completed_at": time.time(),
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._entries[key] = entry
+            with self._path.open("a", encoding="utf-8") as handle:
+                handle.write(line + "\n")
+                handle.flush()
+                os.fsync(handle.fileno())
+
+    def _key(self, output_file: Path) -> str:
+        return output_file.relative_to(self._output_dir).as_posix()
+
+    def _load(self) -> None:
+        if not self._path.exists():
+            return
+        line_count = 0
+        with self._path.open("r", encoding="utf-8", errors="replace") as handle:
+            for line in handle:
+                line_count += 1
+                try:
+                    entry = json.loads(line)
+                    self._entries[entry["output"]] = entry
+                except (ValueError, KeyError, TypeError):
+                    # A batch killed mid-write leaves a truncated last line.
+                    self._logger.warning("Skip broken manifest line. path=%s line=%s", self._path, line_count)
+        if line_count > 2 * len(self._entries) + 100:
+            self._compact()
+
+    def _compact(self) -> None:
+        temp_path = self._path.with_name(self._path.name + ".tmp")
+        with temp_path.open("w", encoding="utf-8") as handle:
+            for entry in self._entries.values():
+                handle.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(temp_path, self._path)
+        self._logger.info("Manifest compacted. path=%s entries=%s", self._path, len(self._entries))
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from app_logging import get_cache_dir, get_logger
+from preset_tuner import height_class, machine_key
+
+# Recent files kept per encode key; older ones say little about the current machine and ffmpeg.
+MAX_ENTRIES_PER_KEY = 200
+# The file is rewritten with only the kept entries once it holds this many more lines.
+COMPACT_EXTRA_LINES = 2000
+
+
+def history_key(
+    source_height: int | None,
+    heights: list[int],
+    crfs: list[int],
+    preset: str,
+    profile: str,
+    threads: int | None,
+    mode: str,
+) -> str:
+    return "|".join(
+        [
+            f"src={height_class(source_height)}",
+            "h=" + ",".join(str(value) for value in heights),
+            "crf=" + ",".join(str(value) for value in crfs),
+            f"preset={preset}",
+            f"profile={profile}",
+            f"threads={threads or 'auto'}",
+            f"mode={mode}",
+        ]
+    )
+
+
+class EncodeHistory:
+    """按机器记录已完成文件的实际编码速度与输出码率，供批量预估使用。
+
+    记录为追加写入的 JSON Lines（cache/encode_history.jsonl），每个编码键只保留最近的若干条。
+    """
+
+    def __init__(self, history_file: Path | None = None) -> None:
+        self._logger = get_logger("vediozip.history")
+        self._path = history_file or get_cache_dir() / "encode_history.jsonl"
+        self._lock = threading.Lock()
+        self._entries: dict[str, deque[dict]] | None = None
+        self._lines = 0
+
+    def record(self, key: str, media_seconds: float, encode_seconds: float, output_bytes: int) -> None:
+        if media_seconds <= 0 or encode_seconds <= 0:
+            return
+        entry = {
+            "machine": machine_key(),
+            "key": key,
+            "media_seconds": media_seconds,
+            "encode_seconds": encode_seconds,
+            "output_bytes": output_bytes,
+            "completed_at": time.time(),
+        }
+        with self._lock:
+            entries = self._load()
+            entries.setdefault(key, deque(maxlen=MAX_ENTRIES_PER_KEY)).append(entry)
+            try:
+                with self._path.open("a", encoding="utf-8") as handle:
+                    handle.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self._lines += 1
+                if self._lines > sum(len(items) for items in entries.values()) + COMPACT_EXTRA_LINES:
+                    self._compact(entries)
+            except OSError:
+                self._logger.exception("Encode history write failed. path=%s", self._path)
+
+    def observations(self, key: str) -> list[dict]:
+        """返回该编码键的历史记录：speed（媒体秒/编码秒）与 bitrate（bit/s）。"""
+        with self._lock:
+            entries = list(self._load().get(key, ()))
+        return [
+            {
+                "speed": entry["media_seconds"] / entry["encode_seconds"],
+                "bitrate": entry["output_bytes"] * 8 / entry["media_seconds"],
+            }
+            for entry in entries
+        ]
+
+    def _load(self) -> dict[str, deque[dict]]:
+        if self._entries is not None:
+            return self._entries
+        self._entries = {}
+        machine = machine_key()
+        try:
+            with self._path.open("r", encoding="utf-8", errors="replace") as handle:
+                for line in handle:
+                    self._lines += 1
+                    try:
+                        entry = json.loads(line)
+                        if entry["machine"] != machine or entry["media_seconds"] <= 0 or entry["encode_seconds"] <= 0:
+                            continue
+                        self._entries.setdefault(entry["key"], deque(maxlen=MAX_ENTRIES_PER_KEY)).append(entry)
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except FileNotFoundError:
+            pass
+        except OSError:
+            self._logger.warning("Encode history unreadable, ignoring. path=%s", self._path)
+        return self._entries
+
+    def _compact(self, entries: dict[str, deque[dict]]) -> None:
+        # Entries of other machines sharing the cache directory are dropped as well.
+        temp_file = self._path.with_name(self._path.name + ".tmp")
+        kept = [entry for items in entries.values() for entry in items]
+        kept.sort(key=lambda entry: entry["completed_at"])
+        temp_file.write_text("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in kept), encoding="utf-8")
+        os.replace(temp_file, self._path)
+        self._lines = len(kept)
+        self._logger.info("Encode history compacted. path=%s entries=%s", self._path, len(kept))
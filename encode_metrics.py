@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, fields
+
+SPAWN_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+THROUGHPUT_WINDOW_SECONDS = 10.0
+
+
+def _to_float(value: str | None) -> float | None:
+    if value is None:
+        return None
+    text = value.strip().lower().rstrip("x")
+    if text.endswith("kbits/s"):
+        text = text[: -len("kbits/s")]
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _to_int(value: str | None) -> int:
+    try:
+        return int(value) if value is not None else 0
+    except ValueError:
+        return 0
+
+
+@dataclass
+class EncodeTelemetry:
+    """一个 ffmpeg -progress 数据块中的编码遥测数据。"""
+
+    out_seconds: float = 0.0
+    frame: int = 0
+    fps: float | None = None
+    speed: float | None = None
+    bitrate_kbps: float | None = None
+    total_size: int = 0
+    dup_frames: int = 0
+    drop_frames: int = 0
+    done: bool = False
+
+    @classmethod
+    def from_progress_block(cls, block: dict[str, str], done: bool = False) -> EncodeTelemetry:
+        out_time = block.get("out_time_us") or block.get("out_time_ms")
+        return cls(
+            out_seconds=max(0.0, (_to_float(out_time) or 0.0) / 1_000_000.0),
+            frame=_to_int(block.get("frame")),
+            fps=_to_float(block.get("fps")),
+            speed=_to_float(block.get("speed")),
+            bitrate_kbps=_to_float(block.get("bitrate")),
+            total_size=_to_int(block.get("total_size")),
+            dup_frames=_to_int(block.get("dup_frames")),
+            drop_frames=_to_int(block.get("drop_frames")),
+            done=done,
+        )
+
+    @classmethod
+    def combine(cls, items: list[EncodeTelemetry]) -> EncodeTelemetry:
+        # Parallel processes of one file (segments, separate audio) add up.
+        out_seconds = sum(item.out_seconds for item in items)
+        total_size = sum(item.total_size for item in items)
+        return cls(
+            out_seconds=out_seconds,
+            frame=sum(item.frame for item in items),
+            fps=sum(item.fps or 0.0 for item in items if not item.done),
+            speed=sum(item.speed or 0.0 for item in items if not item.done),
+            bitrate_kbps=total_size * 8 / out_seconds / 1000 if out_seconds > 0 else None,
+            total_size=total_size,
+            dup_frames=sum(item.dup_frames for item in items),
+            drop_frames=sum(item.drop_frames for item in items),
+            done=bool(items) and all(item.done for item in items),
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> EncodeTelemetry:
+        return cls(**{item.name: data[item.name] for item in fields(cls) if item.name in data})
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class _Histogram:
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class ServiceMetrics:
+    """进程内的服务指标，按 Prometheus 文本格式输出。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._spawn_latency: dict[str, _Histogram] = {}
+        self._encoded_seconds_total = 0.0
+        self._recent: deque[tuple[float, float]] = deque()
+        self._files_total: dict[str, int] = {}
+
+    def observe_spawn(self, tool: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self._spawn_latency.get(tool)
+            if histogram is None:
+                histogram = self._spawn_latency[tool] = _Histogram(SPAWN_LATENCY_BUCKETS)
+            histogram.observe(seconds)
+
+    def add_encoded_seconds(self, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._encoded_seconds_total += seconds
+            self._recent.append((now, seconds))
+            self._trim(now)
+
+    def count_file(self, result: str) -> None:
+        with self._lock:
+            self._files_total[result] = self._files_total.get(result, 0) + 1
+
+    def encoded_seconds_per_second(self) -> float:
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            return sum(seconds for _, seconds in self._recent) / THROUGHPUT_WINDOW_SECONDS
+
+    def render(self, gauges: dict[str, tuple[str, float | dict[str, float]]]) -> str:
+        """gauges: 名称 -> (说明, 数值 或 {标签值: 数值})，标签名固定为 status。"""
+        lines: list[str] = []
+        for name, (help_text, value) in gauges.items():
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge"])
+            if isinstance(value, dict):
+                lines.extend(f'{name}{{status="{label}"}} {number:g}' for label, number in sorted(value.items()))
+            else:
+                lines.append(f"{name} {value:g}")
+
+        throughput = self.encoded_seconds_per_second()
+        with self._lock:
+            lines.extend(
+                [
+                    "# HELP vediozip_encoded_media_seconds_per_second Media seconds encoded per wall second over the last 10s",
+                    "# TYPE vediozip_encoded_media_seconds_per_second gauge",
+                    f"vediozip_encoded_media_seconds_per_second {throughput:g}",
+                    "# HELP vediozip_encoded_media_seconds_total Media seconds encoded since start",
+                    "# TYPE vediozip_encoded_media_seconds_total counter",
+                    f"vediozip_encoded_media_seconds_total {self._encoded_seconds_total:g}",
+                    "# HELP vediozip_files_total Files finished since start by result",
+                    "# TYPE vediozip_files_total counter",
+                ]
+            )
+            lines.extend(
+                f'vediozip_files_total{{result="{result}"}} {count}' for result, count in sorted(self._files_total.items())
+            )
+            lines.extend(
+                [
+                    "# HELP vediozip_process_spawn_seconds Time to start an ffmpeg/ffprobe process",
+                    "# TYPE vediozip_process_spawn_seconds histogram",
+                ]
+            )
+            for tool, histogram in sorted(self._spawn_latency.items()):
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'vediozip_process_spawn_seconds_bucket{{tool="{tool}",le="{bound:g}"}} {count}')
+                lines.append(f'vediozip_process_spawn_seconds_bucket{{tool="{tool}",le="+Inf"}} {histogram.count}')
+                lines.append(f'vediozip_process_spawn_seconds_sum{{tool="{tool}"}} {histogram.sum:g}')
+                lines.append(f'vediozip_process_spawn_seconds_count{{tool="{tool}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def _trim(self, now: float) -> None:
+        while self._recent and now - self._recent[0][0] > THROUGHPUT_WINDOW_SECONDS:
+            self._recent.popleft()
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+from app_logging import get_logger
+from batch_convert import ZhArgumentParser
+from encode_metrics import EncodeTelemetry
+from resource_policy import ResourceGovernor, ResourcePolicy
+from video_service import MAX_CONCURRENCY, JobCancelledError, VideoConvertService
+
+DEFAULT_POLL_SECONDS = 2.0
+REQUEST_TIMEOUT_SECONDS = 30.0
+MAX_HEARTBEAT_SECONDS = 1.0
+
+logger = get_logger("vediozip.worker")
+
+
+class CoordinatorClient:
+    """访问协调端 /api/work 接口的最小 HTTP 客户端（仅用标准库）。"""
+
+    def __init__(self, base_url: str, worker_id: str, token: str = "") -> None:
+        self.base_url = base_url.rstrip("/")
+        self.worker_id = worker_id
+        self._headers = {"X-Worker-Token": token} if token else {}
+
+    def lease(self) -> dict | None:
+        return self._post("/api/work/lease", {})
+
+    def heartbeat(self, item_id: str, telemetry: EncodeTelemetry | None) -> str:
+        body = {"telemetry": None if telemetry is None else telemetry.to_dict()}
+        try:
+            return self._post(f"/api/work/{item_id}/heartbeat", body)["state"]
+        except urllib.error.HTTPError as exc:
+            if exc.code in (404, 409):
+                # Withdrawn by the coordinator (job cancelled) or re-leased after our lease expired.
+                return "stop"
+            raise
+
+    def complete(self, item_id: str) -> None:
+        self._post(f"/api/work/{item_id}/complete", {})
+
+    def fail(self, item_id: str, error: str) -> None:
+        self._post(f"/api/work/{item_id}/fail", {"error": error[:4000]})
+
+    def download_source(self, item_id: str, target: Path) -> None:
+        request = urllib.request.Request(self._url(f"/api/work/{item_id}/source"), headers=self._headers)
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT_SECONDS) as response, target.open("wb") as handle:
+            shutil.copyfileobj(response, handle, 1024 * 1024)
+
+    def upload_output(self, item_id: str, index: int, source: Path) -> None:
+        headers = {**self._headers, "Content-Length": str(source.stat().st_size), "Content-Type": "video/mp4"}
+        with source.open("rb") as handle:
+            request = urllib.request.Request(
+                self._url(f"/api/work/{item_id}/outputs/{index}"),
+                data=handle,
+                headers=headers,
+                method="PUT",
+            )
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT_SECONDS):
+                pass
+
+    def _url(self, path: str) -> str:
+        return f"{self.base_url}{path}?{urllib.parse.urlencode({'worker_id': self.worker_id})}"
+
+    def _post(self, path: str, body: dict) -> dict | None:
+        data = json.dumps({"worker_id": self.worker_id, **body}, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(
+            f"{self.base_url}{path}",
+            data=data,
+            headers={**self._headers, "Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT_SECONDS) as response:
+            text = response.read()
+        return json.loads(text) if text else None
+
+
+class EncodeWorker:
+    """从协调端租用文件、在本机编码，并在租约有效期内持续续租与上报进度。"""
+
+    def __init__(
+        self,
+        client: CoordinatorClient,
+        slots: int = 1,
+        transfer: bool = False,
+        poll_seconds: float = DEFAULT_POLL_SECONDS,
+    ) -> None:
+        self._client = client
+        self._slots = slots
+        self._transfer = transfer
+        self._poll_seconds = poll_seconds
+        policy = ResourcePolicy.from_env()
+        self._threads = policy.threads_for(slots)
+        self._resources = ResourceGovernor(policy)
+        self._service = VideoConvertService(resource_policy=policy)
+        self._shutdown = threading.Event()
+        self._lock = threading.Lock()
+        self._active: set[str] = set()
+
+    def run(self) -> None:
+        logger.info(
+            "Worker start. worker=%s coordinator=%s slots=%s transfer=%s threads=%s",
+            self._client.worker_id,
+            self._client.base_url,
+            self._slots,
+            self._transfer,
+            self._threads,
+        )
+        threads = [
+            threading.Thread(target=self._slot_loop, name=f"worker-slot-{index}", daemon=True)
+            for index in range(self._slots)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+        logger.info("Worker stopped. worker=%s", self._client.worker_id)
+
+    def stop(self) -> None:
+        self._shutdown.set()
+        with self._lock:
+            active = list(self._active)
+        for item_id in active:
+            self._service.control_work_item(item_id, "stop")
+
+    def _slot_loop(self) -> None:
+        while not self._shutdown.is_set():
+            # An overloaded host stops taking new files; other workers pick them up meanwhile.
+            self._resources.wait_for_capacity(self._shutdown, self._active_count)
+            if self._shutdown.is_set():
+                return
+            try:
+                item = self._client.lease()
+            except (OSError, ValueError) as exc:
+                logger.warning("Lease request failed. worker=%s error=%s", self._client.worker_id, exc)
+                item = None
+            if item is None:
+                self._shutdown.wait(self._poll_seconds)
+                continue
+            self._run_item(item)
+
+    def _run_item(self, item: dict) -> None:
+        item_id = item["item_id"]
+        latest: list[EncodeTelemetry | None] = [None]
+        finished = threading.Event()
+
+        def on_progress(telemetry: EncodeTelemetry) -> None:
+            latest[0] = telemetry
+
+        heartbeat = threading.Thread(
+            target=self._heartbeat_loop,
+            args=(item_id, item["lease_seconds"], latest, finished),
+            name=f"heartbeat-{item_id[:8]}",
+            daemon=True,
+        )
+        with self._lock:
+            self._active.add(item_id)
+        heartbeat.start()
+        logger.info("Work start. item_id=%s job_id=%s input=%s", item_id, item["job_id"], item["input_file"])
+        work_dir = Path(tempfile.mkdtemp(prefix="vediozip-worker-")) if self._transfer else None
+        try:
+            input_file = output_files = None
+            if work_dir is not None:
+                input_file = work_dir / f"source{Path(item['input_file']).suffix}"
+                output_files = [work_dir / f"output_{index}.mp4" for index in range(len(item["outputs"]))]
+                self._client.download_source(item_id, input_file)
+            self._service.encode_work_item(
+                item,
+                on_progress=on_progress,
+                input_file=input_file,
+                output_files=output_files,
+                threads=self._threads,
+            )
+            for index, output_file in enumerate(output_files or []):
+                self._client.upload_output(item_id, index, output_file)
+            finished.set()
+            heartbeat.join()
+            # Final telemetry first, so the coordinator shows the finished numbers for this file.
+            self._client.heartbeat(item_id, latest[0])
+            self._client.complete(item_id)
+            logger.info("Work done. item_id=%s job_id=%s", item_id, item["job_id"])
+        except JobCancelledError:
+            logger.info("Work stopped. item_id=%s job_id=%s", item_id, item["job_id"])
+            if self._shutdown.is_set():
+                # Hand the file back now instead of waiting for the lease to expire.
+                self._report_failure(item_id, "工作节点已停止")
+        except Exception as exc:
+            logger.exception("Work failed. item_id=%s job_id=%s", item_id, item["job_id"])
+            self._report_failure(item_id, str(exc))
+        finally:
+            finished.set()
+            with self._lock:
+                self._active.discard(item_id)
+            if work_dir is not None:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _active_count(self) -> int:
+        with self._lock:
+            return len(self._active)
+
+    def _report_failure(self, item_id: str, error: str) -> None:
+        try:
+            self._client.fail(item_id, error)
+        except (OSError, ValueError):
+            logger.warning("Report failure failed; the lease will expire. item_id=%s", item_id)
+
+    def _heartbeat_loop(
+        self,
+        item_id: str,
+        lease_seconds: float,
+        latest: list[EncodeTelemetry | None],
+        finished: threading.Event,
+    ) -> None:
+        # Heartbeats carry the progress shown in the UI, so they are sent more often than the lease needs.
+        interval = min(lease_seconds / 3, MAX_HEARTBEAT_SECONDS)
+        while not finished.wait(interval):
+            try:
+                state = self._client.heartbeat(item_id, latest[0])
+            except (OSError, ValueError) as exc:
+                # Keep encoding through short outages; the lease covers a few missed beats.
+                logger.warning("Heartbeat failed. item_id=%s error=%s", item_id, exc)
+                continue
+            self._service.control_work_item(item_id, state)
+            if state == "stop":
+                logger.info("Work withdrawn by coordinator. item_id=%s", item_id)
+                return
+
+
+def build_parser() -> ZhArgumentParser:
+    parser = ZhArgumentParser(
+        description="分布式模式的编码工作节点：从协调端（VEDIOZIP_COORDINATOR=1 启动的服务）租用文件并在本机编码。",
+        add_help=False,
+    )
+    parser._positionals.title = "位置参数"
+    parser._optionals.title = "可选参数"
+    parser.add_argument("-h", "--help", action="help", help="显示帮助信息并退出")
+    parser.add_argument("coordinator", help="协调端地址，例如 http://192.168.1.10:8765")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}", help="工作节点名称")
+    parser.add_argument("-j", "--slots", type=int, default=1, help=f"同时编码的文件数（1-{MAX_CONCURRENCY}）")
+    parser.add_argument(
+        "--transfer",
+        action="store_true",
+        help="通过 HTTP 下载源文件并上传输出；不加时要求本机能以相同路径访问源文件与输出目录（共享存储）",
+    )
+    parser.add_argument("--token", default=os.environ.get("VEDIOZIP_WORKER_TOKEN", ""), help="与协调端 VEDIOZIP_WORKER_TOKEN 一致的令牌")
+    parser.add_argument("--poll", type=float, default=DEFAULT_POLL_SECONDS, help="无任务时的轮询间隔（秒）")
+    return parser
+
+
+def main() -> int:
+    parser = build_parser()
+    args = parser.parse_args()
+    if not 1 <= args.slots <= MAX_CONCURRENCY:
+        parser.error(f"并行数必须在 1 到 {MAX_CONCURRENCY} 之间。")
+
+    worker = EncodeWorker(
+        CoordinatorClient(args.coordinator, args.worker_id, args.token),
+        slots=args.slots,
+        transfer=args.transfer,
+        poll_seconds=args.poll,
+    )
+    signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    worker.run()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
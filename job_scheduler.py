@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import itertools
+import threading
+from dataclasses import dataclass
+from typing import Callable
+
+from app_logging import get_logger
+
+DEFAULT_MAX_RUNNING_JOBS = 1
+DEFAULT_MAX_QUEUED_JOBS = 100
+
+
+@dataclass
+class _QueuedJob:
+    job_id: str
+    priority: int
+    seq: int
+    run: Callable[[], None]
+
+    def sort_key(self) -> tuple[int, int]:
+        return (-self.priority, self.seq)
+
+
+class JobScheduler:
+    """全局任务调度器：限制同时运行的任务数，其余任务按优先级（相同优先级先进先出）排队。"""
+
+    def __init__(
+        self,
+        max_running: int = DEFAULT_MAX_RUNNING_JOBS,
+        max_queued: int = DEFAULT_MAX_QUEUED_JOBS,
+    ) -> None:
+        if max_running < 1:
+            raise ValueError("max_running must be at least 1")
+        self._logger = get_logger("vediozip.scheduler")
+        self._max_running = max_running
+        self._max_queued = max_queued
+        self._lock = threading.Lock()
+        self._queue: list[_QueuedJob] = []
+        self._running: set[str] = set()
+        self._seq = itertools.count()
+
+    @property
+    def queued_count(self) -> int:
+        with self._lock:
+            return len(self._queue)
+
+    @property
+    def running_count(self) -> int:
+        with self._lock:
+            return len(self._running)
+
+    def submit(self, job_id: str, priority: int, run: Callable[[], None]) -> None:
+        with self._lock:
+            if len(self._queue) >= self._max_queued:
+                raise ValueError(f"任务队列已满（最多 {self._max_queued} 个排队任务），请稍后再试。")
+            self._queue.append(_QueuedJob(job_id=job_id, priority=priority, seq=next(self._seq), run=run))
+            ready = self._take_ready()
+        self._start(ready)
+
+    def cancel(self, job_id: str) -> bool:
+        with self._lock:
+            for item in self._queue:
+                if item.job_id == job_id:
+                    self._queue.remove(item)
+                    return True
+        return False
+
+    def reprioritize(self, job_id: str, priority: int) -> bool:
+        with self._lock:
+            for item in self._queue:
+                if item.job_id == job_id:
+                    item.priority = priority
+                    return True
+        return False
+
+    def position(self, job_id: str) -> int | None:
+        with self._lock:
+            ordered = sorted(self._queue, key=_QueuedJob.sort_key)
+            for index, item in enumerate(ordered):
+                if item.job_id == job_id:
+                    return index + 1
+        return None
+
+    def _take_ready(self) -> list[_QueuedJob]:
+        ready: list[_QueuedJob] = []
+        while self._queue and len(self._running) < self._max_running:
+            item = min(self._queue, key=_QueuedJob.sort_key)
+            self._queue.remove(item)
+            self._running.add(item.job_id)
+            ready.append(item)
+        return ready
+
+    def _start(self, ready: list[_QueuedJob]) -> None:
+        for item in ready:
+            self._logger.info("Dispatch job. job_id=%s priority=%s", item.job_id, item.priority)
+            worker = threading.Thread(
+                target=self._run_item,
+                args=(item,),
+                daemon=True,
+                name=f"convert-{item.job_id[:8]}",
+            )
+            worker.start()
+
+    def _run_item(self, item: _QueuedJob) -> None:
+        try:
+            item.run()
+        finally:
+            with self._lock:
+                self._running.discard(item.job_id)
+                ready = self._take_ready()
+            self._start(ready)
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator
+
+from app_logging import get_logger
+
+if TYPE_CHECKING:
+    from video_service import JobState
+
+SCHEMA_VERSION = 1
+DEFAULT_MAX_HOT_JOBS = 200
+DEFAULT_HOT_TTL_SECONDS = 3600.0
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+# Per-file maps are only sent when asked for; listings also leave out the active files.
+DETAIL_FIELDS = {"stream_modes", "file_telemetry", "preset_measurements", "duplicates"}
+SUMMARY_EXCLUDED_FIELDS = {*DETAIL_FIELDS, "active_files"}
+
+
+class JobStore:
+    """任务存储：内存中保留运行中与最近结束的任务，结束的任务按 LRU/TTL 淘汰；指定 db_path 时全部任务持久化到 SQLite。
+
+    内存热集合的方法由调用方在其锁内调用；数据库读写使用自己的锁。
+    """
+
+    def __init__(
+        self,
+        db_path: Path | None = None,
+        max_hot: int = DEFAULT_MAX_HOT_JOBS,
+        hot_ttl_seconds: float = DEFAULT_HOT_TTL_SECONDS,
+    ) -> None:
+        self._logger = get_logger("vediozip.job_store")
+        self._db_path = db_path
+        self._max_hot = max_hot
+        self._hot_ttl_seconds = hot_ttl_seconds
+        self._hot: OrderedDict[str, JobState] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        if db_path is None:
+            return
+        try:
+            self._conn = self._connect()
+            self._recover_interrupted()
+        except sqlite3.Error:
+            self._logger.exception("Job history disabled. db=%s", self._db_path)
+            self._conn = None
+
+    def peek(self, job_id: str) -> JobState | None:
+        return self._hot.get(job_id)
+
+    def get(self, job_id: str) -> JobState | None:
+        job = self._hot.get(job_id)
+        if job is not None:
+            self._hot.move_to_end(job_id)
+        return job
+
+    def add(self, job: JobState) -> None:
+        self._hot[job.job_id] = job
+        self.save(job)
+        self._evict()
+
+    def discard(self, job_id: str) -> None:
+        self._hot.pop(job_id, None)
+        self._execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def values(self) -> Iterator[JobState]:
+        return iter(list(self._hot.values()))
+
+    def save(self, job: JobState) -> None:
+        data = job.to_dict()
+        self._execute(
+            "INSERT OR REPLACE INTO jobs (job_id, status, created_at, finished_at, data) VALUES (?, ?, ?, ?, ?)",
+            (job.job_id, job.status, data.get("created_at"), job.finished_at, json.dumps(data, ensure_ascii=False)),
+        )
+        if job.status in TERMINAL_STATUSES:
+            self._evict()
+
+    def load(self, job_id: str) -> dict | None:
+        row = self._query_one("SELECT data FROM jobs WHERE job_id = ?", (job_id,))
+        return None if row is None else json.loads(row[0])
+
+    def contains(self, job_id: str) -> bool:
+        return job_id in self._hot or self._query_one("SELECT 1 FROM jobs WHERE job_id = ?", (job_id,)) is not None
+
+    def list(self, status: str | None = None, limit: int = 50, offset: int = 0) -> tuple[int, list[dict]]:
+        """按创建时间倒序分页；热集合中的任务用内存中的最新状态覆盖数据库快照。"""
+        where, params = ("WHERE status = ?", (status,)) if status else ("", ())
+        if self._conn is None:
+            hot = sorted(
+                (job for job in self.values() if status is None or job.status == status),
+                key=lambda job: job.to_dict()["created_at"],
+                reverse=True,
+            )
+            return len(hot), [self._summary(job.to_dict()) for job in hot[offset : offset + limit]]
+        try:
+            with self._lock:
+                (total,) = self._conn.execute(f"SELECT COUNT(*) FROM jobs {where}", params).fetchone()
+                rows = self._conn.execute(
+                    f"SELECT job_id, data FROM jobs {where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                    (*params, limit, offset),
+                ).fetchall()
+        except sqlite3.Error:
+            self._logger.exception("Job history query failed. status=%s", status)
+            return 0, []
+        items = []
+        for job_id, data in rows:
+            job = self._hot.get(job_id)
+            items.append(self._summary(job.to_dict() if job is not None else json.loads(data)))
+        return total, items
+
+    def _summary(self, data: dict) -> dict:
+        return {key: value for key, value in data.items() if key not in SUMMARY_EXCLUDED_FIELDS}
+
+    def _evict(self) -> None:
+        now = time.time()
+        finished = [job for job in self._hot.values() if job.status in TERMINAL_STATUSES]
+        overflow = len(self._hot) - self._max_hot
+        for job in finished:
+            expired = job.finished_at is not None and now - job.finished_at > self._hot_ttl_seconds
+            if overflow <= 0 and not expired:
+                continue
+            # Finished jobs were saved when they reached their final status.
+            self._hot.pop(job.job_id, None)
+            overflow -= 1
+
+    def _recover_interrupted(self) -> None:
+        rows = self._conn.execute(
+            "SELECT job_id, data FROM jobs WHERE status NOT IN (?, ?, ?)", tuple(TERMINAL_STATUSES)
+        ).fetchall()
+        now = time.time()
+        for job_id, text in rows:
+            data = json.loads(text)
+            data.update(
+                status="failed",
+                message="转换失败",
+                error="服务重启，任务已中断",
+                active_files=[],
+                current_file=None,
+                finished_at=now,
+            )
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, data = ? WHERE job_id = ?",
+                ("failed", now, json.dumps(data, ensure_ascii=False), job_id),
+            )
+        self._conn.commit()
+        if rows:
+            self._logger.warning("Jobs interrupted by restart marked failed. count=%s", len(rows))
+
+    def _execute(self, sql: str, params: tuple) -> None:
+        if self._conn is None:
+            return
+        try:
+            with self._lock:
+                self._conn.execute(sql, params)
+                self._conn.commit()
+        except sqlite3.Error:
+            self._logger.exception("Job history write failed. sql=%s", sql)
+
+    def _query_one(self, sql: str, params: tuple) -> tuple | None:
+        if self._conn is None:
+            return None
+        try:
+            with self._lock:
+                return self._conn.execute(sql, params).fetchone()
+        except sqlite3.Error:
+            self._logger.exception("Job history read failed. sql=%s", sql)
+            return None
+
+    def _connect(self) -> sqlite3.Connection:
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self._db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        (version,) = conn.execute("PRAGMA user_version").fetchone()
+        if version != SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS jobs")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                finished_at REAL,
+                data TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created_at ON jobs (status, created_at)")
+        conn.commit()
+        return conn
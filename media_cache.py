@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+
+from app_logging import get_cache_dir, get_logger
+
+SCHEMA_VERSION = 1
+DEFAULT_MAX_ENTRIES = 50_000
+EVICT_EVERY_PUTS = 500
+
+
+@dataclass
+class MediaInfo:
+    duration: float | None
+    format_bit_rate: int | None = None
+    video_codec: str | None = None
+    width: int | None = None
+    height: int | None = None
+    video_bit_rate: int | None = None
+    audio_codec: str | None = None
+    audio_bit_rate: int | None = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+_INFO_COLUMNS = [item.name for item in fields(MediaInfo)]
+
+
+class MediaMetadataCache:
+    """按 (绝对路径, 文件大小, mtime_ns) 缓存 ffprobe 结果的 SQLite 缓存。"""
+
+    def __init__(self, db_path: Path | None = None, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self._logger = get_logger("vediozip.media_cache")
+        self._db_path = db_path or get_cache_dir() / "media_metadata.sqlite3"
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+        self._conn: sqlite3.Connection | None = None
+        try:
+            self._conn = self._connect()
+        except sqlite3.Error:
+            self._logger.exception("Media cache disabled. db=%s", self._db_path)
+
+    def get(self, path: Path, size: int, mtime_ns: int) -> MediaInfo | None:
+        if self._conn is None:
+            return None
+        key = str(path)
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    f"SELECT size, mtime_ns, {', '.join(_INFO_COLUMNS)} FROM media WHERE path = ?",
+                    (key,),
+                ).fetchone()
+                if row is None:
+                    return None
+                if row[0] != size or row[1] != mtime_ns:
+                    self._conn.execute("DELETE FROM media WHERE path = ?", (key,))
+                    self._conn.commit()
+                    return None
+                self._conn.execute("UPDATE media SET last_used = ? WHERE path = ?", (time.time(), key))
+                self._conn.commit()
+        except sqlite3.Error:
+            self._logger.exception("Media cache read failed. path=%s", path)
+            return None
+        return MediaInfo(**dict(zip(_INFO_COLUMNS, row[2:])))
+
+    def put(self, path: Path, size: int, mtime_ns: int, info: MediaInfo) -> None:
+        if self._conn is None:
+            return
+        values = info.to_dict()
+        columns = ["path", "size", "mtime_ns", "last_used", *_INFO_COLUMNS]
+        try:
+            with self._lock:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO media ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    (str(path), size, mtime_ns, time.time(), *(values[name] for name in _INFO_COLUMNS)),
+                )
+                self._puts_since_evict += 1
+                if self._puts_since_evict >= EVICT_EVERY_PUTS:
+                    self._evict()
+                self._conn.commit()
+        except sqlite3.Error:
+            self._logger.exception("Media cache write failed. path=%s", path)
+
+    def _evict(self) -> None:
+        self._puts_since_evict = 0
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM media").fetchone()
+        overflow = count - self._max_entries
+        if overflow <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM media WHERE path IN (SELECT path FROM media ORDER BY last_used ASC LIMIT ?)",
+            (overflow,),
+        )
+        self._logger.info("Media cache evicted. entries=%s max_entries=%s", overflow, self._max_entries)
+
+    def _connect(self) -> sqlite3.Connection:
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self._db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        (version,) = conn.execute("PRAGMA user_version").fetchone()
+        if version != SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS media")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS media (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                duration REAL,
+                format_bit_rate INTEGER,
+                video_codec TEXT,
+                width INTEGER,
+                height INTEGER,
+                video_bit_rate INTEGER,
+                audio_codec TEXT,
+                audio_bit_rate INTEGER
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS media_last_used ON media (last_used)")
+        conn.commit()
+        return conn
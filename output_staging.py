@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import errno
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from app_logging import get_logger
+
+# Kept free on the scratch volume beyond the estimated size of the file being encoded.
+SCRATCH_RESERVE_BYTES = 512 * 1024 * 1024
+# An encode keeps writing to its partial file; one untouched this long was left by a crash or kill.
+STALE_PARTIAL_SECONDS = 3600
+# Encoder partials (".name.partial-1a2b3c4d.mp4") and worker uploads (".name.mp4.upload-1a2b3c4d").
+_PARTIAL_NAME = re.compile(r"^\..+\.(?:partial-[0-9a-f]{8}\.[^.]+|upload-[0-9a-f]{8})$")
+# Segmented encodes work in a directory named after their partial (".name.partial-1a2b3c4d.mp4.segments").
+_SEGMENTS_NAME = re.compile(r"^(\..+\.partial-[0-9a-f]{8}\.[^.]+)\.segments$")
+
+# Shared by every stager of the process: partial files still being written, and scratch bytes promised to encodes.
+_registry_lock = threading.Lock()
+_active_partials: set[Path] = set()
+_scratch_reserved: dict[Path, int] = {}
+
+
+def _newest_mtime(directory: Path) -> float:
+    # Segment files keep growing while the directory's own mtime stays at its last new entry.
+    newest = directory.stat().st_mtime
+    for entry in os.scandir(directory):
+        newest = max(newest, entry.stat(follow_symlinks=False).st_mtime)
+    return newest
+
+
+class OutputStager:
+    """输出暂存：编码先写入临时文件（可位于本地高速暂存目录），完成后原子地提交到最终路径。
+
+    未提交的临时文件以 "." 开头并带 .partial- 标记，崩溃时不会留下看似完整的输出。
+    """
+
+    def __init__(self, scratch_dir: Path | None = None) -> None:
+        self._logger = get_logger("vediozip.staging")
+        self.scratch_dir = scratch_dir
+        self._lock = threading.Lock()
+        self._swept: set[Path] = set()
+
+    def staging_path(self, output_file: Path, use_scratch: bool = True) -> Path:
+        # The real extension stays last so that ffmpeg still picks the container from it.
+        name = f".{output_file.stem}.partial-{uuid.uuid4().hex[:8]}{output_file.suffix}"
+        if self.scratch_dir is None or not use_scratch:
+            path = output_file.with_name(name)
+        else:
+            path = self.scratch_dir / name
+        with _registry_lock:
+            _active_partials.add(path)
+        return path
+
+    def discard(self, staged: Path) -> None:
+        """删除未提交的临时文件。"""
+        staged.unlink(missing_ok=True)
+        self._release(staged)
+
+    def sweep(self, directory: Path) -> int:
+        """删除 directory 中崩溃或强制结束后遗留的临时文件与分段目录；同一个暂存器对每个目录只清理一次。"""
+        with self._lock:
+            if directory in self._swept:
+                return 0
+            self._swept.add(directory)
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return 0
+        now = time.time()
+        removed = 0
+        for entry in entries:
+            segments = _SEGMENTS_NAME.match(entry.name)
+            if not segments and not _PARTIAL_NAME.match(entry.name):
+                continue
+            path = Path(entry.path)
+            # A segment directory lives exactly as long as the partial it is joined into.
+            owner = directory / segments.group(1) if segments else path
+            with _registry_lock:
+                if owner in _active_partials:
+                    continue
+            try:
+                if segments:
+                    if not entry.is_dir(follow_symlinks=False) or now - _newest_mtime(path) < STALE_PARTIAL_SECONDS:
+                        continue
+                    shutil.rmtree(path)
+                else:
+                    if not entry.is_file(follow_symlinks=False) or now - entry.stat().st_mtime < STALE_PARTIAL_SECONDS:
+                        continue
+                    path.unlink()
+                removed += 1
+            except OSError as exc:
+                self._logger.warning("Stale partial not removed. path=%s error=%s", path, exc)
+        if removed:
+            self._logger.info("Stale partial files removed. dir=%s count=%s", directory, removed)
+        return removed
+
+    def reserve_scratch(self, needed_bytes: int) -> bool:
+        """为一次编码预留暂存空间，已预留给其他编码的字节视为已占用；成功后须调用 release_scratch。"""
+        if self.scratch_dir is None:
+            return False
+        with _registry_lock:
+            reserved = _scratch_reserved.get(self.scratch_dir, 0)
+            try:
+                free = shutil.disk_usage(self.scratch_dir).free
+            except OSError:
+                self._logger.exception("Scratch free space check failed. scratch=%s", self.scratch_dir)
+                return False
+            if free - reserved - needed_bytes < SCRATCH_RESERVE_BYTES:
+                return False
+            _scratch_reserved[self.scratch_dir] = reserved + needed_bytes
+            return True
+
+    def release_scratch(self, needed_bytes: int) -> None:
+        if self.scratch_dir is None:
+            return
+        with _registry_lock:
+            remaining = _scratch_reserved.get(self.scratch_dir, 0) - needed_bytes
+            if remaining > 0:
+                _scratch_reserved[self.scratch_dir] = remaining
+            else:
+                _scratch_reserved.pop(self.scratch_dir, None)
+
+    def _release(self, path: Path) -> None:
+        with _registry_lock:
+            _active_partials.discard(path)
+
+    def commit(self, staged: Path, output_file: Path) -> None:
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(staged, output_file)
+            self._release(staged)
+            return
+        except OSError as exc:
+            if exc.errno != errno.EXDEV:
+                raise
+
+        # Different volume: copy beside the target first so that the final rename stays atomic.
+        size = staged.stat().st_size
+        if shutil.disk_usage(output_file.parent).free < size:
+            raise RuntimeError(f"输出目录空间不足（需要 {size} 字节）: {output_file.parent}")
+        partial = self.staging_path(output_file, use_scratch=False)
+        try:
+            shutil.copyfile(staged, partial)
+            os.replace(partial, output_file)
+        except BaseException:
+            partial.unlink(missing_ok=True)
+            raise
+        finally:
+            self._release(partial)
+        self.discard(staged)
+        self._logger.info("Output committed from scratch. output=%s bytes=%s", output_file, size)
+
+    def link(self, existing: Path, output_file: Path) -> None:
+        """让 output_file 指向与 existing 相同的内容：优先硬链接，不支持时复制；同样经由临时文件原子提交。"""
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        partial = self.staging_path(output_file, use_scratch=False)
+        try:
+            try:
+                os.link(existing, partial)
+            except OSError:
+                shutil.copyfile(existing, partial)
+            os.replace(partial, output_file)
+        except BaseException:
+            partial.unlink(missing_ok=True)
+            raise
+        finally:
+            self._release(partial)
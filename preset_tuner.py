@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from functools import partial
+from pathlib import Path
+from typing import Callable
+
+from app_logging import get_cache_dir, get_logger
+from process_engine import ProcessEngine, ProcessResult
+from speed_profiles import DEFAULT_PROFILE, PROFILES, SpeedProfile
+
+X264_PRESETS = ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow"]
+AUTO_PRESET_CANDIDATES = ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow"]
+DEFAULT_TARGET_SPEED = 4.0
+TRIAL_SECONDS = 5.0
+CACHE_TTL_SECONDS = 30 * 24 * 3600
+HEIGHT_CLASSES = [240, 360, 480, 720, 1080, 1440, 2160]
+# Starts a trial ffmpeg command and waits for it, with stdout captured.
+TrialRunner = Callable[[list[str]], ProcessResult]
+
+
+@dataclass
+class TrialResult:
+    preset: str
+    media_seconds: float
+    encode_seconds: float
+    frames: int
+    output_bytes: int
+
+    @property
+    def speed(self) -> float:
+        return self.media_seconds / self.encode_seconds if self.encode_seconds > 0 else 0.0
+
+    @property
+    def fps(self) -> float:
+        return self.frames / self.encode_seconds if self.encode_seconds > 0 else 0.0
+
+    @property
+    def bitrate(self) -> float:
+        return self.output_bytes * 8 / self.media_seconds if self.media_seconds > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "speed": self.speed, "fps": self.fps, "bitrate": self.bitrate}
+
+
+@dataclass(frozen=True)
+class TrialSample:
+    input_file: Path
+    start: float
+    seconds: float
+    source_height: int | None
+
+
+def height_class(height: int | None) -> int:
+    if not height:
+        return 0
+    return min(HEIGHT_CLASSES, key=lambda value: abs(value - height))
+
+
+def machine_key() -> str:
+    return f"{platform.node()}|{platform.machine()}|{platform.processor()}|cpus={os.cpu_count()}"
+
+
+class PresetTuner:
+    """通过短片段试编码测量各 x264 预设的速度与码率，并按机器缓存测量结果。"""
+
+    def __init__(self, cache_file: Path | None = None, runner: TrialRunner | None = None) -> None:
+        self._logger = get_logger("vediozip.preset_tuner")
+        self._cache_file = cache_file or get_cache_dir() / "preset_benchmarks.json"
+        self._trial_dir = self._cache_file.parent / "trials"
+        # Without a runner the trials get an engine of their own, with no resource policy applied.
+        self._runner = runner or partial(
+            ProcessEngine().run, capture_stdout=True, creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)
+        )
+        self._lock = threading.Lock()
+
+    def select_preset(
+        self,
+        ffmpeg_path: Path,
+        samples: list[TrialSample],
+        height: int,
+        crf: int,
+        threads: int | None,
+        concurrency: int,
+        target_speed: float = DEFAULT_TARGET_SPEED,
+        profile: SpeedProfile = PROFILES[DEFAULT_PROFILE],
+        runner: TrialRunner | None = None,
+    ) -> tuple[str, dict[str, dict]]:
+        measurements: dict[str, dict] = {}
+        chosen = AUTO_PRESET_CANDIDATES[0]
+        for preset in AUTO_PRESET_CANDIDATES:
+            results = [
+                self.measure(ffmpeg_path, sample, height, crf, preset, threads, profile, runner)
+                for sample in samples
+            ]
+            results = [result for result in results if result is not None]
+            if not results:
+                break
+            media_seconds = sum(item["media_seconds"] for item in results)
+            encode_seconds = sum(item["encode_seconds"] for item in results)
+            speed = media_seconds / encode_seconds if encode_seconds > 0 else 0.0
+            measurements[preset] = {
+                "speed": speed,
+                "fps": sum(item["frames"] for item in results) / encode_seconds if encode_seconds > 0 else 0.0,
+                "bitrate": sum(item["output_bytes"] for item in results) * 8 / media_seconds if media_seconds > 0 else 0.0,
+            }
+            # Parallel encodes each get their share of threads, so the job throughput is per-process speed x concurrency.
+            if speed * concurrency < target_speed:
+                break
+            chosen = preset
+
+        self._logger.info(
+            "Auto preset selected. preset=%s profile=%s target_speed=%s concurrency=%s measurements=%s",
+            chosen,
+            profile.tag,
+            target_speed,
+            concurrency,
+            measurements,
+        )
+        return chosen, measurements
+
+    def measure(
+        self,
+        ffmpeg_path: Path,
+        sample: TrialSample,
+        height: int,
+        crf: int,
+        preset: str,
+        threads: int | None,
+        profile: SpeedProfile = PROFILES[DEFAULT_PROFILE],
+        runner: TrialRunner | None = None,
+    ) -> dict | None:
+        key = self._measure_key(sample.source_height, height, crf, preset, threads, profile)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        result = self.trial_encode(ffmpeg_path, sample, height, crf, preset, threads, profile, runner)
+        if result is None:
+            return None
+        data = result.to_dict()
+        self._cache_put(key, data)
+        self._logger.info("Trial encode measured. key=%s input=%s result=%s", key, sample.input_file, data)
+        return data
+
+    def cached(
+        self,
+        source_height: int | None,
+        height: int,
+        crf: int,
+        preset: str,
+        threads: int | None,
+        profile: SpeedProfile,
+    ) -> dict | None:
+        """只读取本机已缓存的测量结果，不做试编码。"""
+        return self._cache_get(self._measure_key(source_height, height, crf, preset, threads, profile))
+
+    def _measure_key(
+        self,
+        source_height: int | None,
+        height: int,
+        crf: int,
+        preset: str,
+        threads: int | None,
+        profile: SpeedProfile,
+    ) -> str:
+        return "|".join(
+            [
+                f"src={height_class(source_height)}",
+                f"h={height}",
+                f"crf={crf}",
+                f"preset={preset}",
+                f"threads={threads or 'auto'}",
+                f"profile={profile.tag}",
+            ]
+        )
+
+    def trial_encode(
+        self,
+        ffmpeg_path: Path,
+        sample: TrialSample,
+        height: int,
+        crf: int,
+        preset: str,
+        threads: int | None,
+        profile: SpeedProfile = PROFILES[DEFAULT_PROFILE],
+        runner: TrialRunner | None = None,
+    ) -> TrialResult | None:
+        """试编码一个片段；runner 为空时使用构造时给定的启动方式。"""
+        self._trial_dir.mkdir(parents=True, exist_ok=True)
+        output_file = self._trial_dir / f"trial-{uuid.uuid4().hex}.mp4"
+        cmd = [
+            str(ffmpeg_path),
+            "-y",
+            "-ss",
+            f"{sample.start:.3f}",
+            "-i",
+            str(sample.input_file),
+            "-t",
+            f"{sample.seconds:.3f}",
+            "-map",
+            "0:v:0",
+            "-an",
+            "-sn",
+            "-vf",
+            profile.scale_filter(height),
+            "-c:v",
+            "libx264",
+            "-crf",
+            str(crf),
+            "-preset",
+            preset,
+            *profile.encoder_args(),
+        ]
+        if threads is not None:
+            cmd.extend(["-threads", str(threads)])
+        cmd.extend(["-progress", "pipe:1", "-nostats", "-loglevel", "error", str(output_file)])
+
+        try:
+            result = (runner or self._runner)(cmd)
+            encode_seconds = result.elapsed
+            if result.returncode != 0 or not output_file.exists():
+                self._logger.warning(
+                    "Trial encode failed. input=%s preset=%s returncode=%s stderr=%s",
+                    sample.input_file,
+                    preset,
+                    result.returncode,
+                    result.stderr.strip(),
+                )
+                return None
+            progress = self._last_progress_values(result.stdout)
+            frames = int(progress.get("frame", "0") or 0)
+            out_time_us = progress.get("out_time_us") or progress.get("out_time_ms")
+            try:
+                media_seconds = float(out_time_us) / 1_000_000.0
+            except (TypeError, ValueError):
+                media_seconds = sample.seconds
+            return TrialResult(
+                preset=preset,
+                media_seconds=media_seconds if media_seconds > 0 else sample.seconds,
+                encode_seconds=encode_seconds,
+                frames=frames,
+                output_bytes=output_file.stat().st_size,
+            )
+        except OSError:
+            self._logger.exception("Trial encode could not start. input=%s preset=%s", sample.input_file, preset)
+            return None
+        finally:
+            output_file.unlink(missing_ok=True)
+
+    def _last_progress_values(self, text: str) -> dict[str, str]:
+        values: dict[str, str] = {}
+        for line in text.splitlines():
+            key, sep, value = line.strip().partition("=")
+            if sep:
+                values[key] = value
+        return values
+
+    def _cache_get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._load_cache().get(machine_key(), {}).get(key)
+        if entry is None or time.time() - entry.get("measured_at", 0) > CACHE_TTL_SECONDS:
+            return None
+        return entry["result"]
+
+    def _cache_put(self, key: str, result: dict) -> None:
+        with self._lock:
+            cache = self._load_cache()
+            cache.setdefault(machine_key(), {})[key] = {"measured_at": time.time(), "result": result}
+            temp_file = self._cache_file.with_name(self._cache_file.name + ".tmp")
+            temp_file.write_text(json.dumps(cache, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(temp_file, self._cache_file)
+
+    def _load_cache(self) -> dict:
+        try:
+            return json.loads(self._cache_file.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            self._logger.warning("Preset benchmark cache unreadable, ignoring. path=%s", self._cache_file)
+            return {}
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import asyncio
+import subprocess
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Coroutine, TypeVar
+
+from app_logging import get_logger
+
+# Longest stdout line kept while waiting for its newline; ffmpeg -progress lines are far shorter.
+MAX_LINE_BYTES = 64 * 1024
+# Only the end of stderr is kept: that is where ffmpeg reports the error.
+STDERR_TAIL_BYTES = 64 * 1024
+# ffprobe JSON/CSV output for one file stays well below this.
+MAX_CAPTURE_BYTES = 16 * 1024 * 1024
+
+_T = TypeVar("_T")
+
+
+@dataclass
+class ProcessResult:
+    returncode: int
+    stdout: str
+    stderr: str
+    # Bytes of stderr that fell out of the tail buffer.
+    stderr_dropped: int = 0
+    # Seconds from the spawn request to exit, without the caller's own waiting around the call.
+    elapsed: float = 0.0
+
+
+class TailBuffer:
+    """固定容量的环形缓冲区，只保留最后写入的 capacity 个字节。"""
+
+    def __init__(self, capacity: int) -> None:
+        self._buffer = bytearray(capacity)
+        self._capacity = capacity
+        self._end = 0
+        self._size = 0
+        self.total = 0
+
+    @property
+    def dropped(self) -> int:
+        return self.total - self._size
+
+    def write(self, data: bytes) -> None:
+        self.total += len(data)
+        if len(data) >= self._capacity:
+            self._buffer[:] = data[-self._capacity :]
+            self._end = 0
+            self._size = self._capacity
+            return
+        first = min(len(data), self._capacity - self._end)
+        self._buffer[self._end : self._end + first] = data[:first]
+        self._buffer[: len(data) - first] = data[first:]
+        self._end = (self._end + len(data)) % self._capacity
+        self._size = min(self._capacity, self._size + len(data))
+
+    def getvalue(self) -> bytes:
+        if self._size < self._capacity:
+            return bytes(self._buffer[: self._size])
+        return bytes(self._buffer[self._end :] + self._buffer[: self._end])
+
+
+class EngineProcess:
+    """引擎中运行的子进程句柄，可在任意线程中查询状态、终止或发送信号。"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, transport: asyncio.SubprocessTransport) -> None:
+        self._loop = loop
+        self._transport = transport
+        self.popen: subprocess.Popen = transport.get_extra_info("subprocess")
+        self.pid: int = transport.get_pid()
+
+    @property
+    def running(self) -> bool:
+        # Popen.poll() would reap the child behind the event loop's back, so the loop's view is used instead.
+        return self._transport.get_returncode() is None
+
+    def kill(self) -> None:
+        self._call(self._transport.kill)
+
+    def send_signal(self, signum: int) -> None:
+        self._call(self._transport.send_signal, signum)
+
+    def _call(self, method: Callable, *args) -> None:
+        def invoke() -> None:
+            if self._transport.get_returncode() is None and not self._transport.is_closing():
+                try:
+                    method(*args)
+                except ProcessLookupError:
+                    pass
+
+        self._loop.call_soon_threadsafe(invoke)
+
+
+class _PipeProtocol(asyncio.SubprocessProtocol):
+    def __init__(
+        self,
+        on_stdout_line: Callable[[bytes], None] | None,
+        capture_stdout: bool,
+        stderr_tail_bytes: int,
+        done: asyncio.Future,
+    ) -> None:
+        self._logger = get_logger("vediozip.process")
+        self._on_stdout_line = on_stdout_line
+        self._capture_stdout = capture_stdout
+        self._done = done
+        self._pending = bytearray()
+        self._captured = bytearray()
+        self._stderr = TailBuffer(stderr_tail_bytes)
+
+    def pipe_data_received(self, fd: int, data: bytes) -> None:
+        if fd == 1:
+            self._stdout_received(data)
+        else:
+            self._stderr.write(data)
+
+    def _stdout_received(self, data: bytes) -> None:
+        if self._capture_stdout and len(self._captured) < MAX_CAPTURE_BYTES:
+            self._captured += data[: MAX_CAPTURE_BYTES - len(self._captured)]
+        if self._on_stdout_line is None:
+            return
+        self._pending += data
+        *lines, rest = self._pending.split(b"\n")
+        self._pending = rest if len(rest) <= MAX_LINE_BYTES else bytearray()
+        for line in lines:
+            self._emit_line(bytes(line))
+
+    def _emit_line(self, line: bytes) -> None:
+        try:
+            self._on_stdout_line(line)
+        except Exception:
+            # A failing callback must not stop the pipe from draining.
+            self._logger.exception("Process output callback failed.")
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        # Called once the process has exited and both pipes are drained.
+        if self._pending and self._on_stdout_line is not None:
+            self._emit_line(bytes(self._pending))
+        if not self._done.done():
+            self._done.set_result(None)
+
+    def result(self, returncode: int, elapsed: float) -> ProcessResult:
+        stderr = self._stderr.getvalue()
+        if self._stderr.dropped:
+            # The cut usually lands inside a line; start at the next whole one.
+            stderr = stderr[stderr.find(b"\n") + 1 :]
+        return ProcessResult(
+            returncode=returncode,
+            stdout=self._captured.decode("utf-8", errors="replace"),
+            stderr=stderr.decode("utf-8", errors="replace"),
+            stderr_dropped=self._stderr.total - len(stderr),
+            elapsed=elapsed,
+        )
+
+
+class ProcessEngine:
+    """在同一个事件循环上运行全部 ffmpeg/ffprobe 子进程，并发读取 stdout 与 stderr。
+
+    协程通过 run_async 等待子进程，线程通过 run 等待；都不再为每个管道占用读取线程。输出按字节增量解析，缓冲区有上限。
+    """
+
+    def __init__(self, stderr_tail_bytes: int = STDERR_TAIL_BYTES) -> None:
+        self._logger = get_logger("vediozip.process")
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stderr_tail_bytes = stderr_tail_bytes
+
+    def run(
+        self,
+        cmd: list[str],
+        on_start: Callable[[EngineProcess], None] | None = None,
+        on_stdout_line: Callable[[bytes], None] | None = None,
+        capture_stdout: bool = False,
+        creationflags: int = 0,
+    ) -> ProcessResult:
+        """启动并等待子进程结束；on_start 与 on_stdout_line 在事件循环线程中调用，应尽快返回。"""
+        return self.call(self.run_async(cmd, on_start, on_stdout_line, capture_stdout, creationflags))
+
+    def submit(self, coroutine: Coroutine[Any, Any, _T]) -> Future[_T]:
+        """把协程交给引擎的事件循环执行，返回可在任意线程等待的 Future。"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._ensure_loop())
+
+    def call(self, coroutine: Coroutine[Any, Any, _T]) -> _T:
+        """在引擎的事件循环上执行协程并等待结果；不能在事件循环线程中调用。"""
+        loop = self._ensure_loop()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            # Blocking the loop on its own work would never return.
+            coroutine.close()
+            raise RuntimeError("ProcessEngine.call() used on the engine loop; await the coroutine instead.")
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    async def run_async(
+        self,
+        cmd: list[str],
+        on_start: Callable[[EngineProcess], None] | None = None,
+        on_stdout_line: Callable[[bytes], None] | None = None,
+        capture_stdout: bool = False,
+        creationflags: int = 0,
+    ) -> ProcessResult:
+        """run 的协程版本，只能在交给本引擎（submit/call）的协程中 await，等待时不占用线程。"""
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        started = loop.time()
+        transport, protocol = await loop.subprocess_exec(
+            lambda: _PipeProtocol(on_stdout_line, capture_stdout, self._stderr_tail_bytes, done),
+            *cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            creationflags=creationflags,
+        )
+        try:
+            if on_start is not None:
+                on_start(EngineProcess(loop, transport))
+            await done
+            return protocol.result(transport.get_returncode(), loop.time() - started)
+        except BaseException:
+            if transport.get_returncode() is None:
+                transport.kill()
+            raise
+        finally:
+            transport.close()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def serve() -> None:
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                threading.Thread(target=serve, name="process-engine", daemon=True).start()
+                ready.wait()
+                self._loop = loop
+                self._logger.info("Process engine started.")
+            return self._loop
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import os
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, TypeVar
+
+from app_logging import get_logger
+
+DEFAULT_ENCODER_NICE = 10
+DEFAULT_MAX_LOAD_PER_CORE = 1.5
+DEFAULT_MIN_AVAILABLE_MB = 512
+THROTTLE_POLL_SECONDS = 1.0
+
+_Number = TypeVar("_Number", int, float)
+
+
+def _default_core_budget() -> int:
+    # One core stays free for the web server and the UI.
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+@lru_cache(maxsize=None)
+def _launcher(name: str) -> str | None:
+    # nice/taskset exec the command in place, so the encoder keeps the pid and the settings from its first thread on.
+    return shutil.which(name) if os.name != "nt" else None
+
+
+def _env_number(name: str, default: _Number, convert: Callable[[str], _Number]) -> _Number:
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return convert(value)
+    except ValueError:
+        get_logger("vediozip.resources").warning("Invalid setting, using default. name=%s value=%s default=%s", name, value, default)
+        return default
+
+
+def parse_cpu_list(value: str) -> tuple[int, ...]:
+    """解析 "0-3,6" 形式的 CPU 列表。"""
+    cpus: set[int] = set()
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        try:
+            first, last = int(start), int(end or start)
+        except ValueError:
+            raise ValueError(f"无法识别的 CPU 列表: {value}") from None
+        if first < 0 or last < first:
+            raise ValueError(f"无法识别的 CPU 列表: {value}")
+        cpus.update(range(first, last + 1))
+    return tuple(sorted(cpus))
+
+
+@dataclass(frozen=True)
+class ResourcePolicy:
+    """编码子进程的资源策略：核心预算、线程分配、调度优先级与可选的 CPU 亲和性。"""
+
+    core_budget: int = 0
+    nice: int = DEFAULT_ENCODER_NICE
+    affinity: tuple[int, ...] | None = None
+    max_load_per_core: float = DEFAULT_MAX_LOAD_PER_CORE
+    min_available_mb: int = DEFAULT_MIN_AVAILABLE_MB
+
+    def __post_init__(self) -> None:
+        if self.core_budget <= 0:
+            budget = len(self.affinity) if self.affinity else _default_core_budget()
+            object.__setattr__(self, "core_budget", budget)
+
+    @classmethod
+    def from_env(cls) -> ResourcePolicy:
+        """读取 VEDIOZIP_* 环境变量；无法解析的值记录警告并使用默认值。"""
+        affinity = os.environ.get("VEDIOZIP_CPU_AFFINITY", "")
+        try:
+            cpus = parse_cpu_list(affinity) or None
+        except ValueError:
+            get_logger("vediozip.resources").warning("Invalid setting, using default. name=VEDIOZIP_CPU_AFFINITY value=%s default=None", affinity)
+            cpus = None
+        return cls(
+            core_budget=_env_number("VEDIOZIP_CORE_BUDGET", 0, int),
+            nice=_env_number("VEDIOZIP_ENCODER_NICE", DEFAULT_ENCODER_NICE, int),
+            affinity=cpus,
+            max_load_per_core=_env_number("VEDIOZIP_MAX_LOAD", DEFAULT_MAX_LOAD_PER_CORE, float),
+            min_available_mb=_env_number("VEDIOZIP_MIN_AVAILABLE_MB", DEFAULT_MIN_AVAILABLE_MB, int),
+        )
+
+    def threads_for(self, processes: int) -> int:
+        """把核心预算平均分给同时运行的编码进程。"""
+        return max(1, self.core_budget // max(1, processes))
+
+    def creationflags(self) -> int:
+        if self.nice <= 0:
+            return 0
+        # Windows has no nice value; the priority class is set at creation instead.
+        return getattr(subprocess, "BELOW_NORMAL_PRIORITY_CLASS", 0)
+
+    def wrap_command(self, cmd: list[str]) -> list[str]:
+        """POSIX 下用 taskset/nice 包装命令，优先级与亲和性在 exec 前生效，编码器的所有线程都会继承。"""
+        prefix: list[str] = []
+        taskset, nice = _launcher("taskset"), _launcher("nice")
+        if self.affinity and taskset:
+            prefix.extend([taskset, "-c", ",".join(str(cpu) for cpu in self.affinity)])
+        if self.nice > 0 and nice:
+            prefix.extend([nice, "-n", str(self.nice)])
+        return prefix + cmd
+
+    def apply(self, process: subprocess.Popen) -> None:
+        """补上 wrap_command 做不到的部分：Windows 的亲和性，或缺少 nice/taskset 时的事后设置。"""
+        # Set after Popen this reaches only the threads the process has so far, hence the wrapper first.
+        # preexec_fn is no alternative: it is not safe with the thread pools that start encoders.
+        logger = get_logger("vediozip.resources")
+        try:
+            if self.nice > 0 and hasattr(os, "setpriority") and not _launcher("nice"):
+                os.setpriority(os.PRIO_PROCESS, process.pid, self.nice)
+            if self.affinity:
+                if hasattr(os, "sched_setaffinity"):
+                    if not _launcher("taskset"):
+                        os.sched_setaffinity(process.pid, self.affinity)
+                elif os.name == "nt":
+                    mask = sum(1 << cpu for cpu in self.affinity)
+                    ctypes.windll.kernel32.SetProcessAffinityMask(ctypes.c_void_p(int(process._handle)), ctypes.c_size_t(mask))
+        except OSError as exc:
+            # The process may already have exited; it keeps the default priority otherwise.
+            logger.warning("Resource policy not applied. pid=%s error=%s", process.pid, exc)
+
+    def to_dict(self) -> dict:
+        return {
+            "core_budget": self.core_budget,
+            "nice": self.nice,
+            "affinity": list(self.affinity) if self.affinity else None,
+            "max_load_per_core": self.max_load_per_core,
+            "min_available_mb": self.min_available_mb,
+        }
+
+
+def load_per_core() -> float | None:
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+def available_memory_mb() -> float | None:
+    try:
+        with open("/proc/meminfo", encoding="ascii") as handle:
+            for line in handle:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if os.name == "nt":
+
+        class MemoryStatus(ctypes.Structure):
+            _fields_ = [
+                ("dwLength", ctypes.c_ulong),
+                ("dwMemoryLoad", ctypes.c_ulong),
+                ("ullTotalPhys", ctypes.c_ulonglong),
+                ("ullAvailPhys", ctypes.c_ulonglong),
+                ("ullTotalPageFile", ctypes.c_ulonglong),
+                ("ullAvailPageFile", ctypes.c_ulonglong),
+                ("ullTotalVirtual", ctypes.c_ulonglong),
+                ("ullAvailVirtual", ctypes.c_ulonglong),
+                ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+            ]
+
+        status = MemoryStatus(dwLength=ctypes.sizeof(MemoryStatus))
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullAvailPhys / (1024 * 1024)
+    return None
+
+
+class ResourceGovernor:
+    """系统负载过高或可用内存不足时，推迟启动新的编码。"""
+
+    def __init__(self, policy: ResourcePolicy) -> None:
+        self._logger = get_logger("vediozip.resources")
+        self.policy = policy
+        self._logger.info("Resource policy. %s", " ".join(f"{key}={value}" for key, value in policy.to_dict().items()))
+
+    def pressure(self) -> str | None:
+        load = load_per_core()
+        if load is not None and load > self.policy.max_load_per_core:
+            return f"load_per_core={load:.2f}"
+        memory = available_memory_mb()
+        if memory is not None and memory < self.policy.min_available_mb:
+            return f"available_mb={memory:.0f}"
+        return None
+
+    def wait_for_capacity(self, stop_event: threading.Event, busy: Callable[[], int]) -> None:
+        """busy 返回本服务正在运行的编码数；为 0 时不再等待，保证任务总能推进。"""
+        reason = self._blocking_reason(busy)
+        if reason is None:
+            return
+        started = time.monotonic()
+        self._logger.info("Encode start throttled. reason=%s", reason)
+        while reason is not None and not stop_event.wait(THROTTLE_POLL_SECONDS):
+            reason = self._blocking_reason(busy)
+        self._logger.info("Encode start resumed. waited_seconds=%.1f", time.monotonic() - started)
+
+    async def wait_for_capacity_async(self, stop_event: threading.Event, busy: Callable[[], int]) -> None:
+        """wait_for_capacity 的协程版本：在事件循环上等待，不占用线程。"""
+        reason = self._blocking_reason(busy)
+        if reason is None:
+            return
+        started = time.monotonic()
+        self._logger.info("Encode start throttled. reason=%s", reason)
+        while reason is not None and not stop_event.is_set():
+            await asyncio.sleep(THROTTLE_POLL_SECONDS)
+            reason = self._blocking_reason(busy)
+        self._logger.info("Encode start resumed. waited_seconds=%.1f", time.monotonic() - started)
+
+    def _blocking_reason(self, busy: Callable[[], int]) -> str | None:
+        return self.pressure() if busy() > 0 else None
+
+    def snapshot(self) -> dict[str, float]:
+        values = {"core_budget": float(self.policy.core_budget)}
+        load = load_per_core()
+        if load is not None:
+            values["load_per_core"] = load
+        memory = available_memory_mb()
+        if memory is not None:
+            values["available_mb"] = memory
+        return values
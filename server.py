@@ -1,20 +1,95 @@
 from __future__ import annotations
 
+import asyncio
+import hmac
+import json
+import os
 import sys
+import threading
+import time
+import uuid
 from pathlib import Path
 from typing import Literal
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
 
-from app_logging import get_logger
-from video_service import VideoConvertService
+from app_logging import get_cache_dir, get_logger
+from job_store import SUMMARY_EXCLUDED_FIELDS, JobStore
+from preset_tuner import DEFAULT_TARGET_SPEED
+from speed_profiles import DEFAULT_PROFILE
+from video_service import DEFAULT_SEGMENT_WORKERS, MAX_CONCURRENCY, MAX_RENDITIONS, TERMINAL_STATUSES, VideoConvertService
+from work_queue import DEFAULT_LEASE_SECONDS, WorkQueue
 
 logger = get_logger("vediozip.server")
 app = FastAPI(title="VedioZip")
-service = VideoConvertService()
+# VEDIOZIP_COORDINATOR=1 hands every file to encode workers (encode_worker.py) instead of encoding here.
+work_queue = (
+    WorkQueue(lease_seconds=float(os.environ.get("VEDIOZIP_LEASE_SECONDS", DEFAULT_LEASE_SECONDS)))
+    if os.environ.get("VEDIOZIP_COORDINATOR") == "1"
+    else None
+)
+WORKER_TOKEN = os.environ.get("VEDIOZIP_WORKER_TOKEN", "")
+if work_queue is not None and not WORKER_TOKEN:
+    # The work endpoints serve source files and overwrite outputs, so they are never open without a token.
+    logger.error("Coordinator mode needs VEDIOZIP_WORKER_TOKEN, refusing to start.")
+    raise RuntimeError("分布式模式需要设置 VEDIOZIP_WORKER_TOKEN，工作节点以 --token 传入相同的值。")
+service = VideoConvertService(job_store=JobStore(get_cache_dir() / "jobs.sqlite3"), work_queue=work_queue)
+
+# Minimum gap between two events of one stream, so bursts of progress coalesce into one snapshot.
+EVENT_MIN_INTERVAL = 0.25
+EVENT_KEEPALIVE_SECONDS = 15.0
+
+
+class JobEventHub:
+    """事件流的唯一通知源：一个线程等待服务的任务变更，再唤醒事件循环上所有等待中的连接。"""
+
+    def __init__(self, service: VideoConvertService) -> None:
+        self._service = service
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._changed: asyncio.Event | None = None
+        self._thread: threading.Thread | None = None
+
+    def subscribe(self) -> asyncio.Event:
+        """返回在下一次任务变更时置位的事件；须在读取任务状态之前调用，才不会漏掉其间的变更。"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._loop is not loop:
+                self._loop, self._changed = loop, asyncio.Event()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._watch, name="job-events", daemon=True)
+                self._thread.start()
+            return self._changed
+
+    def _watch(self) -> None:
+        sequence = self._service.wait_for_change(-1, 0)
+        while True:
+            sequence = self._service.wait_for_change(sequence)
+            with self._lock:
+                loop = self._loop
+            try:
+                loop.call_soon_threadsafe(self._wake)
+            except RuntimeError:
+                # The loop that subscribed has closed; the next subscriber brings its own.
+                pass
+
+    def _wake(self) -> None:
+        # A fresh event for the next change; everyone holding the old one wakes up now.
+        with self._lock:
+            changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+
+event_hub = JobEventHub(service)
+
+
+def _job_event(job: dict) -> str:
+    summary = {key: value for key, value in job.items() if key not in SUMMARY_EXCLUDED_FIELDS}
+    return f"id: {job['revision']}\nevent: job\ndata: {json.dumps(summary, ensure_ascii=False)}\n\n"
 
 
 def _resolve_static_dir() -> Path:
@@ -36,15 +111,58 @@ class PickPathRequest(BaseModel):
     kind: Literal["source_file", "source_folder", "output_folder"]
 
 
+class RenditionRequest(BaseModel):
+    height: int = Field(..., ge=120, le=2160)
+    crf: int | None = Field(None, ge=0, le=51, description="Defaults to the job CRF")
+    suffix: str = Field("", description="Output suffix; defaults to _<height>p")
+
+
 class StartJobRequest(BaseModel):
     source_path: str = Field(..., description="Input file or folder path")
     output_dir: str = Field(..., description="Output directory")
     height: int = Field(320, ge=120, le=2160)
     crf: int = Field(23, ge=0, le=51)
-    preset: str = Field("medium")
+    preset: str = Field("medium", description="x264 preset, or \"auto\" to pick one by trial encodes")
     audio_bitrate: str = Field("128k")
     suffix_mode: Literal["default", "none", "custom"] = Field("default")
     custom_suffix: str = Field("")
+    concurrency: int = Field(1, ge=1, le=MAX_CONCURRENCY)
+    incremental: bool = Field(False, description="Skip outputs that are up to date in the output manifest")
+    stream_copy: bool = Field(True, description="Copy streams that already satisfy the target instead of re-encoding")
+    priority: int = Field(0, ge=-100, le=100, description="Higher priority jobs leave the queue first")
+    segment_seconds: int = Field(0, ge=0, le=3600, description="Split long videos into segments encoded in parallel (0 = off)")
+    segment_workers: int = Field(DEFAULT_SEGMENT_WORKERS, ge=1, le=MAX_CONCURRENCY)
+    target_speed: float = Field(DEFAULT_TARGET_SPEED, gt=0, le=1000, description="Throughput target (x realtime) for the auto preset")
+    renditions: list[RenditionRequest] = Field(
+        default_factory=list,
+        max_length=MAX_RENDITIONS,
+        description="Encode several heights from one decode; replaces height/crf/suffix when given",
+    )
+    scratch_dir: str = Field("", description="Fast local directory for in-progress outputs; moved to output_dir when done")
+    deduplicate: bool = Field(True, description="Encode byte-identical sources once and link the result to the other outputs")
+    profile: str = Field(DEFAULT_PROFILE, description="Speed profile bundling scaler and x264 tuning (fastest/balanced/archive)")
+
+
+class ProfileBenchmarkRequest(BaseModel):
+    preset: str = Field("medium", description="x264 preset the profiles are compared at")
+    height: int = Field(720, ge=120, le=2160)
+    crf: int = Field(23, ge=0, le=51)
+
+
+class PriorityRequest(BaseModel):
+    priority: int = Field(..., ge=-100, le=100)
+
+
+class LeaseRequest(BaseModel):
+    worker_id: str = Field(..., min_length=1, max_length=200)
+
+
+class HeartbeatRequest(LeaseRequest):
+    telemetry: dict | None = None
+
+
+class FailRequest(LeaseRequest):
+    error: str = Field("", max_length=4000)
 
 
 def _pick_path(kind: str) -> str:
@@ -80,6 +198,16 @@ def health() -> dict:
     return {"ok": True}
 
 
+@app.get("/api/tools")
+def tools() -> dict:
+    return service.get_tool_info()
+
+
+@app.get("/api/metrics")
+def metrics() -> PlainTextResponse:
+    return PlainTextResponse(service.render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.post("/api/pick-path")
 async def pick_path(request: PickPathRequest) -> dict:
     path = _pick_path(request.kind)
@@ -89,7 +217,7 @@ async def pick_path(request: PickPathRequest) -> dict:
 @app.post("/api/start")
 def start_job(request: StartJobRequest) -> dict:
     logger.info(
-        "Start job request. source=%s output=%s height=%s crf=%s preset=%s audio=%s suffix_mode=%s custom_suffix=%s",
+        "Start job request. source=%s output=%s height=%s crf=%s preset=%s audio=%s suffix_mode=%s custom_suffix=%s concurrency=%s incremental=%s stream_copy=%s priority=%s segment_seconds=%s segment_workers=%s target_speed=%s renditions=%s scratch_dir=%s deduplicate=%s profile=%s",
         request.source_path,
         request.output_dir,
         request.height,
@@ -98,6 +226,17 @@ def start_job(request: StartJobRequest) -> dict:
         request.audio_bitrate,
         request.suffix_mode,
         request.custom_suffix,
+        request.concurrency,
+        request.incremental,
+        request.stream_copy,
+        request.priority,
+        request.segment_seconds,
+        request.segment_workers,
+        request.target_speed,
+        request.renditions,
+        request.scratch_dir,
+        request.deduplicate,
+        request.profile,
     )
     try:
         job_id = service.start_job(
@@ -109,6 +248,17 @@ def start_job(request: StartJobRequest) -> dict:
             audio_bitrate=request.audio_bitrate,
             suffix_mode=request.suffix_mode,
             custom_suffix=request.custom_suffix,
+            concurrency=request.concurrency,
+            incremental=request.incremental,
+            stream_copy=request.stream_copy,
+            priority=request.priority,
+            segment_seconds=request.segment_seconds,
+            segment_workers=request.segment_workers,
+            target_speed=request.target_speed,
+            renditions=[item.model_dump() for item in request.renditions],
+            scratch_dir=request.scratch_dir,
+            deduplicate=request.deduplicate,
+            profile=request.profile,
         )
     except ValueError as exc:
         logger.warning("Start job validation failed: %s", exc)
@@ -124,14 +274,270 @@ def start_job(request: StartJobRequest) -> dict:
     return job
 
 
+@app.post("/api/estimate")
+def estimate_job(request: StartJobRequest) -> dict:
+    logger.info(
+        "Estimate request. source=%s output=%s height=%s crf=%s preset=%s profile=%s concurrency=%s incremental=%s renditions=%s",
+        request.source_path,
+        request.output_dir,
+        request.height,
+        request.crf,
+        request.preset,
+        request.profile,
+        request.concurrency,
+        request.incremental,
+        request.renditions,
+    )
+    try:
+        return service.estimate_job(
+            source_path=request.source_path,
+            output_dir=request.output_dir,
+            height=request.height,
+            crf=request.crf,
+            preset=request.preset,
+            audio_bitrate=request.audio_bitrate,
+            suffix_mode=request.suffix_mode,
+            custom_suffix=request.custom_suffix,
+            concurrency=request.concurrency,
+            incremental=request.incremental,
+            stream_copy=request.stream_copy,
+            segment_seconds=request.segment_seconds,
+            segment_workers=request.segment_workers,
+            target_speed=request.target_speed,
+            renditions=[item.model_dump() for item in request.renditions],
+            profile=request.profile,
+        )
+    except ValueError as exc:
+        logger.warning("Estimate validation failed: %s", exc)
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except Exception:
+        logger.exception("Estimate failed unexpectedly")
+        raise HTTPException(status_code=500, detail="服务内部错误，请查看日志。")
+
+
+@app.get("/api/profiles")
+def list_profiles(
+    preset: str = Query("medium"),
+    height: int = Query(720, ge=120, le=2160),
+    crf: int = Query(23, ge=0, le=51),
+) -> dict:
+    return service.list_profiles(preset=preset, height=height, crf=crf)
+
+
+@app.post("/api/profiles/benchmark")
+def benchmark_profiles(request: ProfileBenchmarkRequest) -> dict:
+    logger.info("Profile benchmark request. preset=%s height=%s crf=%s", request.preset, request.height, request.crf)
+    try:
+        return service.benchmark_profiles(preset=request.preset, height=request.height, crf=request.crf)
+    except ValueError as exc:
+        logger.warning("Profile benchmark validation failed: %s", exc)
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except Exception:
+        logger.exception("Profile benchmark failed unexpectedly")
+        raise HTTPException(status_code=500, detail="服务内部错误，请查看日志。")
+
+
+@app.get("/api/jobs")
+def list_jobs(
+    status: Literal["queued", "running", "paused", "cancelling", "completed", "failed", "cancelled"] | None = None,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+) -> dict:
+    return service.list_jobs(status=status, limit=limit, offset=offset)
+
+
 @app.get("/api/jobs/{job_id}")
-def get_job(job_id: str) -> dict:
-    job = service.get_job(job_id)
+def get_job(job_id: str, detail: bool = False) -> dict:
+    job = service.get_job(job_id, detail=detail)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+
+@app.get("/api/jobs/{job_id}/events")
+def job_events(job_id: str) -> StreamingResponse:
+    if service.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+    async def stream():
+        # Woken by the event hub on any job change; the revision check is a lock-free read, and a snapshot
+        # is only taken when this job moved. get_job takes the service lock and a finished job is read from
+        # SQLite, so it stays off the event loop.
+        last_revision = None
+        last_sent = time.monotonic()
+        while True:
+            changed = event_hub.subscribe()
+            revision = service.get_job_revision(job_id)
+            if revision is None:
+                # No longer held in memory: send the stored final state once.
+                job = await run_in_threadpool(service.get_job, job_id)
+                if job is not None and last_revision is None:
+                    yield _job_event(job)
+                return
+            if revision != last_revision:
+                job = await run_in_threadpool(service.get_job, job_id)
+                if job is None:
+                    return
+                last_revision = job["revision"]
+                last_sent = time.monotonic()
+                yield _job_event(job)
+                if job["status"] in TERMINAL_STATUSES:
+                    return
+                await asyncio.sleep(EVENT_MIN_INTERVAL)
+                continue
+            idle_seconds = time.monotonic() - last_sent
+            if idle_seconds >= EVENT_KEEPALIVE_SECONDS:
+                last_sent = time.monotonic()
+                yield ": keepalive\n\n"
+                continue
+            try:
+                await asyncio.wait_for(changed.wait(), EVENT_KEEPALIVE_SECONDS - idle_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/api/jobs/{job_id}/cancel")
+def cancel_job(job_id: str) -> dict:
+    try:
+        job = service.cancel_job(job_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+
+@app.post("/api/jobs/{job_id}/pause")
+def pause_job(job_id: str) -> dict:
+    try:
+        job = service.pause_job(job_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+
+@app.post("/api/jobs/{job_id}/resume")
+def resume_job(job_id: str) -> dict:
+    try:
+        job = service.resume_job(job_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+
+@app.post("/api/jobs/{job_id}/priority")
+def set_job_priority(job_id: str, request: PriorityRequest) -> dict:
+    try:
+        job = service.set_job_priority(job_id, request.priority)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
     if job is None:
         raise HTTPException(status_code=404, detail="任务不存在")
     return job
 
 
+def _require_worker(x_worker_token: str = Header("")) -> WorkQueue:
+    if work_queue is None:
+        raise HTTPException(status_code=404, detail="未启用分布式模式（设置 VEDIOZIP_COORDINATOR=1）")
+    if not hmac.compare_digest(x_worker_token.encode("utf-8"), WORKER_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="工作节点令牌无效")
+    return work_queue
+
+
+@app.get("/api/workers")
+def list_workers() -> dict:
+    if work_queue is None:
+        return {"enabled": False, "workers": []}
+    return {"enabled": True, "lease_seconds": work_queue.lease_seconds, "workers": work_queue.workers()}
+
+
+@app.post("/api/work/lease")
+def lease_work(request: LeaseRequest, queue: WorkQueue = Depends(_require_worker)) -> Response:
+    item = queue.lease(request.worker_id)
+    if item is None:
+        return Response(status_code=204)
+    return Response(json.dumps(item, ensure_ascii=False), media_type="application/json")
+
+
+@app.post("/api/work/{item_id}/heartbeat")
+def heartbeat_work(item_id: str, request: HeartbeatRequest, queue: WorkQueue = Depends(_require_worker)) -> dict:
+    try:
+        return {"state": queue.heartbeat(item_id, request.worker_id, request.telemetry)}
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+
+
+@app.post("/api/work/{item_id}/complete")
+def complete_work(item_id: str, request: LeaseRequest, queue: WorkQueue = Depends(_require_worker)) -> dict:
+    try:
+        queue.complete(item_id, request.worker_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    return {"ok": True}
+
+
+@app.post("/api/work/{item_id}/fail")
+def fail_work(item_id: str, request: FailRequest, queue: WorkQueue = Depends(_require_worker)) -> dict:
+    try:
+        queue.fail(item_id, request.worker_id, request.error)
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    return {"ok": True}
+
+
+@app.get("/api/work/{item_id}/source")
+def download_work_source(item_id: str, worker_id: str, queue: WorkQueue = Depends(_require_worker)) -> FileResponse:
+    try:
+        payload = queue.payload(item_id, worker_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    return FileResponse(payload["input_file"])
+
+
+@app.put("/api/work/{item_id}/outputs/{index}")
+async def upload_work_output(
+    item_id: str,
+    index: int,
+    worker_id: str,
+    request: Request,
+    queue: WorkQueue = Depends(_require_worker),
+) -> dict:
+    try:
+        payload = queue.payload(item_id, worker_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    if not 0 <= index < len(payload["outputs"]):
+        raise HTTPException(status_code=404, detail="输出不存在")
+    output_file = Path(payload["outputs"][index]["path"])
+    await run_in_threadpool(output_file.parent.mkdir, parents=True, exist_ok=True)
+    # Written beside the target and renamed, so a broken upload never leaves a partial output.
+    partial = output_file.with_name(f".{output_file.name}.upload-{uuid.uuid4().hex[:8]}")
+    try:
+        # File calls run in the thread pool: a slow disk must not stall the event loop and every SSE stream.
+        handle = await run_in_threadpool(partial.open, "wb")
+        try:
+            async for chunk in request.stream():
+                await run_in_threadpool(handle.write, chunk)
+        finally:
+            await run_in_threadpool(handle.close)
+        await run_in_threadpool(os.replace, partial, output_file)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    logger.info("Work output uploaded. item_id=%s worker=%s output=%s", item_id, worker_id, output_file)
+    return {"ok": True}
+
+
 @app.get("/")
 def index() -> FileResponse:
     return FileResponse(STATIC_DIR / "index.html")
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from pathlib import Path
+from typing import Callable
+
+from app_logging import get_logger
+
+SAMPLE_BYTES = 64 * 1024
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+class SourceDeduplicator:
+    """识别内容完全相同的源文件，并让重复文件等待首个副本的输出完成。
+
+    先比较大小；大小相同再比较头/中/尾采样哈希；采样也相同时才计算全文件哈希。
+    """
+
+    def __init__(self) -> None:
+        self._logger = get_logger("vediozip.dedup")
+        self._lock = threading.Lock()
+        self._by_size: dict[int, list[Path]] = {}
+        self._samples: dict[Path, str] = {}
+        self._full_hashes: dict[Path, str] = {}
+        self._waiting: dict[Path, list[Callable[[], None]]] = {}
+        self._done: set[Path] = set()
+
+    def find_original(self, path: Path) -> Path | None:
+        """返回内容相同、先登记的文件；没有时把 path 登记为新的原始文件。"""
+        try:
+            size = path.stat().st_size
+            group = self._by_size.get(size)
+            if group is None:
+                self._by_size[size] = [path]
+                return None
+            sample = self._sample(path, size)
+            for candidate in group:
+                if self._sample(candidate, size) == sample and self._full_hash(candidate) == self._full_hash(path):
+                    self._logger.info("Duplicate source. path=%s original=%s", path, candidate)
+                    return candidate
+        except OSError:
+            self._logger.warning("Fingerprint failed, treat as unique. path=%s", path, exc_info=True)
+            return None
+        group.append(path)
+        return None
+
+    def defer(self, original: Path, action: Callable[[], None]) -> bool:
+        """原始文件的输出尚未完成时挂起 action 并返回 True；已完成时返回 False，由调用方立即执行。"""
+        with self._lock:
+            if original in self._done:
+                return False
+            self._waiting.setdefault(original, []).append(action)
+            return True
+
+    def mark_done(self, original: Path) -> list[Callable[[], None]]:
+        with self._lock:
+            self._done.add(original)
+            return self._waiting.pop(original, [])
+
+    def _sample(self, path: Path, size: int) -> str:
+        sample = self._samples.get(path)
+        if sample is None:
+            digest = hashlib.blake2b(str(size).encode("ascii"), digest_size=16)
+            with path.open("rb") as handle:
+                for offset in {0, max(0, size // 2 - SAMPLE_BYTES // 2), max(0, size - SAMPLE_BYTES)}:
+                    handle.seek(offset)
+                    digest.update(handle.read(SAMPLE_BYTES))
+            sample = self._samples[path] = digest.hexdigest()
+        return sample
+
+    def _full_hash(self, path: Path) -> str:
+        full_hash = self._full_hashes.get(path)
+        if full_hash is None:
+            digest = hashlib.blake2b(digest_size=32)
+            with path.open("rb") as handle:
+                while chunk := handle.read(HASH_CHUNK_BYTES):
+                    digest.update(chunk)
+            full_hash = self._full_hashes[path] = digest.hexdigest()
+        return full_hash
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+
+# swscale algorithms offered by the profiles; bicubic is what scale=-2:h uses when no flags are given.
+SCALE_FLAGS = ["fast_bilinear", "bilinear", "bicubic", "spline", "lanczos"]
+DEFAULT_SCALE_FLAGS = "bicubic"
+X264_TUNES = ["film", "animation", "grain", "stillimage", "fastdecode", "zerolatency"]
+DEFAULT_PROFILE = "balanced"
+# The profile every encode used before profiles existed; manifests written back then carry no profile field.
+LEGACY_PROFILE_TAG = "balanced@v1"
+
+_X264_PARAM_KEY = re.compile(r"^[a-z0-9][a-z0-9-]*$")
+_X264_PARAM_VALUE = re.compile(r"^[A-Za-z0-9.,+-]+$")
+
+
+@dataclass(frozen=True)
+class SpeedProfile:
+    """一组编码调优参数：缩放算法、x264 tune 与前瞻/参考帧等参数。
+
+    定义修改后须提升 version，增量清单据此识别需要重新转换的输出。
+    """
+
+    name: str
+    version: int
+    label: str
+    description: str
+    scale_flags: str = DEFAULT_SCALE_FLAGS
+    tune: str | None = None
+    x264_params: tuple[tuple[str, str], ...] = ()
+
+    def __post_init__(self) -> None:
+        if not re.match(r"^[a-z][a-z0-9_]*$", self.name):
+            raise ValueError(f"速度档位名称无效: {self.name}")
+        if self.version < 1:
+            raise ValueError(f"速度档位版本必须从 1 开始: {self.name}")
+        if self.scale_flags not in SCALE_FLAGS:
+            raise ValueError(f"不支持的缩放算法: {self.scale_flags}")
+        if self.tune is not None and self.tune not in X264_TUNES:
+            raise ValueError(f"不支持的 x264 tune: {self.tune}")
+        keys = [key for key, _ in self.x264_params]
+        if len(set(keys)) != len(keys):
+            raise ValueError(f"x264 参数重复: {self.name}")
+        for key, value in self.x264_params:
+            if not _X264_PARAM_KEY.match(key) or not _X264_PARAM_VALUE.match(value):
+                raise ValueError(f"无法识别的 x264 参数: {key}={value}")
+
+    @property
+    def tag(self) -> str:
+        return f"{self.name}@v{self.version}"
+
+    def scale_filter(self, height: int) -> str:
+        if self.scale_flags == DEFAULT_SCALE_FLAGS:
+            # Left implicit so the balanced commands stay exactly as they were.
+            return f"scale=-2:{height}"
+        return f"scale=-2:{height}:flags={self.scale_flags}"
+
+    def encoder_args(self) -> list[str]:
+        """追加在 -preset 之后的 libx264 参数。"""
+        args: list[str] = []
+        if self.tune is not None:
+            args.extend(["-tune", self.tune])
+        if self.x264_params:
+            args.extend(["-x264-params", ":".join(f"{key}={value}" for key, value in self.x264_params)])
+        return args
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "tag": self.tag,
+            "label": self.label,
+            "description": self.description,
+            "scale_flags": self.scale_flags,
+            "tune": self.tune,
+            "x264_params": dict(self.x264_params),
+        }
+
+
+PROFILES: dict[str, SpeedProfile] = {
+    profile.name: profile
+    for profile in (
+        SpeedProfile(
+            name="fastest",
+            version=2,
+            label="最快",
+            description="快速双线性缩放，缩短前瞻、单参考帧与简化运动搜索；体积略大，适合大批量预览。",
+            scale_flags="fast_bilinear",
+            x264_params=(("rc-lookahead", "10"), ("ref", "1"), ("me", "dia"), ("subme", "2")),
+        ),
+        SpeedProfile(
+            name="balanced",
+            version=1,
+            label="均衡",
+            description="ffmpeg 默认的双三次缩放与预设自带的编码参数。",
+        ),
+        SpeedProfile(
+            name="archive",
+            version=1,
+            label="归档",
+            description="Lanczos 缩放，加长前瞻、更多参考帧与 B 帧并启用自适应量化；更慢，同等 CRF 下画质更好。",
+            scale_flags="lanczos",
+            x264_params=(("rc-lookahead", "60"), ("ref", "5"), ("bframes", "5"), ("aq-mode", "3")),
+        ),
+    )
+}
+
+
+def get_profile(name: str) -> SpeedProfile:
+    profile = PROFILES.get(name)
+    if profile is None:
+        raise ValueError(f"不支持的速度档位: {name}")
+    return profile
@@ -8,8 +8,21 @@ const suffixModeEl = document.getElementById("suffixMode");
 const customSuffixEl = document.getElementById("customSuffix");
 const crfEl = document.getElementById("crf");
 const presetEl = document.getElementById("preset");
+const targetSpeedEl = document.getElementById("targetSpeed");
+const profileEl = document.getElementById("profile");
+const benchmarkBtn = document.getElementById("benchmarkBtn");
+const extraHeightsEl = document.getElementById("extraHeights");
+const scratchDirEl = document.getElementById("scratchDir");
+const deduplicateEl = document.getElementById("deduplicate");
 const audioBitrateEl = document.getElementById("audioBitrate");
+const concurrencyEl = document.getElementById("concurrency");
+const incrementalEl = document.getElementById("incremental");
+const streamCopyEl = document.getElementById("streamCopy");
+const segmentSecondsEl = document.getElementById("segmentSeconds");
 const startBtn = document.getElementById("startBtn");
+const estimateBtn = document.getElementById("estimateBtn");
+const cancelBtn = document.getElementById("cancelBtn");
+const pauseBtn = document.getElementById("pauseBtn");
 
 const statusTextEl = document.getElementById("statusText");
 const currentFileEl = document.getElementById("currentFile");
@@ -18,6 +31,7 @@ const progressBarEl = document.getElementById("progressBar");
 
 let activeJobId = null;
 let timerId = null;
+let eventSource = null;
 
 function showError(message) {
   statusTextEl.textContent = `错误: ${message}`;
@@ -63,6 +77,13 @@ function updateProgress(value) {
 
 function setRunningState(running) {
   startBtn.disabled = running;
+  estimateBtn.disabled = running;
+  benchmarkBtn.disabled = running;
+  cancelBtn.disabled = !running;
+  pauseBtn.disabled = !running;
+  if (!running) {
+    pauseBtn.textContent = "暂停";
+  }
   pickSourceBtn.disabled = running;
   pickOutputBtn.disabled = running;
   sourceTypeEls.forEach((el) => {
@@ -83,6 +104,48 @@ async function pickPath(kind, targetEl) {
   }
 }
 
+function stopWatching() {
+  if (eventSource) {
+    eventSource.close();
+    eventSource = null;
+  }
+  if (timerId) {
+    clearInterval(timerId);
+    timerId = null;
+  }
+}
+
+function renderJob(data) {
+  statusTextEl.textContent = data.message || data.status;
+  if (data.status === "queued" && data.queue_position) {
+    statusTextEl.textContent = `排队中（第 ${data.queue_position} 位）`;
+  }
+  const speed = data.telemetry && data.telemetry.speed;
+  if (data.status === "running" && speed) {
+    const eta = data.eta_seconds == null ? "" : `，剩余约 ${Math.ceil(data.eta_seconds)} 秒`;
+    statusTextEl.textContent += `（${speed.toFixed(1)}x${eta}）`;
+  }
+  currentFileEl.textContent = data.current_file || "-";
+  updateProgress(data.progress || 0);
+  pauseBtn.textContent = data.status === "paused" ? "继续" : "暂停";
+
+  if (data.status === "completed") {
+    setRunningState(false);
+    statusTextEl.textContent = data.deduplicated_files
+      ? `转换完成（${data.deduplicated_files} 个重复文件直接复用了输出）`
+      : "转换完成";
+    stopWatching();
+  } else if (data.status === "failed") {
+    setRunningState(false);
+    statusTextEl.textContent = `转换失败: ${data.error || "未知错误"}`;
+    stopWatching();
+  } else if (data.status === "cancelled") {
+    setRunningState(false);
+    statusTextEl.textContent = "任务已取消";
+    stopWatching();
+  }
+}
+
 async function pollJob() {
   if (!activeJobId) {
     return;
@@ -93,30 +156,39 @@ async function pollJob() {
     if (!resp.ok) {
       throw new Error(data.detail || "查询任务失败");
     }
-
-    statusTextEl.textContent = data.message || data.status;
-    currentFileEl.textContent = data.current_file || "-";
-    updateProgress(data.progress || 0);
-
-    if (data.status === "completed") {
-      setRunningState(false);
-      statusTextEl.textContent = "转换完成";
-      clearInterval(timerId);
-      timerId = null;
-    } else if (data.status === "failed") {
-      setRunningState(false);
-      statusTextEl.textContent = `转换失败: ${data.error || "未知错误"}`;
-      clearInterval(timerId);
-      timerId = null;
-    }
+    renderJob(data);
   } catch (err) {
     setRunningState(false);
-    clearInterval(timerId);
-    timerId = null;
+    stopWatching();
     showError(err.message);
   }
 }
 
+function startPolling() {
+  stopWatching();
+  timerId = setInterval(pollJob, 800);
+}
+
+function watchJob() {
+  stopWatching();
+  if (!window.EventSource) {
+    startPolling();
+    return;
+  }
+  const source = new EventSource(`/api/jobs/${activeJobId}/events`);
+  eventSource = source;
+  source.addEventListener("job", (event) => {
+    renderJob(JSON.parse(event.data));
+  });
+  source.onerror = () => {
+    // The server closes the stream once the job has finished; otherwise fall back to polling.
+    if (eventSource === source) {
+      startPolling();
+      pollJob();
+    }
+  };
+}
+
 pickSourceBtn.addEventListener("click", async () => {
   const sourceType = getSourceType();
   await pickPath(sourceType, sourcePathEl);
@@ -133,24 +205,188 @@ sourceTypeEls.forEach((el) => {
   });
 });
 
+cancelBtn.addEventListener("click", async () => {
+  if (!activeJobId) {
+    return;
+  }
+  try {
+    cancelBtn.disabled = true;
+    await postJson(`/api/jobs/${activeJobId}/cancel`, {});
+    await pollJob();
+  } catch (err) {
+    showError(err.message);
+  }
+});
+
+pauseBtn.addEventListener("click", async () => {
+  if (!activeJobId) {
+    return;
+  }
+  const action = pauseBtn.textContent === "继续" ? "resume" : "pause";
+  try {
+    pauseBtn.disabled = true;
+    await postJson(`/api/jobs/${activeJobId}/${action}`, {});
+    await pollJob();
+  } catch (err) {
+    showError(err.message);
+  } finally {
+    pauseBtn.disabled = !activeJobId || startBtn.disabled === false;
+  }
+});
+
 suffixModeEl.addEventListener("change", () => {
   updateSuffixControls();
 });
 
-startBtn.addEventListener("click", async () => {
+function buildPayload() {
   const sourcePath = sourcePathEl.value;
   const outputDir = outputDirEl.value;
 
   if (!sourcePath) {
     showError("请先选择输入路径");
-    return;
+    return null;
   }
   if (!outputDir) {
     showError("请先选择输出目录");
-    return;
+    return null;
   }
   if (suffixModeEl.value === "custom" && !customSuffixEl.value.trim()) {
     showError("请填写自定义后缀");
+    return null;
+  }
+  const extraHeights = extraHeightsEl.value
+    .split(/[,，\s]+/)
+    .filter((item) => item)
+    .map(Number);
+  if (extraHeights.some((item) => !Number.isInteger(item) || item < 120 || item > 2160)) {
+    showError("其他高度需为 120 到 2160 之间的整数，用逗号分隔");
+    return null;
+  }
+
+  const payload = {
+    source_path: sourcePath,
+    output_dir: outputDir,
+    height: Number(heightEl.value),
+    crf: Number(crfEl.value),
+    preset: presetEl.value,
+    audio_bitrate: audioBitrateEl.value,
+    suffix_mode: suffixModeEl.value,
+    custom_suffix: customSuffixEl.value.trim(),
+    concurrency: Number(concurrencyEl.value),
+    incremental: incrementalEl.value === "true",
+    stream_copy: streamCopyEl.value === "true",
+    segment_seconds: Number(segmentSecondsEl.value),
+    target_speed: Number(targetSpeedEl.value),
+    scratch_dir: scratchDirEl.value.trim(),
+    deduplicate: deduplicateEl.value === "true",
+    profile: profileEl.value,
+  };
+  if (extraHeights.length) {
+    // Each rendition is named by its height unless the main one has a custom suffix.
+    payload.renditions = [
+      { height: payload.height, crf: payload.crf, suffix: suffixModeEl.value === "custom" ? payload.custom_suffix : "" },
+      ...extraHeights.map((height) => ({ height })),
+    ];
+  }
+  return payload;
+}
+
+function formatDuration(seconds) {
+  if (seconds < 60) {
+    return `${Math.round(seconds)} 秒`;
+  }
+  if (seconds < 3600) {
+    return `${Math.round(seconds / 60)} 分钟`;
+  }
+  return `${(seconds / 3600).toFixed(1)} 小时`;
+}
+
+function formatBytes(bytes) {
+  const units = ["B", "KB", "MB", "GB", "TB"];
+  let value = bytes;
+  let unit = 0;
+  while (value >= 1024 && unit < units.length - 1) {
+    value /= 1024;
+    unit += 1;
+  }
+  return `${value.toFixed(unit ? 1 : 0)} ${units[unit]}`;
+}
+
+function benchmarkQuery() {
+  // Profiles are compared at the chosen preset; auto has no fixed preset, so its fallback is used.
+  const preset = presetEl.value === "auto" ? "veryfast" : presetEl.value;
+  return { preset, height: Number(heightEl.value), crf: Number(crfEl.value) };
+}
+
+function renderProfiles(data) {
+  const selected = profileEl.value || data.default;
+  profileEl.innerHTML = "";
+  data.profiles.forEach((profile) => {
+    const option = document.createElement("option");
+    option.value = profile.name;
+    const bench = profile.benchmark;
+    option.textContent = bench
+      ? `${profile.label}（本机 ${bench.speed.toFixed(1)}x，${Math.round(bench.bitrate / 1000)} kbps）`
+      : `${profile.label}（未测速）`;
+    option.title = profile.description;
+    profileEl.appendChild(option);
+  });
+  profileEl.value = data.profiles.some((profile) => profile.name === selected) ? selected : data.default;
+}
+
+async function loadProfiles() {
+  try {
+    const resp = await fetch(`/api/profiles?${new URLSearchParams(benchmarkQuery())}`);
+    if (resp.ok) {
+      renderProfiles(await resp.json());
+    }
+  } catch (err) {
+    // The built-in option stays usable when the list cannot be loaded.
+  }
+}
+
+benchmarkBtn.addEventListener("click", async () => {
+  const query = benchmarkQuery();
+  try {
+    benchmarkBtn.disabled = true;
+    statusTextEl.textContent = `正在本机测速各档位（${query.preset}，${query.height}p）`;
+    renderProfiles(await postJson("/api/profiles/benchmark", query));
+    statusTextEl.textContent = "测速完成，结果已显示在速度档位中";
+  } catch (err) {
+    showError(err.message);
+  } finally {
+    benchmarkBtn.disabled = startBtn.disabled;
+  }
+});
+
+[presetEl, heightEl, crfEl].forEach((el) => el.addEventListener("change", loadProfiles));
+
+estimateBtn.addEventListener("click", async () => {
+  const payload = buildPayload();
+  if (!payload) {
+    return;
+  }
+  try {
+    estimateBtn.disabled = true;
+    statusTextEl.textContent = "正在抽样试编码以预估";
+    const result = await postJson("/api/estimate", payload);
+    const wall = result.wall_seconds;
+    const size = result.output_bytes;
+    statusTextEl.textContent =
+      `预估 ${result.pending_files} 个文件（跳过 ${result.skipped_files} 个）：` +
+      `耗时约 ${formatDuration(wall.estimate)}（${formatDuration(wall.low)} - ${formatDuration(wall.high)}），` +
+      `输出约 ${formatBytes(size.estimate)}（${formatBytes(size.low)} - ${formatBytes(size.high)}），` +
+      `置信度 ${Math.round(result.confidence * 100)}%`;
+  } catch (err) {
+    showError(err.message);
+  } finally {
+    estimateBtn.disabled = startBtn.disabled;
+  }
+});
+
+startBtn.addEventListener("click", async () => {
+  const payload = buildPayload();
+  if (!payload) {
     return;
   }
 
@@ -160,25 +396,10 @@ startBtn.addEventListener("click", async () => {
     updateProgress(0);
     currentFileEl.textContent = "-";
 
-    const payload = {
-      source_path: sourcePath,
-      output_dir: outputDir,
-      height: Number(heightEl.value),
-      crf: Number(crfEl.value),
-      preset: presetEl.value,
-      audio_bitrate: audioBitrateEl.value,
-      suffix_mode: suffixModeEl.value,
-      custom_suffix: customSuffixEl.value.trim(),
-    };
-
     const job = await postJson("/api/start", payload);
     activeJobId = job.job_id;
     statusTextEl.textContent = "任务已启动";
-    if (timerId) {
-      clearInterval(timerId);
-    }
-    timerId = setInterval(pollJob, 800);
-    await pollJob();
+    watchJob();
   } catch (err) {
     setRunningState(false);
     showError(err.message);
@@ -187,3 +408,4 @@ startBtn.addEventListener("click", async () => {
 
 updateSourcePlaceholder();
 updateSuffixControls();
+loadProfiles();
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# The modules live at the repository root rather than in a package.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from job_store import JobStore  # noqa: E402
+from media_cache import MediaInfo  # noqa: E402
+from tool_registry import ToolRegistry  # noqa: E402
+from video_service import TERMINAL_STATUSES, VideoConvertService  # noqa: E402
+
+FAKE_MEDIA = MediaInfo(
+    duration=10.0,
+    video_codec="h264",
+    width=1920,
+    height=1080,
+    audio_codec="aac",
+    audio_bit_rate=320000,
+)
+
+
+@pytest.fixture
+def encoded(monkeypatch) -> list[list[str]]:
+    """替换 ffprobe/ffmpeg：探测固定返回 10 秒的 1080p 视频，编码只写出占位输出并记录命令。"""
+    commands: list[list[str]] = []
+
+    def probe(self, ffprobe_path: Path, video_file: Path) -> MediaInfo:
+        return FAKE_MEDIA
+
+    async def run_ffmpeg(self, job_id, cmd, input_file, output_file, on_progress=None) -> None:
+        commands.append(cmd)
+        Path(cmd[-1]).write_bytes(b"encoded " + Path(input_file).name.encode("utf-8"))
+
+    monkeypatch.setattr(VideoConvertService, "_probe_media", probe)
+    monkeypatch.setattr(VideoConvertService, "_run_ffmpeg", run_ffmpeg)
+    monkeypatch.setattr(VideoConvertService, "_resolve_tool_path", lambda self, tool_name: Path(tool_name))
+    monkeypatch.setattr(ToolRegistry, "has_encoder", lambda self, encoder, tool_name="ffmpeg": True)
+    return commands
+
+
+@pytest.fixture
+def service(tmp_path, encoded) -> VideoConvertService:
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    return VideoConvertService(job_store=JobStore(), cache_dir=cache_dir)
+
+
+@pytest.fixture
+def wait_for_job():
+    def wait(service: VideoConvertService, job_id: str, timeout: float = 30.0) -> dict:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = service.get_job(job_id)
+            if job["status"] in TERMINAL_STATUSES:
+                return job
+            time.sleep(0.02)
+        raise AssertionError(f"job {job_id} did not finish in {timeout}s")
+
+    return wait
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import json
+import logging
+import queue
+
+from app_logging import JsonLineFormatter, _NonBlockingQueueHandler
+
+
+def _record(message: str, *args, exc_info=None) -> logging.LogRecord:
+    return logging.LogRecord("vediozip.test", logging.INFO, __file__, 1, message, args, exc_info)
+
+
+def _drain(log_queue: queue.Queue) -> list[str]:
+    messages = []
+    while not log_queue.empty():
+        messages.append(log_queue.get_nowait().getMessage())
+    return messages
+
+
+def test_full_queue_drops_and_reports_the_count():
+    log_queue: queue.Queue = queue.Queue(maxsize=2)
+    handler = _NonBlockingQueueHandler(log_queue)
+    for index in range(5):
+        handler.handle(_record("Record. index=%s", index))
+    assert handler.dropped == 3
+    assert _drain(log_queue) == ["Record. index=0", "Record. index=1"]
+
+    handler.handle(_record("Record. index=%s", 5))
+    assert _drain(log_queue) == ["Record. index=5", "Log records dropped, queue full. count=3"]
+    assert handler.dropped == 0
+
+
+def test_message_rendered_when_logged():
+    log_queue: queue.Queue = queue.Queue()
+    handler = _NonBlockingQueueHandler(log_queue)
+    files = ["a.mp4"]
+    handler.handle(_record("Files. files=%s", files))
+    files.append("b.mp4")
+
+    assert _drain(log_queue) == ["Files. files=['a.mp4']"]
+
+
+def test_json_line_includes_exception():
+    try:
+        raise ValueError("bad input")
+    except ValueError as exc:
+        record = _record("Failed. path=%s", "a.mp4", exc_info=(type(exc), exc, exc.__traceback__))
+    log_queue: queue.Queue = queue.Queue()
+    _NonBlockingQueueHandler(log_queue).handle(record)
+
+    entry = json.loads(JsonLineFormatter().format(log_queue.get_nowait()))
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "vediozip.test"
+    assert entry["message"] == "Failed. path=a.mp4"
+    assert entry["exception"].endswith("ValueError: bad input")
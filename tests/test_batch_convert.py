@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import threading
+from functools import partial
+
+import batch_convert
+from video_service import VideoConvertService
+
+
+def test_file_inputs_encode_side_by_side(encoded, tmp_path, monkeypatch, capsys):
+    sources = []
+    for name in ("a.mp4", "b.mp4"):
+        sources.append(tmp_path / name)
+        sources[-1].write_bytes(name.encode())
+    # Both encodes have to be running at once for either to get past the wait.
+    started: list = []
+    both_started = asyncio.Event()
+    run_ffmpeg = VideoConvertService._run_ffmpeg
+
+    async def paired_ffmpeg(self, job_id, cmd, input_file, output_file, on_progress=None):
+        # Encodes are coroutines on the engine loop rather than one pool thread each.
+        assert threading.current_thread().name == "process-engine"
+        started.append(input_file)
+        if len(started) == 2:
+            both_started.set()
+        await asyncio.wait_for(both_started.wait(), 10)
+        await run_ffmpeg(self, job_id, cmd, input_file, output_file, on_progress)
+
+    monkeypatch.setattr(VideoConvertService, "_run_ffmpeg", paired_ffmpeg)
+    monkeypatch.setattr(batch_convert, "VideoConvertService", partial(VideoConvertService, cache_dir=tmp_path / "cache"))
+    monkeypatch.setattr(batch_convert.signal, "signal", lambda signum, handler: None)
+    output = tmp_path / "out"
+    monkeypatch.setattr(sys, "argv", ["batch_convert.py", *map(str, sources), "-o", str(output), "-j", "2", "--interval", "0"])
+
+    assert batch_convert.main() == 0
+    events = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [event["status"] for event in events if event["event"] == "end"] == ["completed", "completed"]
+    assert sorted(path.name for path in output.iterdir()) == ["a_320p.mp4", "b_320p.mp4"]
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import math
+from dataclasses import replace
+
+import pytest
+
+from batch_estimator import (
+    MIN_MODEL_ERROR,
+    SINGLE_OBSERVATION_ERROR,
+    SampledFile,
+    SpeedModel,
+    _mean_error,
+    _ratio_total,
+    estimate_batch,
+)
+from video_service import VideoConvertService
+
+
+def _sample(source_bytes: int, media_seconds: float, speed: float = 2.0, bitrate: float = 8000.0) -> SampledFile:
+    return SampledFile(
+        source_bytes=source_bytes,
+        media_seconds=media_seconds,
+        encode_seconds=media_seconds / speed,
+        output_bytes=media_seconds * bitrate / 8,
+        time_error=0.0,
+        size_error=0.0,
+    )
+
+
+def test_speed_model_averages_time_not_speed():
+    model = SpeedModel.from_observations([{"speed": 1.0, "bitrate": 1000}, {"speed": 3.0, "bitrate": 3000}], trials=1)
+    # One second of media costs 1 s and 1/3 s, so on average 2/3 s.
+    assert model.speed == pytest.approx(1.5)
+    assert model.bitrate == 2000
+    assert (model.trials, model.history) == (1, 1)
+
+
+def test_mean_error_floors_and_single_observation():
+    assert _mean_error([2.0]) == SINGLE_OBSERVATION_ERROR
+    assert _mean_error([2.0, 2.0, 2.0]) == MIN_MODEL_ERROR
+    values = [1.0, 3.0]
+    assert _mean_error(values) == pytest.approx(math.sqrt(2.0 / 2) / 2.0)
+
+
+def test_ratio_total_scales_by_bytes():
+    total, error = _ratio_total([10.0, 30.0], [100, 300], population=2, population_bytes=400)
+    assert (total, error) == (40.0, 0.0)
+
+    total, error = _ratio_total([10.0, 30.0], [100, 300], population=10, population_bytes=4000)
+    assert total == pytest.approx(400.0)
+    # Both samples sit exactly on the ratio line, so the sampling error vanishes.
+    assert error == pytest.approx(0.0)
+
+    total, error = _ratio_total([10.0], [100], population=10, population_bytes=1000)
+    assert (total, error) == (100.0, SINGLE_OBSERVATION_ERROR)
+    assert _ratio_total([], [], population=10, population_bytes=1000) == (0.0, 0.0)
+
+
+def test_estimate_of_a_full_census_is_exact():
+    samples = [_sample(100, 10.0), _sample(300, 30.0)]
+    result = estimate_batch(samples, files=2, source_bytes=400, concurrency=4)
+
+    assert result["media_seconds"] == {"estimate": 40.0, "low": 40.0, "high": 40.0}
+    # Four parallel slots but only two files: the wall time halves, not quarters.
+    assert result["wall_seconds"]["estimate"] == pytest.approx(10.0)
+    assert result["output_bytes"]["estimate"] == pytest.approx(40000.0)
+
+
+def test_estimate_interval_widens_with_sampling_and_model_error():
+    samples = [_sample(100, 10.0), _sample(100, 20.0), _sample(200, 20.0)]
+    samples[0] = replace(samples[0], time_error=0.2, size_error=0.2)
+    result = estimate_batch(samples, files=30, source_bytes=4000, concurrency=1)
+
+    for key in ("media_seconds", "wall_seconds", "output_bytes"):
+        bounds = result[key]
+        assert 0 <= bounds["low"] < bounds["estimate"] < bounds["high"]
+        assert bounds["high"] - bounds["estimate"] == pytest.approx(bounds["estimate"] - bounds["low"])
+    assert result["media_seconds"]["estimate"] == pytest.approx(50.0 / 400 * 4000)
+
+
+def test_estimate_job_extrapolates_from_trials(service, tmp_path, monkeypatch):
+    source = tmp_path / "src"
+    source.mkdir()
+    for index in range(6):
+        (source / f"clip_{index}.mp4").write_bytes(b"x" * 1000)
+    output = tmp_path / "out"
+    output.mkdir()
+    trials = []
+
+    def trial(self, ffmpeg_path, input_file, media, targets, copy_plans, options, threads):
+        trials.append(input_file)
+        return {"speed": 2.0, "bitrate": 800_000.0}
+
+    monkeypatch.setattr(VideoConvertService, "_trial_observation", trial)
+    result = service.estimate_job(str(source), str(output), 240, 23, "veryfast", "128k", concurrency=2, stream_copy=False)
+
+    assert trials
+    assert result["pending_files"] == 6
+    # Every fake file is 10 s long, encodes at 2x and comes out at 800 kbit/s.
+    assert result["media_seconds"]["estimate"] == pytest.approx(60.0)
+    assert result["wall_seconds"]["estimate"] == pytest.approx(60.0 / 2.0 / 2)
+    assert result["output_bytes"]["estimate"] == pytest.approx(60.0 * 800_000 / 8)
+    assert result["profile"] == "balanced@v1"
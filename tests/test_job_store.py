@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import time
+
+import video_service
+from job_store import DETAIL_FIELDS, JobStore
+from video_service import JobState
+
+
+def _job(job_id: str, status: str = "running", created_at: float = 0.0, finished_at: float | None = None) -> JobState:
+    return JobState(
+        job_id=job_id,
+        status=status,
+        progress=0.0,
+        message="",
+        source_path="/src",
+        output_dir="/out",
+        target_height=720,
+        total_files=1,
+        processed_files=0,
+        current_file=None,
+        error=None,
+        suffix_mode="default",
+        custom_suffix="",
+        created_at=created_at or time.time(),
+        updated_at=created_at or time.time(),
+        finished_at=finished_at,
+        stream_modes={"/src/a.mp4": "transcode"},
+    )
+
+
+def _finish(store: JobStore, job: JobState, status: str = "completed") -> None:
+    job.status = status
+    job.finished_at = time.time()
+    store.save(job)
+
+
+def test_finished_jobs_evicted_in_lru_order():
+    store = JobStore(max_hot=2)
+    jobs = [_job(f"job{index}") for index in range(3)]
+    for job in jobs[:2]:
+        store.add(job)
+        _finish(store, job)
+    # Reading job0 makes job1 the least recently used.
+    assert store.get("job0") is jobs[0]
+
+    store.add(jobs[2])
+    assert store.peek("job1") is None
+    assert store.peek("job0") is jobs[0]
+    assert store.peek("job2") is jobs[2]
+
+
+def test_running_jobs_are_never_evicted():
+    store = JobStore(max_hot=1)
+    for index in range(3):
+        store.add(_job(f"job{index}"))
+    assert [job.job_id for job in store.values()] == ["job0", "job1", "job2"]
+
+    _finish(store, store.peek("job1"))
+    assert store.peek("job1") is None
+    assert store.peek("job0") is not None and store.peek("job2") is not None
+
+
+def test_finished_jobs_expire_after_ttl():
+    store = JobStore(hot_ttl_seconds=60)
+    old = _job("old")
+    store.add(old)
+    old.status = "completed"
+    old.finished_at = time.time() - 120
+    store.add(_job("fresh"))
+    _finish(store, store.peek("fresh"))
+
+    assert store.peek("old") is None
+    assert store.peek("fresh") is not None
+
+
+def test_evicted_jobs_load_from_sqlite(tmp_path):
+    store = JobStore(db_path=tmp_path / "jobs.sqlite3", max_hot=1)
+    first = _job("first")
+    store.add(first)
+    _finish(store, first)
+    store.add(_job("second"))
+    _finish(store, store.peek("second"))
+
+    assert store.peek("first") is None
+    assert store.contains("first")
+    assert store.load("first")["status"] == "completed"
+    assert store.load("missing") is None
+
+
+def test_restart_marks_interrupted_jobs_failed(tmp_path):
+    db_path = tmp_path / "jobs.sqlite3"
+    store = JobStore(db_path=db_path)
+    store.add(_job("running"))
+    done = _job("done")
+    store.add(done)
+    _finish(store, done)
+
+    reopened = JobStore(db_path=db_path)
+    interrupted = reopened.load("running")
+    assert interrupted["status"] == "failed"
+    assert interrupted["error"] == "服务重启，任务已中断"
+    assert interrupted["finished_at"] is not None
+    assert reopened.load("done")["status"] == "completed"
+
+
+def test_list_pages_newest_first_with_hot_state(tmp_path):
+    store = JobStore(db_path=tmp_path / "jobs.sqlite3")
+    for index in range(5):
+        store.add(_job(f"job{index}", created_at=1000.0 + index))
+    _finish(store, store.peek("job1"), status="failed")
+    # The hot copy wins over the last saved snapshot.
+    store.peek("job4").progress = 0.5
+
+    total, items = store.list(limit=2)
+    assert total == 5
+    assert [item["job_id"] for item in items] == ["job4", "job3"]
+    assert items[0]["progress"] == 0.5
+    assert "stream_modes" not in items[0]
+
+    total, items = store.list(limit=2, offset=2)
+    assert [item["job_id"] for item in items] == ["job2", "job1"]
+
+    total, items = store.list(status="failed")
+    assert total == 1 and items[0]["job_id"] == "job1"
+
+
+def test_list_without_database_uses_hot_jobs():
+    store = JobStore()
+    for index in range(3):
+        store.add(_job(f"job{index}", created_at=1000.0 + index))
+
+    total, items = store.list(limit=2)
+    assert total == 3
+    assert [item["job_id"] for item in items] == ["job2", "job1"]
+
+
+def test_discard_removes_stored_job(tmp_path):
+    store = JobStore(db_path=tmp_path / "jobs.sqlite3")
+    store.add(_job("gone"))
+    store.discard("gone")
+
+    assert store.peek("gone") is None
+    assert not store.contains("gone")
+
+
+def test_job_keeps_recent_file_details_only(service, wait_for_job, tmp_path, monkeypatch):
+    monkeypatch.setattr(video_service, "FILE_DETAIL_LIMIT", 3)
+    source = tmp_path / "src"
+    source.mkdir()
+    for index in range(8):
+        (source / f"clip_{index}.mp4").write_bytes(f"clip {index}".encode())
+    output = tmp_path / "out"
+    output.mkdir()
+
+    job_id = service.start_job(str(source), str(output), 240, 23, "veryfast", "128k", stream_copy=False)
+    summary = wait_for_job(service, job_id)
+    assert summary["status"] == "completed", summary["error"]
+    assert not DETAIL_FIELDS & summary.keys()
+    assert summary["stream_mode_counts"] == {"encode": 8}
+
+    detail = service.get_job(job_id, detail=True)
+    assert list(detail["stream_modes"]) == [str(source / f"clip_{index}.mp4") for index in (5, 6, 7)]
+    assert len(detail["file_telemetry"]) <= 3
+
+
+def test_wait_for_change_wakes_on_job_updates(service, wait_for_job, tmp_path):
+    sequence = service.wait_for_change(-1, 0)
+    assert service.wait_for_change(sequence, 0.01) == sequence
+
+    source = tmp_path / "a.mp4"
+    source.write_bytes(b"source")
+    job = wait_for_job(service, service.start_job(str(source), str(tmp_path), 240, 23, "veryfast", "128k"))
+    assert job["status"] == "completed", job["error"]
+    assert service.wait_for_change(sequence, 0) >= sequence + job["revision"]
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import errno
+import os
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+import output_staging
+from output_staging import SCRATCH_RESERVE_BYTES, STALE_PARTIAL_SECONDS, OutputStager
+from video_service import VideoConvertService
+
+
+def _age(path: Path, seconds: float) -> None:
+    stamp = time.time() - seconds
+    os.utime(path, (stamp, stamp))
+
+
+def test_staging_path_is_hidden_next_to_output_or_in_scratch(tmp_path):
+    output = tmp_path / "out" / "clip_720p.mp4"
+    staged = OutputStager().staging_path(output)
+    assert staged.parent == output.parent
+    assert staged.name.startswith(".clip_720p.partial-") and staged.suffix == ".mp4"
+
+    scratch = tmp_path / "scratch"
+    stager = OutputStager(scratch)
+    assert stager.staging_path(output).parent == scratch
+    assert stager.staging_path(output, use_scratch=False).parent == output.parent
+
+
+def test_commit_replaces_existing_output(tmp_path):
+    output = tmp_path / "clip.mp4"
+    output.write_bytes(b"old")
+    stager = OutputStager()
+    staged = stager.staging_path(output)
+    staged.write_bytes(b"new")
+
+    stager.commit(staged, output)
+    assert output.read_bytes() == b"new"
+    assert not staged.exists()
+    assert staged not in output_staging._active_partials
+
+
+def test_commit_across_devices_copies_through_a_partial(tmp_path, monkeypatch):
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+    output = tmp_path / "out" / "clip.mp4"
+    stager = OutputStager(scratch)
+    staged = stager.staging_path(output)
+    staged.write_bytes(b"encoded")
+    replace = os.replace
+
+    def cross_device_replace(src, dst):
+        if Path(src) == staged:
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        replace(src, dst)
+
+    monkeypatch.setattr(output_staging.os, "replace", cross_device_replace)
+    stager.commit(staged, output)
+
+    assert output.read_bytes() == b"encoded"
+    assert not staged.exists()
+    assert [path.name for path in output.parent.iterdir()] == ["clip.mp4"]
+
+
+def test_failed_copy_keeps_previous_output(tmp_path, monkeypatch):
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+    output = tmp_path / "clip.mp4"
+    output.write_bytes(b"previous")
+    stager = OutputStager(scratch)
+    staged = stager.staging_path(output)
+    staged.write_bytes(b"encoded")
+
+    def exdev(src, dst):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    def disk_full(src, dst):
+        Path(dst).write_bytes(b"trunc")
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(output_staging.os, "replace", exdev)
+    monkeypatch.setattr(output_staging.shutil, "copyfile", disk_full)
+    with pytest.raises(OSError):
+        stager.commit(staged, output)
+
+    assert output.read_bytes() == b"previous"
+    assert [path.name for path in tmp_path.iterdir() if path.is_file()] == ["clip.mp4"]
+
+
+def test_link_shares_content_or_copies(tmp_path, monkeypatch):
+    original = tmp_path / "a.mp4"
+    original.write_bytes(b"encoded")
+    stager = OutputStager()
+
+    stager.link(original, tmp_path / "b.mp4")
+    assert os.path.samefile(original, tmp_path / "b.mp4")
+
+    def no_links(src, dst):
+        raise OSError(errno.EPERM, "Operation not permitted")
+
+    monkeypatch.setattr(output_staging.os, "link", no_links)
+    stager.link(original, tmp_path / "c.mp4")
+    assert (tmp_path / "c.mp4").read_bytes() == b"encoded"
+    assert not os.path.samefile(original, tmp_path / "c.mp4")
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a.mp4", "b.mp4", "c.mp4"]
+
+
+def test_sweep_removes_only_stale_leftovers(tmp_path):
+    stale = tmp_path / ".a.partial-1a2b3c4d.mp4"
+    upload = tmp_path / ".b_720p.mp4.upload-0123abcd"
+    fresh = tmp_path / ".c.partial-deadbeef.mp4"
+    unrelated = tmp_path / ".d.partial-notahash.mp4"
+    output = tmp_path / "e.mp4"
+    for path in (stale, upload, fresh, unrelated, output):
+        path.write_bytes(b"x")
+    for path in (stale, upload, unrelated, output):
+        _age(path, STALE_PARTIAL_SECONDS + 60)
+    stager = OutputStager()
+    # A paused encode does not touch its partial file, but this process still owns it.
+    active = stager.staging_path(tmp_path / "f.mp4")
+    active.write_bytes(b"x")
+    _age(active, STALE_PARTIAL_SECONDS + 60)
+
+    assert stager.sweep(tmp_path) == 2
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        [fresh.name, unrelated.name, output.name, active.name]
+    )
+
+
+def test_sweep_removes_stale_segment_directories(tmp_path):
+    def segments(name: str, age: float) -> Path:
+        directory = tmp_path / name
+        directory.mkdir()
+        (directory / "segment_00000.mp4").write_bytes(b"x")
+        _age(directory / "segment_00000.mp4", age)
+        _age(directory, STALE_PARTIAL_SECONDS + 60)
+        return directory
+
+    stale = segments(".a.partial-1a2b3c4d.mp4.segments", STALE_PARTIAL_SECONDS + 60)
+    # The directory itself is old, but a segment is still being written into it.
+    writing = segments(".b.partial-0123abcd.mp4.segments", 0)
+    stager = OutputStager()
+    active = stager.staging_path(tmp_path / "c.mp4")
+    owned = segments(f"{active.name}.segments", STALE_PARTIAL_SECONDS + 60)
+
+    assert stager.sweep(tmp_path) == 1
+    assert not stale.exists()
+    assert writing.exists() and owned.exists()
+
+
+def test_sweep_checks_each_directory_once(tmp_path):
+    stager = OutputStager()
+    assert stager.sweep(tmp_path) == 0
+    leftover = tmp_path / ".a.partial-1a2b3c4d.mp4"
+    leftover.write_bytes(b"x")
+    _age(leftover, STALE_PARTIAL_SECONDS + 60)
+
+    assert stager.sweep(tmp_path) == 0
+    assert OutputStager().sweep(tmp_path) == 1
+
+
+def test_scratch_reservations_do_not_overcommit(tmp_path, monkeypatch):
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+    free = SCRATCH_RESERVE_BYTES + 1000
+    monkeypatch.setattr(output_staging.shutil, "disk_usage", lambda path: SimpleNamespace(free=free))
+    stager = OutputStager(scratch)
+    other = OutputStager(scratch)
+
+    assert stager.reserve_scratch(600)
+    # Another job on the same volume sees the bytes already promised.
+    assert not other.reserve_scratch(600)
+    assert other.reserve_scratch(400)
+
+    stager.release_scratch(600)
+    assert other.reserve_scratch(600)
+    other.release_scratch(400)
+    other.release_scratch(600)
+    assert scratch not in output_staging._scratch_reserved
+
+
+def test_reserve_without_scratch_dir_declines():
+    assert not OutputStager().reserve_scratch(0)
+
+
+def test_job_through_scratch_commits_and_releases(service, wait_for_job, tmp_path):
+    source = tmp_path / "src"
+    (source / "sub").mkdir(parents=True)
+    for name in ("a.mp4", "sub/b.mp4", "sub/c.mp4"):
+        (source / name).write_bytes(name.encode("utf-8") * 100)
+    output = tmp_path / "out"
+    (output / "sub").mkdir(parents=True)
+    leftover = output / "sub" / ".b_240p.partial-1a2b3c4d.mp4"
+    leftover.write_bytes(b"x")
+    _age(leftover, STALE_PARTIAL_SECONDS + 60)
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+
+    job_id = service.start_job(
+        str(source), str(output), 240, 23, "veryfast", "128k", concurrency=2, scratch_dir=str(scratch), deduplicate=False
+    )
+    job = wait_for_job(service, job_id)
+
+    assert job["status"] == "completed", job["error"]
+    assert sorted(str(path.relative_to(output)) for path in output.rglob("*") if path.is_file()) == [
+        "a_240p.mp4",
+        "sub/b_240p.mp4",
+        "sub/c_240p.mp4",
+    ]
+    assert list(scratch.iterdir()) == []
+    assert scratch not in output_staging._scratch_reserved
+
+
+def test_failed_encode_leaves_no_partial(service, wait_for_job, tmp_path, monkeypatch):
+    async def broken_ffmpeg(self, job_id, cmd, input_file, output_file, on_progress=None):
+        Path(cmd[-1]).write_bytes(b"half")
+        raise RuntimeError("ffmpeg exited with 1")
+
+    monkeypatch.setattr(VideoConvertService, "_run_ffmpeg", broken_ffmpeg)
+    source = tmp_path / "a.mp4"
+    source.write_bytes(b"source")
+    output = tmp_path / "out"
+    output.mkdir()
+    (output / "a_240p.mp4").write_bytes(b"earlier run")
+
+    job = wait_for_job(service, service.start_job(str(source), str(output), 240, 23, "veryfast", "128k"))
+
+    assert job["status"] == "failed"
+    assert [path.name for path in output.iterdir()] == ["a_240p.mp4"]
+    assert (output / "a_240p.mp4").read_bytes() == b"earlier run"
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from preset_tuner import PresetTuner, TrialSample
+from process_engine import ProcessResult
+
+
+def test_trial_encode_writes_under_the_tuner_cache_dir(tmp_path):
+    outputs: list[Path] = []
+
+    def runner(cmd: list[str]) -> ProcessResult:
+        output = Path(cmd[-1])
+        output.write_bytes(b"x" * 500)
+        outputs.append(output)
+        return ProcessResult(returncode=0, stdout="frame=50\nout_time_us=2000000\nprogress=end\n", stderr="", elapsed=1.0)
+
+    tuner = PresetTuner(tmp_path / "cache" / "preset_benchmarks.json", runner=runner)
+    sample = TrialSample(input_file=tmp_path / "a.mp4", start=0.0, seconds=2.0, source_height=1080)
+    result = tuner.trial_encode(Path("ffmpeg"), sample, 720, 23, "veryfast", threads=None)
+
+    assert result is not None
+    assert (result.media_seconds, result.frames, result.output_bytes) == (2.0, 50, 500)
+    (output,) = outputs
+    assert output.parent == tmp_path / "cache" / "trials"
+    assert not output.exists()
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import sys
+
+import pytest
+
+from process_engine import ProcessEngine, TailBuffer
+
+
+def _python(code: str) -> list[str]:
+    return [sys.executable, "-c", code]
+
+
+def test_tail_buffer_below_capacity():
+    buffer = TailBuffer(8)
+    buffer.write(b"abc")
+    buffer.write(b"de")
+    assert buffer.getvalue() == b"abcde"
+    assert (buffer.total, buffer.dropped) == (5, 0)
+
+
+def test_tail_buffer_wraps_around():
+    buffer = TailBuffer(8)
+    for chunk in (b"abcdef", b"ghij", b"kl"):
+        buffer.write(chunk)
+    assert buffer.getvalue() == b"efghijkl"
+    assert (buffer.total, buffer.dropped) == (12, 4)
+
+
+def test_tail_buffer_chunk_larger_than_capacity():
+    buffer = TailBuffer(4)
+    buffer.write(b"ab")
+    buffer.write(b"0123456789")
+    assert buffer.getvalue() == b"6789"
+    buffer.write(b"x")
+    assert buffer.getvalue() == b"789x"
+    assert buffer.dropped == 9
+
+
+def test_tail_buffer_matches_slicing():
+    rng = random.Random(7)
+    for capacity in (1, 5, 64):
+        buffer = TailBuffer(capacity)
+        written = b""
+        for _ in range(300):
+            chunk = rng.randbytes(rng.randint(0, capacity * 2))
+            buffer.write(chunk)
+            written += chunk
+            assert buffer.getvalue() == written[-capacity:]
+        assert buffer.total == len(written)
+
+
+@pytest.fixture
+def engine() -> ProcessEngine:
+    return ProcessEngine(stderr_tail_bytes=64)
+
+
+def test_run_captures_output_and_exit_code(engine):
+    result = engine.run(
+        _python("import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)"),
+        capture_stdout=True,
+    )
+    assert result.returncode == 3
+    assert result.stdout.strip() == "out"
+    assert result.stderr.strip() == "err"
+    assert result.stderr_dropped == 0
+    assert result.elapsed > 0
+
+
+def test_run_keeps_whole_lines_of_the_stderr_tail(engine):
+    code = "import sys\nfor i in range(100): print(f'line {i:03d}', file=sys.stderr)"
+    result = engine.run(_python(code))
+
+    lines = result.stderr.splitlines()
+    assert lines[-1] == "line 099"
+    assert all(line.startswith("line ") and len(line) == 8 for line in lines)
+    assert len(result.stderr) <= 64
+    assert result.stderr_dropped == 900 - len(result.stderr)
+
+
+def test_run_streams_stdout_lines(engine):
+    lines: list[bytes] = []
+    result = engine.run(_python("print('a'); print('b', end='')"), on_stdout_line=lines.append)
+    assert result.returncode == 0
+    assert lines == [b"a", b"b"]
+    assert result.stdout == ""
+
+
+def test_failing_line_callback_does_not_stall_the_pipe(engine):
+    def boom(line: bytes) -> None:
+        raise RuntimeError("callback failed")
+
+    result = engine.run(_python("for i in range(1000): print(i)"), on_stdout_line=boom, capture_stdout=True)
+    assert result.returncode == 0
+    assert result.stdout.split()[-1] == "999"
+
+
+def test_missing_executable_raises(engine, tmp_path):
+    with pytest.raises(OSError):
+        engine.run([str(tmp_path / "no-such-tool")])
+
+
+def test_coroutines_share_the_engine_loop(engine):
+    async def both() -> list[int]:
+        results = await asyncio.gather(*(engine.run_async(_python(f"import sys; sys.exit({code})")) for code in (1, 2)))
+        return [result.returncode for result in results]
+
+    assert engine.submit(both()).result(timeout=30) == [1, 2]
+
+
+def test_call_refuses_to_block_the_engine_loop(engine):
+    async def nested() -> None:
+        engine.call(asyncio.sleep(0))
+
+    with pytest.raises(RuntimeError):
+        engine.call(nested())
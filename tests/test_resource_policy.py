@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import os
+import shutil
+import sys
+
+import pytest
+
+import resource_policy
+from process_engine import ProcessEngine
+from resource_policy import DEFAULT_ENCODER_NICE, DEFAULT_MAX_LOAD_PER_CORE, ResourcePolicy
+
+
+def test_from_env_reads_settings(monkeypatch):
+    monkeypatch.setenv("VEDIOZIP_CORE_BUDGET", "3")
+    monkeypatch.setenv("VEDIOZIP_ENCODER_NICE", "5")
+    monkeypatch.setenv("VEDIOZIP_CPU_AFFINITY", "0-1,4")
+    monkeypatch.setenv("VEDIOZIP_MAX_LOAD", "2.5")
+    policy = ResourcePolicy.from_env()
+    assert (policy.core_budget, policy.nice, policy.affinity, policy.max_load_per_core) == (3, 5, (0, 1, 4), 2.5)
+
+
+def test_from_env_falls_back_on_invalid_values(monkeypatch):
+    monkeypatch.setenv("VEDIOZIP_CORE_BUDGET", "two")
+    monkeypatch.setenv("VEDIOZIP_ENCODER_NICE", "")
+    monkeypatch.setenv("VEDIOZIP_CPU_AFFINITY", "3-1")
+    monkeypatch.setenv("VEDIOZIP_MAX_LOAD", "high")
+    policy = ResourcePolicy.from_env()
+    assert (policy.core_budget, policy.nice, policy.affinity, policy.max_load_per_core) == (ResourcePolicy().core_budget, DEFAULT_ENCODER_NICE, None, DEFAULT_MAX_LOAD_PER_CORE)
+
+
+def test_wrap_command_prefixes_available_launchers(monkeypatch):
+    launchers = {"nice": "/bin/nice", "taskset": None}
+    monkeypatch.setattr(resource_policy, "_launcher", launchers.get)
+    policy = ResourcePolicy(nice=7, affinity=(0, 2))
+    assert policy.wrap_command(["ffmpeg", "-i", "a.mp4"]) == ["/bin/nice", "-n", "7", "ffmpeg", "-i", "a.mp4"]
+
+    launchers["taskset"] = "/bin/taskset"
+    assert policy.wrap_command(["ffmpeg"]) == ["/bin/taskset", "-c", "0,2", "/bin/nice", "-n", "7", "ffmpeg"]
+    assert ResourcePolicy(nice=0).wrap_command(["ffmpeg"]) == ["ffmpeg"]
+
+
+@pytest.mark.skipif(not hasattr(os, "getpriority") or shutil.which("nice") is None, reason="needs nice")
+def test_threads_started_by_the_encoder_inherit_the_priority():
+    # Linux keeps a nice value per thread: a setpriority on the pid after spawn would miss this thread.
+    code = (
+        "import os, threading\n"
+        "thread = threading.Thread(target=lambda: print(os.getpriority(os.PRIO_PROCESS, threading.get_native_id())))\n"
+        "thread.start(); thread.join()"
+    )
+    base = os.getpriority(os.PRIO_PROCESS, 0)
+    cmd = ResourcePolicy(nice=5).wrap_command([sys.executable, "-c", code])
+    result = ProcessEngine().run(cmd, capture_stdout=True)
+    assert result.returncode == 0, result.stderr
+    assert int(result.stdout) == min(19, base + 5)
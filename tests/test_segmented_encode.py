@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from process_engine import ProcessResult
+from video_service import VideoConvertService
+
+KEYFRAMES = [1.4 + 2.0 * index for index in range(30)]
+
+
+@pytest.fixture
+def probed(service, monkeypatch) -> list[float]:
+    """模拟一个起始时间为 1.4 秒、每 2 秒一个关键帧的 MPEG-TS 文件，返回关键帧探测的目标时间。"""
+    targets: list[float] = []
+
+    def run_tool(self, tool, cmd):
+        if "format=start_time" in cmd:
+            return ProcessResult(returncode=0, stdout="1.400000\n", stderr="")
+        start = float(cmd[cmd.index("-read_intervals") + 1].partition("%")[0])
+        targets.append(start)
+        lines = [f"{pts:.6f},{'K_' if index % 2 == 0 else '__'}" for index, pts in enumerate(KEYFRAMES) if pts >= start]
+        return ProcessResult(returncode=0, stdout="\n".join(lines), stderr="")
+
+    monkeypatch.setattr(VideoConvertService, "_run_tool", run_tool)
+    return targets
+
+
+def test_segment_boundaries_are_offsets_from_the_start_time(service, probed):
+    boundaries = service._segment_boundaries(Path("ffprobe"), Path("a.ts"), 50.0, 10)
+
+    assert probed == pytest.approx([11.4, 21.4, 31.4, 41.4])
+    # Keyframes sit at 1.4 + 4k seconds, i.e. at offsets that are multiples of 4.
+    assert boundaries == pytest.approx([12.0, 20.0, 32.0, 40.0])
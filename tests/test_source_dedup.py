@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pytest
+
+import source_dedup
+from source_dedup import SourceDeduplicator
+
+
+@pytest.fixture
+def hashed(monkeypatch) -> dict[str, list[Path]]:
+    """把采样缩小到 4 字节（100 字节的文件只读 0、48、96 三处），并记录各层哈希读取了哪些文件。"""
+    monkeypatch.setattr(source_dedup, "SAMPLE_BYTES", 4)
+    calls: dict[str, list[Path]] = {"sample": [], "full": []}
+    sample, full_hash = SourceDeduplicator._sample, SourceDeduplicator._full_hash
+
+    def recording_sample(self, path, size):
+        calls["sample"].append(path)
+        return sample(self, path, size)
+
+    def recording_full_hash(self, path):
+        calls["full"].append(path)
+        return full_hash(self, path)
+
+    monkeypatch.setattr(SourceDeduplicator, "_sample", recording_sample)
+    monkeypatch.setattr(SourceDeduplicator, "_full_hash", recording_full_hash)
+    return calls
+
+
+def _write(path: Path, data: bytes) -> Path:
+    path.write_bytes(data)
+    return path
+
+
+def test_different_sizes_are_never_read(tmp_path, hashed):
+    dedup = SourceDeduplicator()
+    assert dedup.find_original(_write(tmp_path / "a.mp4", b"a" * 100)) is None
+    assert dedup.find_original(_write(tmp_path / "b.mp4", b"a" * 101)) is None
+    assert hashed == {"sample": [], "full": []}
+
+
+def test_different_samples_skip_the_full_hash(tmp_path, hashed):
+    dedup = SourceDeduplicator()
+    first = _write(tmp_path / "a.mp4", b"a" * 100)
+    second = _write(tmp_path / "b.mp4", b"a" * 99 + b"b")
+
+    assert dedup.find_original(first) is None
+    assert dedup.find_original(second) is None
+    assert sorted(hashed["sample"]) == [first, second]
+    assert hashed["full"] == []
+
+
+def test_matching_samples_are_confirmed_by_full_hash(tmp_path, hashed):
+    dedup = SourceDeduplicator()
+    data = bytearray(b"a" * 100)
+    first = _write(tmp_path / "a.mp4", bytes(data))
+    data[20] = ord("b")
+    # Differs only between the sampled regions.
+    second = _write(tmp_path / "b.mp4", bytes(data))
+    third = _write(tmp_path / "c.mp4", bytes(data))
+
+    assert dedup.find_original(first) is None
+    assert dedup.find_original(second) is None
+    assert set(hashed["full"]) == {first, second}
+    assert dedup.find_original(third) == second
+
+
+def test_identical_files_map_to_the_first_seen(tmp_path, hashed):
+    dedup = SourceDeduplicator()
+    content = os.urandom(256)
+    files = [_write(tmp_path / f"{name}.mp4", content) for name in ("a", "b", "c")]
+
+    assert [dedup.find_original(path) for path in files] == [None, files[0], files[0]]
+    assert set(hashed["full"]) == set(files)
+
+
+def test_unreadable_file_is_treated_as_unique(tmp_path):
+    dedup = SourceDeduplicator()
+    first = _write(tmp_path / "a.mp4", b"a" * 100)
+    second = _write(tmp_path / "b.mp4", b"a" * 100)
+    dedup.find_original(first)
+    first.unlink()
+
+    assert dedup.find_original(second) is None
+    assert dedup.find_original(tmp_path / "missing.mp4") is None
+
+
+def test_deferred_actions_run_once_original_is_done(tmp_path):
+    dedup = SourceDeduplicator()
+    original = tmp_path / "a.mp4"
+    ran: list[str] = []
+
+    assert dedup.defer(original, lambda: ran.append("b"))
+    assert dedup.defer(original, lambda: ran.append("c"))
+    for action in dedup.mark_done(original):
+        action()
+    assert ran == ["b", "c"]
+    assert not dedup.defer(original, lambda: ran.append("d"))
+    assert dedup.mark_done(original) == []
+
+
+def test_job_encodes_duplicates_once(service, encoded, wait_for_job, tmp_path):
+    source = tmp_path / "src"
+    (source / "copies").mkdir(parents=True)
+    content = os.urandom(4096)
+    for name in ("a.mp4", "copies/a_copy.mp4", "copies/b.mp4"):
+        (source / name).write_bytes(content)
+    (source / "unique.mp4").write_bytes(os.urandom(4096))
+    output = tmp_path / "out"
+    output.mkdir()
+
+    job = wait_for_job(service, service.start_job(str(source), str(output), 240, 23, "veryfast", "128k"))
+
+    assert job["status"] == "completed", job["error"]
+    assert job["deduplicated_files"] == 2
+    assert job["processed_files"] == job["total_files"] == 4
+    assert len(encoded) == 2
+    original = output / "a_240p.mp4"
+    assert os.path.samefile(original, output / "copies" / "a_copy_240p.mp4")
+    assert os.path.samefile(original, output / "copies" / "b_240p.mp4")
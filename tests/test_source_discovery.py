@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from pathlib import Path
+
+from video_service import VideoConvertService
+
+# Saved before the ``encoded`` fixture replaces it.
+_probe_media = VideoConvertService._probe_media
+
+
+def _touch(path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(path.name.encode("utf-8"))
+    return path
+
+
+def _make_tree(root: Path, count: int) -> list[Path]:
+    return [_touch(root / f"d{index % 7}" / f"clip_{index:03d}.mp4") for index in range(count)]
+
+
+def test_iter_source_files_matches_sorted_walk(service, tmp_path):
+    root = tmp_path / "src"
+    videos = [
+        _touch(root / "a.mp4"),
+        _touch(root / "a" / "z.mkv"),
+        _touch(root / "a" / "b" / "c.MOV"),
+        _touch(root / "B.mp4"),
+        _touch(root / "c" / "d" / "e" / "f.avi"),
+        _touch(root / "c" / "x.mp4"),
+    ]
+    _touch(root / "a" / "notes.txt")
+    _touch(root / "c" / "cover.jpg")
+    (root / "empty").mkdir()
+
+    expected = sorted(videos, key=lambda path: [os.path.normcase(part) for part in path.relative_to(root).parts])
+    assert list(service._iter_source_files(root)) == expected
+
+
+def test_iter_source_files_single_file(service, tmp_path):
+    source = _touch(tmp_path / "one.mp4")
+    assert list(service._iter_source_files(source)) == [source]
+
+
+def test_iter_source_files_lists_only_ancestors_before_first_file(service, tmp_path, monkeypatch):
+    root = tmp_path / "src"
+    for name in ("a", "b", "c"):
+        _touch(root / name / "clip.mp4")
+    scanned: list[Path] = []
+    scan_sorted = VideoConvertService._scan_sorted
+
+    def recording_scan(self, directory: Path):
+        scanned.append(directory)
+        return scan_sorted(self, directory)
+
+    monkeypatch.setattr(VideoConvertService, "_scan_sorted", recording_scan)
+    files = service._iter_source_files(root)
+    assert next(files) == root / "a" / "clip.mp4"
+    assert scanned == [root, root / "a"]
+
+
+def test_job_total_never_trails_processed(service, wait_for_job, tmp_path):
+    source = tmp_path / "src"
+    output = tmp_path / "out"
+    output.mkdir()
+    _make_tree(source, 60)
+
+    job_id = service.start_job(str(source), str(output), 240, 23, "veryfast", "128k", concurrency=2, deduplicate=False)
+    snapshots = []
+    while True:
+        job = service.get_job(job_id)
+        snapshots.append((job["processed_files"], job["total_files"]))
+        if job["status"] in ("completed", "failed", "cancelled"):
+            break
+        time.sleep(0.005)
+
+    assert job["status"] == "completed", job["error"]
+    assert job["processed_files"] == job["total_files"] == 60
+    assert job["discovery_complete"] is True
+    assert all(processed <= total for processed, total in snapshots)
+    assert len(list(output.rglob("*_240p.mp4"))) == 60
+
+
+def test_cancel_during_conversion_stops_discovery(service, wait_for_job, tmp_path, monkeypatch):
+    source = tmp_path / "src"
+    output = tmp_path / "out"
+    output.mkdir()
+    _make_tree(source, 40)
+    first_encode = threading.Event()
+    run_ffmpeg = VideoConvertService._run_ffmpeg
+
+    async def slow_ffmpeg(self, job_id, cmd, input_file, output_file, on_progress=None):
+        first_encode.set()
+        await asyncio.sleep(0.05)
+        await run_ffmpeg(self, job_id, cmd, input_file, output_file, on_progress)
+
+    monkeypatch.setattr(VideoConvertService, "_run_ffmpeg", slow_ffmpeg)
+    job_id = service.start_job(str(source), str(output), 240, 23, "veryfast", "128k", deduplicate=False)
+    assert first_encode.wait(10)
+    service.cancel_job(job_id)
+
+    job = wait_for_job(service, job_id)
+    assert job["status"] == "cancelled"
+    assert job["processed_files"] < 40
+    discovery = [thread for thread in threading.enumerate() if thread.name == f"discover-{job_id[:8]}"]
+    for thread in discovery:
+        thread.join(5)
+    assert not any(thread.is_alive() for thread in discovery)
+
+
+def test_probe_of_missing_source_returns_none(service, tmp_path):
+    assert _probe_media(service, Path("ffprobe"), tmp_path / "missing.mp4") is None
+
+
+def test_source_removed_before_probe_fails_only_that_file(service, wait_for_job, tmp_path, monkeypatch):
+    source = tmp_path / "src"
+    output = tmp_path / "out"
+    output.mkdir()
+    files = _make_tree(source, 5)
+    probe = VideoConvertService._probe_media
+
+    def vanishing_probe(self, ffprobe_path, video_file):
+        if video_file == files[2]:
+            video_file.unlink()
+            return _probe_media(self, ffprobe_path, video_file)
+        return probe(self, ffprobe_path, video_file)
+
+    monkeypatch.setattr(VideoConvertService, "_probe_media", vanishing_probe)
+    job = wait_for_job(service, service.start_job(str(source), str(output), 240, 23, "veryfast", "128k", deduplicate=False))
+
+    assert job["status"] == "completed", job["error"]
+    assert job["failed_files"] == 1
+    assert job["processed_files"] == job["total_files"] == 5
+    assert len(list(output.rglob("*_240p.mp4"))) == 4
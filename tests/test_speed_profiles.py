@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import pytest
+
+from speed_profiles import DEFAULT_PROFILE, LEGACY_PROFILE_TAG, PROFILES, SpeedProfile, get_profile
+from video_service import EncodeOptions
+
+
+def _options(profile: str) -> EncodeOptions:
+    return EncodeOptions(height=720, crf=23, preset="veryfast", audio_bitrate="128k", suffix_text="_720p", profile=profile)
+
+
+def test_get_profile_resolves_names():
+    assert get_profile("archive") is PROFILES["archive"]
+    with pytest.raises(ValueError, match="不支持的速度档位"):
+        get_profile("turbo")
+
+
+def test_default_profile_keeps_legacy_commands():
+    profile = get_profile(DEFAULT_PROFILE)
+    assert profile.tag == LEGACY_PROFILE_TAG
+    assert profile.scale_filter(720) == "scale=-2:720"
+    assert profile.encoder_args() == []
+
+
+def test_profile_arguments():
+    fastest = get_profile("fastest")
+    assert fastest.scale_filter(480) == "scale=-2:480:flags=fast_bilinear"
+    assert fastest.tag == "fastest@v2"
+    assert fastest.encoder_args() == ["-x264-params", "rc-lookahead=10:ref=1:me=dia:subme=2"]
+    archive = get_profile("archive")
+    assert archive.encoder_args() == ["-x264-params", "rc-lookahead=60:ref=5:bframes=5:aq-mode=3"]
+    assert archive.to_dict()["x264_params"] == {"rc-lookahead": "60", "ref": "5", "bframes": "5", "aq-mode": "3"}
+
+
+@pytest.mark.parametrize(
+    "fields",
+    [
+        {"name": "Fast"},
+        {"version": 0},
+        {"scale_flags": "nearest"},
+        {"tune": "psnr"},
+        {"x264_params": (("ref", "1"), ("ref", "2"))},
+        # A value that would smuggle in another option through the ":" separator.
+        {"x264_params": (("ref", "1:keyint=1"),)},
+    ],
+)
+def test_invalid_profiles_rejected(fields):
+    with pytest.raises(ValueError):
+        SpeedProfile(**{"name": "custom", "version": 1, "label": "", "description": "", **fields})
+
+
+def test_manifest_params_carry_only_non_legacy_profiles():
+    assert "profile" not in _options("balanced").manifest_params()
+    assert _options("archive").manifest_params()["profile"] == "archive@v1"
+
+
+def test_job_applies_profile_to_ffmpeg_command(service, encoded, wait_for_job, tmp_path):
+    source = tmp_path / "a.mp4"
+    source.write_bytes(b"source")
+    output = tmp_path / "out"
+    output.mkdir()
+
+    job_id = service.start_job(str(source), str(output), 240, 23, "veryfast", "128k", stream_copy=False, profile="archive")
+    job = wait_for_job(service, job_id)
+
+    assert job["status"] == "completed", job["error"]
+    assert job["profile"] == "archive"
+    (cmd,) = encoded
+    assert "scale=-2:240:flags=lanczos" in cmd
+    assert cmd[cmd.index("-x264-params") + 1] == "rc-lookahead=60:ref=5:bframes=5:aq-mode=3"
+
+
+def test_unknown_profile_rejected_at_start(service, tmp_path):
+    source = tmp_path / "a.mp4"
+    source.write_bytes(b"source")
+    with pytest.raises(ValueError, match="不支持的速度档位"):
+        service.start_job(str(source), str(tmp_path), 240, 23, "veryfast", "128k", profile="turbo")
+
+
+def test_incremental_run_reencodes_when_profile_changes(service, encoded, wait_for_job, tmp_path):
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "a.mp4").write_bytes(b"source")
+    output = tmp_path / "out"
+    output.mkdir()
+
+    def run(profile: str) -> dict:
+        job_id = service.start_job(
+            str(source), str(output), 240, 23, "veryfast", "128k", incremental=True, stream_copy=False, profile=profile
+        )
+        return wait_for_job(service, job_id)
+
+    assert run("balanced")["skipped_files"] == 0
+    assert run("balanced")["skipped_files"] == 1
+    assert run("fastest")["skipped_files"] == 0
+    assert run("fastest")["skipped_files"] == 1
+    assert len(encoded) == 2
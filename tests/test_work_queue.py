@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pytest
+
+import work_queue
+from work_queue import WorkQueue
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(work_queue, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def test_items_leased_in_submission_order(clock):
+    queue = WorkQueue(lease_seconds=30)
+    first = queue.submit("job", {"input_file": "a.mp4"})
+    second = queue.submit("job", {"input_file": "b.mp4"})
+
+    leased = queue.lease("w1")
+    assert leased == {"item_id": first.item_id, "lease_seconds": 30, "input_file": "a.mp4"}
+    assert queue.lease("w2")["item_id"] == second.item_id
+    assert queue.lease("w3") is None
+    assert queue.counts() == {"pending": 0, "leased": 2}
+
+
+def test_expired_lease_goes_back_to_the_front(clock):
+    queue = WorkQueue(lease_seconds=30)
+    first = queue.submit("job", {})
+    second = queue.submit("job", {})
+    assert queue.lease("w1")["item_id"] == first.item_id
+
+    clock.value += 31
+    # The lost item is retried before anything that was still waiting.
+    assert queue.lease("w2")["item_id"] == first.item_id
+    assert first.attempts == 2
+    assert queue.lease("w2")["item_id"] == second.item_id
+    with pytest.raises(ValueError):
+        queue.heartbeat(first.item_id, "w1")
+    with pytest.raises(ValueError):
+        queue.complete(first.item_id, "w1")
+
+
+def test_heartbeat_extends_the_lease(clock):
+    queue = WorkQueue(lease_seconds=30)
+    item = queue.submit("job", {})
+    queue.lease("w1")
+
+    for _ in range(3):
+        clock.value += 20
+        assert queue.heartbeat(item.item_id, "w1") == "run"
+    queue.requeue_expired()
+    assert item.worker_id == "w1"
+    queue.complete(item.item_id, "w1")
+    assert item.succeeded and item.finished.is_set()
+
+
+def test_lost_worker_fails_item_after_max_attempts(clock):
+    queue = WorkQueue(lease_seconds=30, max_attempts=2)
+    item = queue.submit("job", {})
+    for worker in ("w1", "w2"):
+        assert queue.lease(worker)["item_id"] == item.item_id
+        clock.value += 31
+
+    queue.requeue_expired()
+    assert item.finished.is_set()
+    assert not item.succeeded
+    assert item.error == "工作节点失联（已尝试 2 次）"
+    assert queue.lease("w3") is None
+
+
+def test_failed_item_retried_until_max_attempts(clock):
+    queue = WorkQueue(max_attempts=2)
+    item = queue.submit("job", {})
+    queue.lease("w1")
+    queue.fail(item.item_id, "w1", "boom")
+    assert not item.finished.is_set()
+
+    assert queue.lease("w2")["item_id"] == item.item_id
+    queue.fail(item.item_id, "w2", "boom again")
+    assert item.finished.is_set()
+    assert item.error == "boom again"
+    assert {worker["worker_id"]: worker["failed"] for worker in queue.workers()} == {"w1": 1, "w2": 1}
+
+
+def test_paused_items_are_skipped_and_report_pause(clock):
+    queue = WorkQueue()
+    leased = queue.submit("paused-job", {})
+    waiting = queue.submit("paused-job", {})
+    other = queue.submit("other-job", {})
+    queue.lease("w1")
+
+    queue.set_paused("paused-job", True)
+    assert queue.heartbeat(leased.item_id, "w1") == "pause"
+    assert queue.lease("w2")["item_id"] == other.item_id
+    assert queue.lease("w2") is None
+
+    queue.set_paused("paused-job", False)
+    assert queue.heartbeat(leased.item_id, "w1") == "run"
+    assert queue.lease("w2")["item_id"] == waiting.item_id
+
+
+def test_heartbeat_forwards_progress(clock):
+    reports: list[dict] = []
+    queue = WorkQueue()
+    item = queue.submit("job", {}, on_progress=reports.append)
+    queue.lease("w1")
+
+    queue.heartbeat(item.item_id, "w1", {"out_seconds": 4.0})
+    queue.heartbeat(item.item_id, "w1")
+    assert reports == [{"out_seconds": 4.0}]
+
+
+def test_forgotten_item_stops_its_worker(clock):
+    queue = WorkQueue()
+    item = queue.submit("job", {})
+    queue.lease("w1")
+
+    queue.forget(item)
+    with pytest.raises(ValueError):
+        queue.heartbeat(item.item_id, "w1")
+    assert queue.workers()[0]["items"] == []
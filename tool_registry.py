@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import shutil
+import subprocess
+import sys
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from app_logging import get_logger
+from process_engine import ProcessEngine
+
+
+@dataclass
+class ToolInfo:
+    name: str
+    path: Path
+    mtime_ns: int
+    size: int
+    version: str | None = None
+    encoders: set[str] | None = None
+    filters: set[str] | None = None
+    pixel_formats: set[str] | None = None
+    capability_lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "path": str(self.path),
+            "version": self.version,
+            "encoders": sorted(self.encoders or ()),
+            "filters": sorted(self.filters or ()),
+            "pixel_formats": sorted(self.pixel_formats or ()),
+        }
+
+
+class ToolRegistry:
+    """ffmpeg/ffprobe 路径与能力（版本、编码器、滤镜、像素格式）的缓存。
+
+    结果按可执行文件的 mtime 与大小失效；命中缓存时只做几次 stat，不再启动子进程。
+    """
+
+    def __init__(self, engine: ProcessEngine | None = None) -> None:
+        self._logger = get_logger("vediozip.tools")
+        self._engine = engine or ProcessEngine()
+        self._lock = threading.Lock()
+        self._tools: dict[str, ToolInfo] = {}
+        self._unusable: dict[Path, tuple[int, int]] = {}
+
+    def resolve(self, tool_name: str) -> Path | None:
+        info = self.info(tool_name)
+        return None if info is None else info.path
+
+    def info(self, tool_name: str) -> ToolInfo | None:
+        candidates = self._candidates(tool_name)
+        with self._lock:
+            checked = set()
+            for candidate in candidates:
+                candidate = candidate.resolve()
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                try:
+                    stat = candidate.stat()
+                except OSError:
+                    continue
+                fingerprint = (stat.st_mtime_ns, stat.st_size)
+                cached = self._tools.get(tool_name)
+                if cached is not None and cached.path == candidate and (cached.mtime_ns, cached.size) == fingerprint:
+                    return cached
+                if self._unusable.get(candidate) == fingerprint:
+                    continue
+                version = self._read_version(candidate)
+                if version is not None:
+                    info = ToolInfo(
+                        name=tool_name,
+                        path=candidate,
+                        mtime_ns=stat.st_mtime_ns,
+                        size=stat.st_size,
+                        version=version,
+                    )
+                    self._tools[tool_name] = info
+                    self._logger.info("Tool resolved. tool=%s path=%s version=%s", tool_name, candidate, version)
+                    return info
+                self._unusable[candidate] = fingerprint
+                self._logger.warning("Tool exists but not usable. tool=%s path=%s", tool_name, candidate)
+
+            self._tools.pop(tool_name, None)
+        self._logger.error("Tool not found or unusable. tool=%s candidates=%s", tool_name, candidates)
+        return None
+
+    def capabilities(self, tool_name: str = "ffmpeg") -> ToolInfo | None:
+        info = self.info(tool_name)
+        if info is None:
+            return None
+        with info.capability_lock:
+            if info.encoders is None:
+                info.encoders = self._parse_table(self._run(info.path, "-encoders"))
+                info.filters = self._parse_filters(self._run(info.path, "-filters"))
+                info.pixel_formats = self._parse_table(self._run(info.path, "-pix_fmts"))
+                self._logger.info(
+                    "Tool capabilities loaded. tool=%s encoders=%s filters=%s pixel_formats=%s",
+                    tool_name,
+                    len(info.encoders),
+                    len(info.filters),
+                    len(info.pixel_formats),
+                )
+        return info
+
+    def has_encoder(self, encoder: str, tool_name: str = "ffmpeg") -> bool:
+        info = self.capabilities(tool_name)
+        return info is not None and encoder in (info.encoders or ())
+
+    def has_filter(self, filter_name: str, tool_name: str = "ffmpeg") -> bool:
+        info = self.capabilities(tool_name)
+        return info is not None and filter_name in (info.filters or ())
+
+    def _candidates(self, tool_name: str) -> list[Path]:
+        candidates: list[Path] = []
+        from_path = shutil.which(tool_name)
+        if from_path:
+            candidates.append(Path(from_path))
+
+        executable_dir = Path(sys.executable).resolve().parent
+        candidates.extend(
+            [
+                executable_dir / f"{tool_name}.exe",
+                Path(sys.prefix) / "Library" / "bin" / f"{tool_name}.exe",
+                Path(sys.prefix) / "Scripts" / f"{tool_name}.exe",
+            ]
+        )
+        return candidates
+
+    def _read_version(self, executable: Path) -> str | None:
+        output = self._run(executable, "-version")
+        if output is None:
+            return None
+        # "ffmpeg version 6.0 Copyright ..."
+        parts = output.split(maxsplit=3)
+        return parts[2] if len(parts) >= 3 and parts[1] == "version" else "unknown"
+
+    def _run(self, executable: Path, *args: str) -> str | None:
+        try:
+            result = self._engine.run(
+                [str(executable), "-hide_banner", *args],
+                capture_stdout=True,
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+            )
+        except OSError:
+            return None
+        except Exception:
+            self._logger.exception("Tool check failed. executable=%s args=%s", executable, args)
+            return None
+        return result.stdout if result.returncode == 0 else None
+
+    def _parse_table(self, output: str | None) -> set[str]:
+        # Rows follow a "-----" separator: flags in the first column, the name in the second.
+        names: set[str] = set()
+        in_table = False
+        for line in (output or "").splitlines():
+            if not in_table:
+                in_table = line.strip().startswith("-----")
+                continue
+            parts = line.split()
+            if len(parts) > 1:
+                names.add(parts[1])
+        return names
+
+    def _parse_filters(self, output: str | None) -> set[str]:
+        # " TSC scale             V->V       Scale the input video size ..."
+        names: set[str] = set()
+        for line in (output or "").splitlines():
+            parts = line.split()
+            if len(parts) >= 3 and "->" in parts[2]:
+                names.add(parts[1])
+        return names
@@ -1,20 +1,74 @@
 from __future__ import annotations
 
+import asyncio
+import copy
+import ctypes
+import json
+import os
+import queue
 import shutil
+import signal
 import subprocess
-import sys
 import threading
 import time
 import uuid
-from dataclasses import asdict, dataclass
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field, fields, replace
+from functools import partial
+from itertools import chain, islice
 from pathlib import Path
-from typing import Callable, Literal
+from typing import Callable, Collection, Iterator, Literal
 
-from app_logging import get_log_file_path, get_logger
+from app_logging import get_cache_dir, get_log_file_path, get_logger
+from batch_estimator import SampledFile, SpeedModel, estimate_batch
+from conversion_manifest import ConversionManifest
+from encode_history import EncodeHistory, history_key
+from encode_metrics import EncodeTelemetry, ServiceMetrics
+from job_scheduler import DEFAULT_MAX_QUEUED_JOBS, DEFAULT_MAX_RUNNING_JOBS, JobScheduler
+from job_store import DETAIL_FIELDS, TERMINAL_STATUSES, JobStore
+from media_cache import MediaInfo, MediaMetadataCache
+from output_staging import OutputStager
+from preset_tuner import DEFAULT_TARGET_SPEED, TRIAL_SECONDS, X264_PRESETS, PresetTuner, TrialSample
+from process_engine import EngineProcess, ProcessEngine, ProcessResult
+from resource_policy import ResourceGovernor, ResourcePolicy
+from source_dedup import SourceDeduplicator
+from speed_profiles import DEFAULT_PROFILE, LEGACY_PROFILE_TAG, PROFILES, SpeedProfile, get_profile
+from tool_registry import ToolRegistry
+from work_queue import WorkQueue
 
 VIDEO_EXTENSIONS = {".mp4", ".mov", ".mkv", ".avi", ".wmv", ".m4v"}
 WINDOWS_DLL_NOT_FOUND_EXIT = 0xC0000135
 INVALID_SUFFIX_CHARS = '<>:"/\\|?*'
+MAX_CONCURRENCY = 32
+PROGRESS_PUBLISH_INTERVAL = 0.5
+# Per-file entries a job keeps; finished files beyond this only count in the job totals.
+FILE_DETAIL_LIMIT = 200
+PROGRESS_ARGS = ["-progress", "pipe:1", "-nostats", "-loglevel", "error"]
+MIN_SEGMENT_SECONDS = 10
+DEFAULT_SEGMENT_WORKERS = 4
+KEYFRAME_SEARCH_SECONDS = 30
+AUTO_PRESET = "auto"
+AUTO_PRESET_SAMPLE_FILES = 3
+AUTO_PRESET_FALLBACK = "veryfast"
+PROBE_WORKERS = 4
+PROBE_WINDOW = 16
+# Paths the discovery thread may run ahead of dispatch; the total keeps counting up to this far ahead.
+DISCOVERY_QUEUE_SIZE = 100_000
+_DISCOVERY_DONE = object()
+MAX_RENDITIONS = 8
+WORK_POLL_INTERVAL = 0.5
+# How often an encode waiting for a paused job checks whether it was resumed.
+RESUME_POLL_INTERVAL = 0.2
+ESTIMATE_PROBE_FILES = 40
+ESTIMATE_TRIALS_PER_CLASS = 2
+# With this many past files of the same kind, the estimate skips trial encodes for it.
+ESTIMATE_MIN_HISTORY = 3
+# Stream copy is bound by disk throughput; media seconds per wall second assumed without history.
+ESTIMATE_COPY_SPEED = 100.0
+# Speed profiles are compared on a synthetic 1080p clip generated once per machine.
+PROFILE_REFERENCE_HEIGHT = 1080
+PROFILE_REFERENCE_SECONDS = 10
 SuffixMode = Literal["default", "none", "custom"]
 
 
@@ -35,16 +89,271 @@ class JobState:
     custom_suffix: str
     created_at: float
     updated_at: float
+    concurrency: int = 1
+    active_files: list[str] = field(default_factory=list)
+    incremental: bool = False
+    skipped_files: int = 0
+    stream_copy: bool = True
+    stream_modes: dict[str, str] = field(default_factory=dict)
+    priority: int = 0
+    started_at: float | None = None
+    finished_at: float | None = None
+    paused_at: float | None = None
+    paused_seconds: float = 0.0
+    segment_seconds: int = 0
+    selected_preset: str | None = None
+    preset_measurements: dict[str, dict] = field(default_factory=dict)
+    telemetry: dict = field(default_factory=dict)
+    file_telemetry: dict[str, dict] = field(default_factory=dict)
+    eta_seconds: float | None = None
+    discovery_complete: bool = True
+    renditions: list[dict] = field(default_factory=list)
+    scratch_dir: str = ""
+    deduplicate: bool = True
+    deduplicated_files: int = 0
+    failed_files: int = 0
+    profile: str = DEFAULT_PROFILE
+    duplicates: dict[str, str] = field(default_factory=dict)
+    stream_mode_counts: dict[str, int] = field(default_factory=dict)
+    revision: int = 0
+
+    def to_dict(self, exclude: Collection[str] = ()) -> dict:
+        if not exclude:
+            return asdict(self)
+        return {item.name: copy.deepcopy(getattr(self, item.name)) for item in fields(self) if item.name not in exclude}
+
+    def touch(self, now: float | None = None) -> None:
+        self.updated_at = time.time() if now is None else now
+        self.revision += 1
+
+
+@dataclass(frozen=True)
+class Rendition:
+    height: int
+    crf: int
+    suffix_text: str
 
     def to_dict(self) -> dict:
         return asdict(self)
 
 
+@dataclass(frozen=True)
+class EncodeOptions:
+    height: int
+    crf: int
+    preset: str
+    audio_bitrate: str
+    suffix_text: str
+    concurrency: int = 1
+    incremental: bool = False
+    stream_copy: bool = True
+    segment_seconds: int = 0
+    segment_workers: int = DEFAULT_SEGMENT_WORKERS
+    target_speed: float = DEFAULT_TARGET_SPEED
+    renditions: tuple[Rendition, ...] = ()
+    profile: str = DEFAULT_PROFILE
+
+    @classmethod
+    def from_dict(cls, data: dict) -> EncodeOptions:
+        return cls(**{**data, "renditions": tuple(Rendition(**item) for item in data.get("renditions", ()))})
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @property
+    def speed_profile(self) -> SpeedProfile:
+        return get_profile(self.profile)
+
+    def targets(self) -> tuple[Rendition, ...]:
+        return self.renditions or (Rendition(height=self.height, crf=self.crf, suffix_text=self.suffix_text),)
+
+    def manifest_params(self, rendition: Rendition | None = None) -> dict:
+        rendition = rendition or self.targets()[0]
+        params = {
+            "height": rendition.height,
+            "crf": rendition.crf,
+            "preset": self.preset,
+            "audio_bitrate": self.audio_bitrate,
+            "suffix": rendition.suffix_text,
+            "stream_copy": self.stream_copy,
+        }
+        tag = self.speed_profile.tag
+        if tag != LEGACY_PROFILE_TAG:
+            # Outputs from before profiles stay up to date; a changed profile definition re-encodes.
+            params["profile"] = tag
+        return params
+
+
+class JobCancelledError(RuntimeError):
+    pass
+
+
+def _remember(entries: dict, key: str, value) -> None:
+    """写入一条按文件的明细并移到末尾；超出 FILE_DETAIL_LIMIT 时丢弃最久未更新的条目。"""
+    # Files in flight are refreshed on every publish, so only finished ones age out.
+    entries.pop(key, None)
+    entries[key] = value
+    while len(entries) > FILE_DETAIL_LIMIT:
+        del entries[next(iter(entries))]
+
+
+class _JobProgress:
+    def __init__(self, total: int) -> None:
+        self._lock = threading.Lock()
+        self._total = total
+        self._durations: dict[int, float] = {}
+        self._ratios: dict[int, float] = {}
+        self._known_weight = 0.0
+        self._known_done = 0.0
+        self._unknown_done = 0.0
+        self._active: dict[int, str] = {}
+        self._telemetry: dict[int, EncodeTelemetry] = {}
+        self._names: dict[int, str] = {}
+        self._dirty: set[int] = set()
+        self._finished_telemetry = EncodeTelemetry(done=True)
+        self._started = 0
+        self._completed = 0
+        self._last_publish = 0.0
+
+    @property
+    def total(self) -> int:
+        return self._total
+
+    def set_total(self, total: int) -> None:
+        # Discovery runs alongside conversion, so the file count grows while the job runs.
+        with self._lock:
+            self._total = max(self._total, total)
+
+    def set_duration(self, index: int, duration: float | None) -> None:
+        if duration is None or duration <= 0:
+            return
+        with self._lock:
+            if index in self._durations:
+                return
+            ratio = self._ratios.get(index, 0.0)
+            self._durations[index] = duration
+            self._known_weight += duration
+            self._known_done += duration * ratio
+            self._unknown_done -= ratio
+
+    def start(self, index: int, name: str) -> int:
+        with self._lock:
+            self._started += 1
+            self._active[index] = name
+            return self._started
+
+    def update(self, index: int, current_seconds: float, telemetry: EncodeTelemetry | None = None) -> float | None:
+        # Returns None while updates are coalesced, so callers skip publishing to the job state.
+        with self._lock:
+            if telemetry is not None:
+                self._telemetry[index] = telemetry
+                self._dirty.add(index)
+            duration = self._durations.get(index)
+            if duration is not None:
+                self._set_ratio(index, min(max(current_seconds / duration, 0.0), 1.0))
+            now = time.monotonic()
+            if now - self._last_publish < PROGRESS_PUBLISH_INTERVAL:
+                return None
+            self._last_publish = now
+            return self._value()
+
+    def finish(self, index: int) -> tuple[int, float]:
+        with self._lock:
+            self._set_ratio(index, 1.0)
+            name = self._active.pop(index, None)
+            final = self._telemetry.get(index)
+            if final is not None and name is not None:
+                self._names[index] = name
+                self._telemetry[index] = replace(final, fps=None, speed=None, done=True)
+                self._finished_telemetry = EncodeTelemetry.combine([self._finished_telemetry, self._telemetry[index]])
+                self._dirty.add(index)
+            self._completed += 1
+            return self._completed, self._value()
+
+    def active_files(self) -> list[str]:
+        with self._lock:
+            return [self._active[index] for index in sorted(self._active)]
+
+    def telemetry(self) -> tuple[dict[str, dict], dict, float | None]:
+        # Only files changed since the last call are returned, so publishing stays O(active files).
+        with self._lock:
+            changed: dict[str, dict] = {}
+            for index in self._dirty:
+                if index in self._active:
+                    changed[self._active[index]] = self._telemetry[index].to_dict()
+                else:
+                    changed[self._names.pop(index)] = self._telemetry.pop(index).to_dict()
+            self._dirty.clear()
+            active = [self._telemetry[index] for index in self._active if index in self._telemetry]
+            summary = EncodeTelemetry.combine([self._finished_telemetry, *active])
+            remaining = self._remaining_seconds()
+        eta = remaining / summary.speed if remaining is not None and summary.speed else None
+        return changed, summary.to_dict(), eta
+
+    def _set_ratio(self, index: int, ratio: float) -> None:
+        previous = self._ratios.get(index, 0.0)
+        if ratio <= previous:
+            return
+        self._ratios[index] = ratio
+        duration = self._durations.get(index)
+        if duration is not None:
+            self._known_done += duration * (ratio - previous)
+        else:
+            self._unknown_done += ratio - previous
+
+    def _remaining_seconds(self) -> float | None:
+        known_count = len(self._durations)
+        if not known_count:
+            return None
+        mean_weight = self._known_weight / known_count
+        total_weight = self._known_weight + mean_weight * (self._total - known_count)
+        return max(0.0, total_weight - self._known_done - mean_weight * self._unknown_done)
+
+    def _value(self) -> float:
+        # Files without a known duration are weighted by the mean of the probed ones,
+        # so the denominator is refined as probe results arrive.
+        known_count = len(self._durations)
+        mean_weight = self._known_weight / known_count if known_count else 1.0
+        unknown_count = self._total - known_count
+        total_weight = self._known_weight + mean_weight * unknown_count
+        if total_weight <= 0:
+            return 0.0
+        value = (self._known_done + mean_weight * self._unknown_done) / total_weight
+        return max(0.0, min(value, 1.0))
+
+
 class VideoConvertService:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        max_running_jobs: int = DEFAULT_MAX_RUNNING_JOBS,
+        max_queued_jobs: int = DEFAULT_MAX_QUEUED_JOBS,
+        job_store: JobStore | None = None,
+        work_queue: WorkQueue | None = None,
+        resource_policy: ResourcePolicy | None = None,
+        cache_dir: Path | None = None,
+    ) -> None:
         self._logger = get_logger("vediozip.video_service")
-        self._jobs: dict[str, JobState] = {}
+        # Probe results, preset measurements and encode history persist here between runs.
+        self._cache_dir = cache_dir or get_cache_dir()
+        self._job_store = job_store or JobStore()
+        # With a work queue this process only coordinates; encode workers lease the files.
+        self._work_queue = work_queue
         self._lock = threading.Lock()
+        # Signalled under self._lock whenever any job changes; event streams wait on it instead of polling.
+        self._job_changed = threading.Condition(self._lock)
+        self._change_sequence = 0
+        self._media_cache = MediaMetadataCache(self._cache_dir / "media_metadata.sqlite3")
+        self._resources = ResourceGovernor(resource_policy or ResourcePolicy.from_env())
+        self._engine = ProcessEngine()
+        self._preset_tuner = PresetTuner(self._cache_dir / "preset_benchmarks.json", runner=self._trial_runner(None))
+        self._history = EncodeHistory(self._cache_dir / "encode_history.jsonl")
+        self._metrics = ServiceMetrics()
+        self._tools = ToolRegistry(self._engine)
+        self._scheduler = JobScheduler(max_running=max_running_jobs, max_queued=max_queued_jobs)
+        self._stop_events: dict[str, threading.Event] = {}
+        self._resume_events: dict[str, threading.Event] = {}
+        self._processes: dict[str, set[EngineProcess]] = {}
+        self._benchmark_lock = threading.Lock()
 
     def start_job(
         self,
@@ -56,30 +365,42 @@ class VideoConvertService:
         audio_bitrate: str,
         suffix_mode: SuffixMode = "default",
         custom_suffix: str = "",
+        concurrency: int = 1,
+        incremental: bool = False,
+        stream_copy: bool = True,
+        priority: int = 0,
+        segment_seconds: int = 0,
+        segment_workers: int = DEFAULT_SEGMENT_WORKERS,
+        target_speed: float = DEFAULT_TARGET_SPEED,
+        renditions: list[dict] | None = None,
+        scratch_dir: str = "",
+        deduplicate: bool = True,
+        profile: str = DEFAULT_PROFILE,
     ) -> str:
-        source = Path(source_path).expanduser().resolve()
-        target_dir = Path(output_dir).expanduser().resolve()
-
-        if not source.exists():
-            raise ValueError(f"输入路径不存在: {source}")
-        if not target_dir.exists():
-            raise ValueError(f"输出目录不存在: {target_dir}")
-        if not target_dir.is_dir():
-            raise ValueError(f"输出路径不是目录: {target_dir}")
-
-        if suffix_mode not in {"default", "none", "custom"}:
-            raise ValueError(f"不支持的后缀模式: {suffix_mode}")
-
-        suffix_text = self._build_suffix_text(height=height, suffix_mode=suffix_mode, custom_suffix=custom_suffix)
-
-        files = self._collect_source_files(source)
-        if not files:
-            raise ValueError("未找到可转换的视频文件。")
-
-        ffmpeg_path = self._resolve_tool_path("ffmpeg")
-        ffprobe_path = self._resolve_tool_path("ffprobe")
-        if ffmpeg_path is None or ffprobe_path is None:
-            raise ValueError("未找到可用的 ffmpeg/ffprobe，请查看日志确认依赖是否完整。")
+        source, target_dir, options, files, ffmpeg_path, ffprobe_path = self._prepare_job(
+            source_path=source_path,
+            output_dir=output_dir,
+            height=height,
+            crf=crf,
+            preset=preset,
+            audio_bitrate=audio_bitrate,
+            suffix_mode=suffix_mode,
+            custom_suffix=custom_suffix,
+            concurrency=concurrency,
+            incremental=incremental,
+            stream_copy=stream_copy,
+            segment_seconds=segment_seconds,
+            segment_workers=segment_workers,
+            target_speed=target_speed,
+            renditions=renditions,
+            profile=profile,
+        )
+        height, suffix_text, targets = options.height, options.suffix_text, options.renditions
+        scratch = Path(scratch_dir).expanduser().resolve() if scratch_dir.strip() else None
+        if scratch is not None and not scratch.is_dir():
+            raise ValueError(f"暂存目录不存在或不是目录: {scratch}")
+        if scratch is not None and not os.access(scratch, os.W_OK):
+            raise ValueError(f"暂存目录不可写: {scratch}")
 
         now = time.time()
         job_id = uuid.uuid4().hex
@@ -87,11 +408,11 @@ class VideoConvertService:
             job_id=job_id,
             status="queued",
             progress=0.0,
-            message="任务已创建",
+            message="排队中",
             source_path=str(source),
             output_dir=str(target_dir),
             target_height=height,
-            total_files=len(files),
+            total_files=1,
             processed_files=0,
             current_file=None,
             error=None,
@@ -99,47 +420,654 @@ class VideoConvertService:
             custom_suffix=custom_suffix,
             created_at=now,
             updated_at=now,
+            concurrency=concurrency,
+            incremental=incremental,
+            stream_copy=stream_copy,
+            priority=priority,
+            segment_seconds=segment_seconds,
+            discovery_complete=False,
+            renditions=[item.to_dict() for item in targets],
+            scratch_dir=str(scratch or ""),
+            deduplicate=deduplicate,
+            profile=profile,
         )
         with self._lock:
-            self._jobs[job_id] = job
+            self._job_store.add(job)
+            self._stop_events[job_id] = threading.Event()
+            self._resume_events[job_id] = threading.Event()
+            self._resume_events[job_id].set()
 
         self._logger.info(
-            "Create job. job_id=%s files=%s source=%s output=%s ffmpeg=%s ffprobe=%s suffix_mode=%s suffix_text=%s",
+            "Create job. job_id=%s source=%s output=%s ffmpeg=%s ffprobe=%s suffix_mode=%s suffix_text=%s concurrency=%s incremental=%s stream_copy=%s priority=%s segment_seconds=%s preset=%s target_speed=%s renditions=%s scratch=%s deduplicate=%s profile=%s",
             job_id,
-            len(files),
             source,
             target_dir,
             ffmpeg_path,
             ffprobe_path,
             suffix_mode,
             suffix_text,
+            concurrency,
+            incremental,
+            stream_copy,
+            priority,
+            segment_seconds,
+            preset,
+            target_speed,
+            targets,
+            scratch,
+            deduplicate,
+            options.speed_profile.tag,
         )
 
-        worker = threading.Thread(
-            target=self._run_job,
-            args=(
+        try:
+            self._scheduler.submit(
                 job_id,
-                source,
-                target_dir,
-                files,
-                ffmpeg_path,
-                ffprobe_path,
-                height,
-                crf,
-                preset,
-                audio_bitrate,
-                suffix_text,
-            ),
-            daemon=True,
-            name=f"convert-{job_id[:8]}",
-        )
-        worker.start()
+                priority,
+                lambda: self._run_job(
+                    job_id,
+                    source,
+                    target_dir,
+                    files,
+                    ffmpeg_path,
+                    ffprobe_path,
+                    options,
+                    OutputStager(scratch),
+                    SourceDeduplicator() if deduplicate else None,
+                ),
+            )
+        except ValueError:
+            with self._lock:
+                self._job_store.discard(job_id)
+                self._stop_events.pop(job_id, None)
+                self._resume_events.pop(job_id, None)
+            raise
         return job_id
 
-    def get_job(self, job_id: str) -> dict | None:
+    def estimate_job(
+        self,
+        source_path: str,
+        output_dir: str,
+        height: int,
+        crf: int,
+        preset: str,
+        audio_bitrate: str,
+        suffix_mode: SuffixMode = "default",
+        custom_suffix: str = "",
+        concurrency: int = 1,
+        incremental: bool = False,
+        stream_copy: bool = True,
+        segment_seconds: int = 0,
+        segment_workers: int = DEFAULT_SEGMENT_WORKERS,
+        target_speed: float = DEFAULT_TARGET_SPEED,
+        renditions: list[dict] | None = None,
+        profile: str = DEFAULT_PROFILE,
+    ) -> dict:
+        """预估整批转换的墙钟时间与输出大小。
+
+        只列出文件与读取大小；探测和试编码限于少量抽样文件，并结合本机已完成文件的历史速度与码率。
+        """
+        started = time.perf_counter()
+        source, target_dir, options, files, ffmpeg_path, ffprobe_path = self._prepare_job(
+            source_path=source_path,
+            output_dir=output_dir,
+            height=height,
+            crf=crf,
+            preset=preset,
+            audio_bitrate=audio_bitrate,
+            suffix_mode=suffix_mode,
+            custom_suffix=custom_suffix,
+            concurrency=concurrency,
+            incremental=incremental,
+            stream_copy=stream_copy,
+            segment_seconds=segment_seconds,
+            segment_workers=segment_workers,
+            target_speed=target_speed,
+            renditions=renditions,
+            profile=profile,
+        )
+        threads = self._threads_per_process(options.concurrency)
+        manifest = ConversionManifest(target_dir) if options.incremental else None
+
+        pending: list[tuple[Path, int]] = []
+        skipped = 0
+        for input_file in files:
+            if not self._job_outputs(source, input_file, target_dir, options, manifest):
+                skipped += 1
+                continue
+            try:
+                pending.append((input_file, input_file.stat().st_size))
+            except OSError:
+                self._logger.warning("Skip unreadable file in estimate. path=%s", input_file)
+        source_bytes = sum(size for _, size in pending)
+
+        # Evenly spaced picks cover every part of the tree, like the auto preset samples.
+        step = max(1, len(pending) // ESTIMATE_PROBE_FILES)
+        picked = pending[::step][:ESTIMATE_PROBE_FILES]
+        with ThreadPoolExecutor(max_workers=PROBE_WORKERS, thread_name_prefix="estimate-probe") as pool:
+            probed = list(pool.map(lambda item: self._probe_media(ffprobe_path, item[0]), picked))
+
+        if options.preset == AUTO_PRESET:
+            trial_samples = [self._trial_sample(input_file, media) for (input_file, _), media in zip(picked, probed)]
+            trial_samples = [sample for sample in trial_samples if sample is not None][:AUTO_PRESET_SAMPLE_FILES]
+            preset = AUTO_PRESET_FALLBACK
+            if trial_samples:
+                preset, _ = self._preset_tuner.select_preset(
+                    ffmpeg_path,
+                    trial_samples,
+                    height=options.height,
+                    crf=options.crf,
+                    threads=threads,
+                    concurrency=options.concurrency,
+                    target_speed=options.target_speed,
+                    profile=options.speed_profile,
+                )
+            options = replace(options, preset=preset)
+
+        groups: dict[str, list[tuple[Path, int, MediaInfo, list[Rendition], list[tuple[bool, bool]]]]] = {}
+        for (input_file, size), media in zip(picked, probed):
+            if media is None or media.duration is None:
+                continue
+            targets = [item for item, _ in self._job_outputs(source, input_file, target_dir, options, manifest)]
+            file_options = replace(options, height=targets[0].height, crf=targets[0].crf)
+            copy_plans, _, mode = self._plan_file(media, file_options, targets)
+            key = history_key(
+                media.height,
+                [item.height for item in targets],
+                [item.crf for item in targets],
+                options.preset,
+                options.speed_profile.tag,
+                threads,
+                mode,
+            )
+            groups.setdefault(key, []).append((input_file, size, media, targets, copy_plans))
+
+        samples: list[SampledFile] = []
+        classes: list[dict] = []
+        for key, members in groups.items():
+            observations = self._history.observations(key)
+            trials = 0
+            if len(observations) < ESTIMATE_MIN_HISTORY:
+                for input_file, _, media, targets, copy_plans in members[:ESTIMATE_TRIALS_PER_CLASS]:
+                    observation = self._trial_observation(
+                        ffmpeg_path, input_file, media, targets, copy_plans, options, threads
+                    )
+                    if observation is not None:
+                        observations.append(observation)
+                        trials += 1
+            if not observations:
+                self._logger.warning("No speed data for estimate class. key=%s files=%s", key, len(members))
+                continue
+            model = SpeedModel.from_observations(observations, trials)
+            classes.append({"key": key, "sampled_files": len(members), **model.to_dict()})
+            for _, size, media, _, _ in members:
+                samples.append(
+                    SampledFile(
+                        source_bytes=size,
+                        media_seconds=media.duration,
+                        encode_seconds=media.duration / model.speed,
+                        output_bytes=media.duration * model.bitrate / 8,
+                        time_error=model.time_error,
+                        size_error=model.size_error,
+                    )
+                )
+        if pending and not samples:
+            raise ValueError("抽样文件均无法探测或试编码，无法预估。")
+
+        result = estimate_batch(samples, len(pending), source_bytes, options.concurrency)
+        result.update(
+            {
+                "files": len(pending) + skipped,
+                "pending_files": len(pending),
+                "skipped_files": skipped,
+                "source_bytes": source_bytes,
+                "sampled_files": len(samples),
+                "preset": options.preset,
+                "profile": options.speed_profile.tag,
+                "concurrency": options.concurrency,
+                "threads": threads,
+                "classes": classes,
+                "elapsed_seconds": time.perf_counter() - started,
+            }
+        )
+        self._logger.info(
+            "Estimate done. source=%s files=%s sampled=%s wall_seconds=%s output_bytes=%s elapsed=%.1f",
+            source,
+            result["files"],
+            len(samples),
+            result["wall_seconds"],
+            result["output_bytes"],
+            result["elapsed_seconds"],
+        )
+        return result
+
+    def _trial_observation(
+        self,
+        ffmpeg_path: Path,
+        input_file: Path,
+        media: MediaInfo,
+        targets: list[Rendition],
+        copy_plans: list[tuple[bool, bool]],
+        options: EncodeOptions,
+        threads: int | None,
+    ) -> dict | None:
+        """试编码一个抽样文件的中段，换算成整个文件的速度与码率（含音频）。"""
+        sample = self._trial_sample(input_file, media)
+        seconds_per_second = 0.0
+        bitrate = 0.0
+        for target, (copy_video, copy_audio) in zip(targets, copy_plans):
+            audio_bitrate = media.audio_bit_rate if copy_audio else self._parse_bitrate(options.audio_bitrate)
+            bitrate += audio_bitrate or 0
+            if copy_video:
+                seconds_per_second += 1 / ESTIMATE_COPY_SPEED
+                bitrate += media.video_bit_rate or media.format_bit_rate or 0
+                continue
+            result = self._preset_tuner.trial_encode(
+                ffmpeg_path, sample, target.height, target.crf, options.preset, threads, options.speed_profile
+            )
+            if result is None or result.speed <= 0:
+                return None
+            # Renditions of a ladder share the decode, so adding their times slightly overestimates.
+            seconds_per_second += 1 / result.speed
+            bitrate += result.bitrate
+        return {"speed": 1 / seconds_per_second, "bitrate": bitrate}
+
+    def list_profiles(self, preset: str, height: int, crf: int) -> dict:
+        """列出速度档位定义，附带本机在同一参数下已测得的速度与码率（未测时为 None）。"""
+        threads = self._threads_per_process(1)
+        return {
+            "default": DEFAULT_PROFILE,
+            "preset": preset,
+            "height": height,
+            "crf": crf,
+            "threads": threads,
+            "profiles": [
+                {
+                    **profile.to_dict(),
+                    "benchmark": self._preset_tuner.cached(
+                        PROFILE_REFERENCE_HEIGHT, height, crf, preset, threads, profile
+                    ),
+                }
+                for profile in PROFILES.values()
+            ],
+        }
+
+    def benchmark_profiles(self, preset: str, height: int, crf: int) -> dict:
+        """在本机参考片段上试编码每个速度档位，结果按机器缓存。"""
+        if preset not in X264_PRESETS:
+            raise ValueError(f"不支持的编码预设: {preset}")
+        ffmpeg_path = self._resolve_tool_path("ffmpeg")
+        if ffmpeg_path is None:
+            raise ValueError("未找到可用的 ffmpeg，请查看日志确认依赖是否完整。")
+        threads = self._threads_per_process(1)
+        with self._benchmark_lock:
+            sample = self._reference_sample(ffmpeg_path)
+            for profile in PROFILES.values():
+                # Running jobs share the CPU and slow the trials down; the log records how many there were.
+                result = self._preset_tuner.measure(ffmpeg_path, sample, height, crf, preset, threads, profile)
+                self._logger.info(
+                    "Profile benchmarked. profile=%s preset=%s height=%s crf=%s active_encodes=%s result=%s",
+                    profile.tag,
+                    preset,
+                    height,
+                    crf,
+                    self._active_encode_count(),
+                    result,
+                )
+        return self.list_profiles(preset, height, crf)
+
+    def _reference_sample(self, ffmpeg_path: Path) -> TrialSample:
+        reference = self._cache_dir / f"profile_reference_{PROFILE_REFERENCE_HEIGHT}p.mp4"
+        if not reference.exists():
+            temp_file = reference.with_name(f".{reference.stem}-{uuid.uuid4().hex[:8]}.mp4")
+            width = PROFILE_REFERENCE_HEIGHT * 16 // 9
+            result = self._run_tool(
+                "ffmpeg",
+                [
+                    str(ffmpeg_path),
+                    "-y",
+                    "-v",
+                    "error",
+                    "-f",
+                    "lavfi",
+                    "-i",
+                    f"testsrc2=size={width}x{PROFILE_REFERENCE_HEIGHT}:rate=30:duration={PROFILE_REFERENCE_SECONDS}",
+                    "-c:v",
+                    "libx264",
+                    "-preset",
+                    "ultrafast",
+                    str(temp_file),
+                ],
+            )
+            if result.returncode != 0 or not temp_file.exists():
+                temp_file.unlink(missing_ok=True)
+                raise RuntimeError(f"参考片段生成失败: {result.stderr.strip()}")
+            os.replace(temp_file, reference)
+            self._logger.info("Profile reference clip generated. path=%s", reference)
+        return TrialSample(
+            input_file=reference,
+            start=0.0,
+            seconds=float(PROFILE_REFERENCE_SECONDS),
+            source_height=PROFILE_REFERENCE_HEIGHT,
+        )
+
+    def _prepare_job(
+        self,
+        source_path: str,
+        output_dir: str,
+        height: int,
+        crf: int,
+        preset: str,
+        audio_bitrate: str,
+        suffix_mode: SuffixMode,
+        custom_suffix: str,
+        concurrency: int,
+        incremental: bool,
+        stream_copy: bool,
+        segment_seconds: int,
+        segment_workers: int,
+        target_speed: float,
+        renditions: list[dict] | None,
+        profile: str,
+    ) -> tuple[Path, Path, EncodeOptions, Iterator[Path], Path, Path]:
+        """校验任务参数并定位 ffmpeg/ffprobe；start_job 与 estimate_job 共用。"""
+        source = Path(source_path).expanduser().resolve()
+        target_dir = Path(output_dir).expanduser().resolve()
+
+        if not source.exists():
+            raise ValueError(f"输入路径不存在: {source}")
+        if not target_dir.exists():
+            raise ValueError(f"输出目录不存在: {target_dir}")
+        if not target_dir.is_dir():
+            raise ValueError(f"输出路径不是目录: {target_dir}")
+
+        if suffix_mode not in {"default", "none", "custom"}:
+            raise ValueError(f"不支持的后缀模式: {suffix_mode}")
+        if preset != AUTO_PRESET and preset not in X264_PRESETS:
+            raise ValueError(f"不支持的编码预设: {preset}")
+        if target_speed <= 0:
+            raise ValueError("目标吞吐倍数必须大于 0。")
+        if not 1 <= concurrency <= MAX_CONCURRENCY:
+            raise ValueError(f"并行数必须在 1 到 {MAX_CONCURRENCY} 之间。")
+        if segment_seconds and segment_seconds < MIN_SEGMENT_SECONDS:
+            raise ValueError(f"分段时长不能小于 {MIN_SEGMENT_SECONDS} 秒。")
+        if not 1 <= segment_workers <= MAX_CONCURRENCY:
+            raise ValueError(f"分段并行数必须在 1 到 {MAX_CONCURRENCY} 之间。")
+        if stream_copy and self._parse_bitrate(audio_bitrate) is None:
+            raise ValueError(f"无法识别的音频码率: {audio_bitrate}")
+        get_profile(profile)
+
+        suffix_text = self._build_suffix_text(height=height, suffix_mode=suffix_mode, custom_suffix=custom_suffix)
+        targets = self._build_renditions(renditions or [], default_crf=crf)
+        if targets:
+            height, crf, suffix_text = targets[0].height, targets[0].crf, targets[0].suffix_text
+        options = EncodeOptions(
+            height=height,
+            crf=crf,
+            preset=preset,
+            audio_bitrate=audio_bitrate,
+            suffix_text=suffix_text,
+            concurrency=concurrency,
+            incremental=incremental,
+            stream_copy=stream_copy,
+            segment_seconds=segment_seconds,
+            segment_workers=segment_workers,
+            target_speed=target_speed,
+            renditions=tuple(targets),
+            profile=profile,
+        )
+
+        files = self._iter_source_files(source)
+        first_file = next(files, None)
+        if first_file is None:
+            raise ValueError("未找到可转换的视频文件。")
+        files = chain([first_file], files)
+
+        ffmpeg_path = self._resolve_tool_path("ffmpeg")
+        ffprobe_path = self._resolve_tool_path("ffprobe")
+        if ffmpeg_path is None or ffprobe_path is None:
+            raise ValueError("未找到可用的 ffmpeg/ffprobe，请查看日志确认依赖是否完整。")
+        if not self._tools.has_encoder("libx264"):
+            raise ValueError(f"当前 ffmpeg 不支持 libx264 编码器: {ffmpeg_path}")
+
+        return source, target_dir, options, files, ffmpeg_path, ffprobe_path
+
+    def get_job(self, job_id: str, detail: bool = False) -> dict | None:
+        """任务快照；detail 为真时附带按文件的明细（最近 FILE_DETAIL_LIMIT 个文件）。"""
+        exclude = () if detail else DETAIL_FIELDS
+        with self._lock:
+            job = self._job_store.get(job_id)
+            data = job.to_dict(exclude) if job is not None else None
+        if data is None:
+            # Evicted from memory or from before a restart.
+            data = self._job_store.load(job_id)
+            if data is None:
+                return None
+            for key in exclude:
+                data.pop(key, None)
+        data["elapsed_seconds"] = self._elapsed_seconds(data)
+        data["queue_position"] = self._scheduler.position(job_id) if data["status"] == "queued" else None
+        return data
+
+    def list_jobs(self, status: str | None = None, limit: int = 50, offset: int = 0) -> dict:
+        with self._lock:
+            total, items = self._job_store.list(status=status, limit=limit, offset=offset)
+        for item in items:
+            item["elapsed_seconds"] = self._elapsed_seconds(item)
+        return {"total": total, "limit": limit, "offset": offset, "items": items}
+
+    def get_job_revision(self, job_id: str) -> int | None:
+        # Lock-free read so watchers can poll for changes without contending with workers.
+        job = self._job_store.peek(job_id)
+        return None if job is None else job.revision
+
+    def wait_for_change(self, sequence: int, timeout: float | None = None) -> int:
+        """阻塞到任意任务在 sequence 之后有变更或超时，返回当前的变更序号。"""
+        with self._job_changed:
+            self._job_changed.wait_for(lambda: self._change_sequence != sequence, timeout)
+            return self._change_sequence
+
+    def cancel_job(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self._job_store.get(job_id)
+            if job is None:
+                if self._job_store.contains(job_id):
+                    raise ValueError("任务已结束，无法取消。")
+                return None
+            if job.status in TERMINAL_STATUSES:
+                raise ValueError(f"任务已结束，无法取消（状态: {job.status}）。")
+            if job.status == "queued" and self._scheduler.cancel(job_id):
+                job.status = "cancelled"
+                job.message = "任务已取消"
+                job.finished_at = time.time()
+                self._stop_events.pop(job_id, None)
+                self._resume_events.pop(job_id, None)
+            else:
+                job.status = "cancelling"
+                job.message = "正在取消"
+                stop_event = self._stop_events.get(job_id)
+                if stop_event is not None:
+                    stop_event.set()
+                resume_event = self._resume_events.get(job_id)
+                if resume_event is not None:
+                    resume_event.set()
+            self._touch(job)
+            self._job_store.save(job)
+        self._kill_processes(job_id)
+        self._logger.info("Cancel job. job_id=%s", job_id)
+        return self.get_job(job_id)
+
+    def pause_job(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self._job_store.get(job_id)
+            if job is None:
+                if self._job_store.contains(job_id):
+                    raise ValueError("只能暂停正在运行的任务。")
+                return None
+            resume_event = self._resume_events.get(job_id)
+            if job.status != "running" or resume_event is None:
+                raise ValueError("只能暂停正在运行的任务。")
+            resume_event.clear()
+            now = time.time()
+            job.status = "paused"
+            job.message = "已暂停"
+            job.paused_at = now
+            self._touch(job, now)
+            self._job_store.save(job)
+            processes = list(self._processes.get(job_id, ()))
+        if self._work_queue is not None:
+            self._work_queue.set_paused(job_id, True)
+        for process in processes:
+            self._suspend_process(process, suspend=True)
+        self._logger.info("Pause job. job_id=%s processes=%s", job_id, len(processes))
+        return self.get_job(job_id)
+
+    def resume_job(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self._job_store.get(job_id)
+            if job is None:
+                if self._job_store.contains(job_id):
+                    raise ValueError("只能继续已暂停的任务。")
+                return None
+            resume_event = self._resume_events.get(job_id)
+            if job.status != "paused" or resume_event is None:
+                raise ValueError("只能继续已暂停的任务。")
+            now = time.time()
+            job.status = "running"
+            job.message = "正在转换"
+            if job.paused_at is not None:
+                job.paused_seconds += now - job.paused_at
+            job.paused_at = None
+            self._touch(job, now)
+            self._job_store.save(job)
+            processes = list(self._processes.get(job_id, ()))
+        if self._work_queue is not None:
+            self._work_queue.set_paused(job_id, False)
+        for process in processes:
+            self._suspend_process(process, suspend=False)
+        resume_event.set()
+        self._logger.info("Resume job. job_id=%s processes=%s", job_id, len(processes))
+        return self.get_job(job_id)
+
+    def set_job_priority(self, job_id: str, priority: int) -> dict | None:
+        with self._lock:
+            job = self._job_store.get(job_id)
+            if job is None:
+                if self._job_store.contains(job_id):
+                    raise ValueError("只能调整排队中任务的优先级。")
+                return None
+            if job.status != "queued" or not self._scheduler.reprioritize(job_id, priority):
+                raise ValueError("只能调整排队中任务的优先级。")
+            job.priority = priority
+            self._touch(job)
+            self._job_store.save(job)
+        self._logger.info("Reprioritize job. job_id=%s priority=%s", job_id, priority)
+        return self.get_job(job_id)
+
+    def get_tool_info(self) -> dict:
+        ffmpeg = self._tools.capabilities("ffmpeg")
+        ffprobe = self._tools.info("ffprobe")
+        return {
+            "ffmpeg": None if ffmpeg is None else ffmpeg.to_dict(),
+            "ffprobe": None if ffprobe is None else ffprobe.to_dict(),
+        }
+
+    def encode_work_item(
+        self,
+        item: dict,
+        on_progress: Callable[[EncodeTelemetry], None],
+        input_file: Path | None = None,
+        output_files: list[Path] | None = None,
+        threads: int | None = None,
+    ) -> None:
+        """工作节点执行协调端下发的一个文件；传输模式下用本地临时路径替换输入与输出。"""
+        item_id = item["item_id"]
+        ffmpeg_path = self._resolve_tool_path("ffmpeg")
+        ffprobe_path = self._resolve_tool_path("ffprobe")
+        if ffmpeg_path is None or ffprobe_path is None:
+            raise RuntimeError("未找到可用的 ffmpeg/ffprobe，请查看日志确认依赖是否完整。")
+        paths = output_files or [Path(output["path"]) for output in item["outputs"]]
+        outputs = [
+            (Rendition(height=output["height"], crf=output["crf"], suffix_text=output["suffix_text"]), path)
+            for output, path in zip(item["outputs"], paths)
+        ]
+        stager = OutputStager()
+        staged_outputs = [(rendition, stager.staging_path(path)) for rendition, path in outputs]
+        for _, path in outputs:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            stager.sweep(path.parent)
+        with self._lock:
+            self._stop_events[item_id] = threading.Event()
+            self._resume_events[item_id] = threading.Event()
+            self._resume_events[item_id].set()
+        try:
+            self._engine.call(
+                self._encode_file(
+                    job_id=item_id,
+                    ffmpeg_path=ffmpeg_path,
+                    ffprobe_path=ffprobe_path,
+                    input_file=input_file or Path(item["input_file"]),
+                    outputs=staged_outputs,
+                    media=MediaInfo(**item["media"]) if item["media"] else None,
+                    options=EncodeOptions.from_dict(item["options"]),
+                    copy_plans=[tuple(plan) for plan in item["copy_plans"]],
+                    segmented=item["segmented"],
+                    threads=threads,
+                    on_progress=on_progress,
+                )
+            )
+            for (_, staged), (_, path) in zip(staged_outputs, outputs):
+                stager.commit(staged, path)
+        except BaseException:
+            for _, path in staged_outputs:
+                stager.discard(path)
+            raise
+        finally:
+            with self._lock:
+                self._stop_events.pop(item_id, None)
+                self._resume_events.pop(item_id, None)
+                self._processes.pop(item_id, None)
+
+    def control_work_item(self, item_id: str, state: str) -> None:
+        """按协调端的指示暂停（pause）、继续（run）或终止（stop）本机正在执行的条目。"""
+        if state == "stop":
+            self._stop_job(item_id)
+            return
+        paused = state == "pause"
         with self._lock:
-            job = self._jobs.get(job_id)
-            return None if job is None else job.to_dict()
+            resume_event = self._resume_events.get(item_id)
+            if resume_event is None or resume_event.is_set() != paused:
+                return
+            if paused:
+                resume_event.clear()
+            else:
+                resume_event.set()
+            processes = list(self._processes.get(item_id, ()))
+        for process in processes:
+            self._suspend_process(process, suspend=paused)
+        self._logger.info("Work item %s. item_id=%s processes=%s", "paused" if paused else "resumed", item_id, len(processes))
+
+    def render_metrics(self) -> str:
+        with self._lock:
+            statuses: dict[str, float] = {}
+            for job in self._job_store.values():
+                statuses[job.status] = statuses.get(job.status, 0) + 1
+        active_encodes = self._active_encode_count()
+        gauges = {
+            "vediozip_queue_depth": ("Jobs waiting in the scheduler queue", self._scheduler.queued_count),
+            "vediozip_running_jobs": ("Jobs currently running", self._scheduler.running_count),
+            "vediozip_active_encodes": ("Running ffmpeg processes", active_encodes),
+            "vediozip_jobs": ("Jobs held in memory by status", statuses),
+        }
+        resources = self._resources.snapshot()
+        gauges["vediozip_core_budget"] = ("Cores shared by local encoder processes", resources["core_budget"])
+        if "load_per_core" in resources:
+            gauges["vediozip_load_per_core"] = ("One-minute load average per core", resources["load_per_core"])
+        if "available_mb" in resources:
+            gauges["vediozip_available_memory_mb"] = ("Available memory in MiB", resources["available_mb"])
+        if self._work_queue is not None:
+            gauges["vediozip_work_items"] = ("Files handed to encode workers by status", self._work_queue.counts())
+            gauges["vediozip_workers"] = ("Encode workers seen recently", len(self._work_queue.workers()))
+        return self._metrics.render(gauges)
 
     def _sanitize_custom_suffix(self, suffix: str) -> str:
         cleaned = suffix.strip()
@@ -148,6 +1076,31 @@ class VideoConvertService:
         cleaned = cleaned.rstrip(". ")
         return cleaned
 
+    def _build_renditions(self, items: list[dict], default_crf: int) -> list[Rendition]:
+        if len(items) > MAX_RENDITIONS:
+            raise ValueError(f"最多支持 {MAX_RENDITIONS} 个输出清晰度。")
+        renditions: list[Rendition] = []
+        for item in items:
+            height = int(item.get("height") or 0)
+            if height <= 0:
+                raise ValueError(f"输出高度必须大于 0: {height}")
+            crf = default_crf if item.get("crf") is None else int(item["crf"])
+            # Without an explicit suffix each rendition is named by its height so the outputs never collide.
+            custom_suffix = item.get("suffix") or ""
+            suffix_mode: SuffixMode = "custom" if custom_suffix.strip() else "default"
+            renditions.append(
+                Rendition(
+                    height=height,
+                    crf=crf,
+                    suffix_text=self._build_suffix_text(height=height, suffix_mode=suffix_mode, custom_suffix=custom_suffix),
+                )
+            )
+        suffixes = [item.suffix_text for item in renditions]
+        duplicates = sorted({suffix for suffix in suffixes if suffixes.count(suffix) > 1})
+        if duplicates:
+            raise ValueError(f"多个清晰度的输出后缀重复: {', '.join(duplicates)}")
+        return renditions
+
     def _build_suffix_text(self, height: int, suffix_mode: SuffixMode, custom_suffix: str) -> str:
         if suffix_mode == "none":
             return ""
@@ -164,104 +1117,926 @@ class VideoConvertService:
         job_id: str,
         source_root: Path,
         output_dir: Path,
-        files: list[Path],
+        files: Iterator[Path],
         ffmpeg_path: Path,
         ffprobe_path: Path,
-        height: int,
-        crf: int,
-        preset: str,
-        audio_bitrate: str,
-        suffix_text: str,
+        options: EncodeOptions,
+        stager: OutputStager,
+        dedup: SourceDeduplicator | None,
     ) -> None:
-        self._update_job(job_id, status="running", message="正在转换", progress=0.0)
-        self._logger.info("Job start. job_id=%s", job_id)
+        with self._lock:
+            job = self._job_store.peek(job_id)
+            stop_event = self._stop_events.get(job_id)
+            if job is None or stop_event is None:
+                return
+            resume_event = self._resume_events.get(job_id)
+            if job.status != "queued" or resume_event is None:
+                job.status = "cancelled"
+                job.message = "任务已取消"
+                job.finished_at = time.time()
+                self._touch(job, job.finished_at)
+                self._job_store.save(job)
+                self._stop_events.pop(job_id, None)
+                self._resume_events.pop(job_id, None)
+                return
+            job.status = "running"
+            job.message = "正在转换"
+            job.started_at = time.time()
+            self._touch(job, job.started_at)
+            self._job_store.save(job)
+        self._logger.info("Job start. job_id=%s options=%s", job_id, options)
+
+        concurrency = options.concurrency
+        tracker = _JobProgress(0)
+        threads = self._threads_per_process(concurrency)
+        manifest = ConversionManifest(output_dir) if options.incremental else None
+        skipped = 0
+        if stager.scratch_dir is not None:
+            stager.sweep(stager.scratch_dir)
+
+        try:
+            if options.preset == AUTO_PRESET:
+                head = list(islice(files, PROBE_WINDOW))
+                files = chain(head, files)
+                options = self._resolve_auto_preset(job_id, head, ffmpeg_path, ffprobe_path, options, threads)
+
+            with (
+                ThreadPoolExecutor(max_workers=PROBE_WORKERS, thread_name_prefix=f"probe-{job_id[:8]}") as probe_pool,
+                # One mover at a time: copies to a slow target only compete with each other.
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"commit-{job_id[:8]}") as commit_pool,
+            ):
+                pending_probes: deque[tuple[int, Path, list[tuple[Rendition, Path]], Future]] = deque()
+                running: set[Future] = set()
+                commits: set[Future] = set()
+
+                def collect(done: set[Future]) -> None:
+                    # Encodes that staged in scratch return the future of their move to the target.
+                    self._raise_first_error(done)
+                    commits.update(future.result() for future in done if future.result() is not None)
+                    moved = {future for future in commits if future.done()}
+                    commits.difference_update(moved)
+                    self._raise_first_error(moved)
+
+                def dispatch() -> None:
+                    nonlocal running
+                    index, input_file, outputs, probe = pending_probes.popleft()
+                    media = probe.result()
+                    while len(running) >= concurrency:
+                        done, running = wait(running, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    if stop_event.is_set():
+                        raise JobCancelledError("任务已取消")
+                    # Encodes are coroutines on the process engine loop: waiting on ffmpeg holds no thread.
+                    running.add(
+                        self._engine.submit(
+                            self._convert_job_file(
+                                job_id=job_id,
+                                index=index,
+                                input_file=input_file,
+                                outputs=outputs,
+                                media=media,
+                                ffmpeg_path=ffmpeg_path,
+                                ffprobe_path=ffprobe_path,
+                                options=options,
+                                threads=threads,
+                                tracker=tracker,
+                                manifest=manifest,
+                                stop_event=stop_event,
+                                resume_event=resume_event,
+                                stager=stager,
+                                commit_pool=commit_pool,
+                                dedup=dedup,
+                            )
+                        )
+                    )
+
+                # The walk runs on its own thread so the total keeps growing while dispatch waits for encodes.
+                discovered: queue.Queue = queue.Queue(maxsize=DISCOVERY_QUEUE_SIZE)
+                threading.Thread(
+                    target=self._discover_files,
+                    args=(job_id, files, discovered, tracker, stop_event),
+                    name=f"discover-{job_id[:8]}",
+                    daemon=True,
+                ).start()
+                try:
+                    for index, input_file in enumerate(self._drain_discovered(discovered, stop_event)):
+                        outputs = self._job_outputs(source_root, input_file, output_dir, options, manifest)
+                        if not outputs:
+                            skipped += 1
+                            completed, progress = tracker.finish(index)
+                            self._metrics.count_file("skipped")
+                            self._update_job(
+                                job_id,
+                                processed_files=completed,
+                                total_files=tracker.total,
+                                skipped_files=skipped,
+                                progress=progress,
+                            )
+                            continue
+
+                        original = dedup.find_original(input_file) if dedup is not None else None
+                        if original is not None:
+                            # Byte-identical copies reuse the outputs of the first one once those are committed.
+                            link = partial(
+                                self._link_duplicate,
+                                job_id=job_id,
+                                index=index,
+                                input_file=input_file,
+                                original=original,
+                                outputs=outputs,
+                                source_root=source_root,
+                                output_dir=output_dir,
+                                options=options,
+                                stager=stager,
+                                tracker=tracker,
+                                manifest=manifest,
+                            )
+                            if not dedup.defer(original, link):
+                                link()
+                            continue
+
+                        probe = probe_pool.submit(self._probe_media, ffprobe_path, input_file)
+                        probe.add_done_callback(
+                            lambda future, index=index: tracker.set_duration(
+                                index, self._duration_of(future.result()) if future.exception() is None else None
+                            )
+                        )
+                        pending_probes.append((index, input_file, outputs, probe))
+                        if len(pending_probes) >= PROBE_WINDOW:
+                            dispatch()
+                    while pending_probes:
+                        dispatch()
+                    collect(wait(running).done)
+                    self._raise_first_error(wait(commits).done)
+                except BaseException:
+                    stop_event.set()
+                    probe_pool.shutdown(wait=False, cancel_futures=True)
+                    self._kill_processes(job_id)
+                    # The encodes see the stop or their killed ffmpeg; their cleanup finishes before the job ends.
+                    wait(running)
+                    raise
+
+            with self._lock:
+                job = self._job_store.peek(job_id)
+                failed = 0 if job is None else job.failed_files
+            self._update_job(
+                job_id,
+                status="completed",
+                progress=1.0,
+                message="全部转换完成" if not failed else f"转换完成，{failed} 个源文件在转换前已不存在",
+                current_file=None,
+                active_files=[],
+                eta_seconds=None,
+                finished_at=time.time(),
+            )
+            self._logger.info("Job completed. job_id=%s skipped=%s failed=%s", job_id, skipped, failed)
+        except Exception as exc:
+            with self._lock:
+                job = self._job_store.peek(job_id)
+                cancelled = job is not None and job.status == "cancelling"
+            if cancelled:
+                self._update_job(
+                    job_id,
+                    status="cancelled",
+                    message="任务已取消",
+                    current_file=None,
+                    active_files=[],
+                    eta_seconds=None,
+                    finished_at=time.time(),
+                )
+                self._logger.info("Job cancelled. job_id=%s", job_id)
+            else:
+                error_message = f"{exc} (日志: {get_log_file_path()})"
+                self._update_job(
+                    job_id,
+                    status="failed",
+                    message="转换失败",
+                    error=error_message,
+                    current_file=None,
+                    active_files=[],
+                    eta_seconds=None,
+                    finished_at=time.time(),
+                )
+                self._logger.exception("Job failed. job_id=%s error=%s", job_id, exc)
+        finally:
+            with self._lock:
+                self._stop_events.pop(job_id, None)
+                self._resume_events.pop(job_id, None)
+                self._processes.pop(job_id, None)
 
-        durations = [self._probe_duration(ffprobe_path, path) for path in files]
-        has_all_duration = all(d is not None and d > 0 for d in durations)
+    def _discover_files(
+        self,
+        job_id: str,
+        files: Iterator[Path],
+        discovered: queue.Queue,
+        tracker: _JobProgress,
+        stop_event: threading.Event,
+    ) -> None:
+        """遍历源目录并把文件放入队列，同时更新总数；结束时放入 _DISCOVERY_DONE，遍历出错时放入异常。"""
 
-        processed_duration = 0.0
-        total_duration = sum(d for d in durations if d is not None) if has_all_duration else 0.0
+        def put(item: object) -> bool:
+            while not stop_event.is_set():
+                try:
+                    discovered.put(item, timeout=PROGRESS_PUBLISH_INTERVAL)
+                    return True
+                except queue.Full:
+                    continue
+            return False
 
+        count = 0
+        last_publish = 0.0
         try:
-            for index, input_file in enumerate(files):
-                output_file = self._build_output_path(
+            for input_file in files:
+                if not put(input_file):
+                    return
+                count += 1
+                tracker.set_total(count)
+                now = time.monotonic()
+                if now - last_publish >= PROGRESS_PUBLISH_INTERVAL:
+                    last_publish = now
+                    self._publish_total(job_id, count)
+        except Exception as exc:
+            self._logger.exception("Source discovery failed. job_id=%s files=%s", job_id, count)
+            put(exc)
+            return
+        self._publish_total(job_id, count, discovery_complete=True)
+        self._logger.info("Source discovery done. job_id=%s files=%s", job_id, count)
+        put(_DISCOVERY_DONE)
+
+    def _drain_discovered(self, discovered: queue.Queue, stop_event: threading.Event) -> Iterator[Path]:
+        while True:
+            try:
+                item = discovered.get(timeout=PROGRESS_PUBLISH_INTERVAL)
+            except queue.Empty:
+                # A cancelled walk never sends the end marker.
+                if stop_event.is_set():
+                    raise JobCancelledError("任务已取消") from None
+                continue
+            if item is _DISCOVERY_DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def _publish_total(self, job_id: str, total: int, discovery_complete: bool = False) -> None:
+        with self._lock:
+            job = self._job_store.peek(job_id)
+            if job is None:
+                return
+            # Finished files publish the tracker's total too, which may already be ahead of this one.
+            job.total_files = max(job.total_files, total)
+            job.discovery_complete = discovery_complete
+            self._touch(job)
+
+    def _job_outputs(
+        self,
+        source_root: Path,
+        input_file: Path,
+        output_dir: Path,
+        options: EncodeOptions,
+        manifest: ConversionManifest | None,
+    ) -> list[tuple[Rendition, Path]]:
+        """一个源文件待生成的输出；增量模式下去掉清单中已是最新的输出。"""
+        outputs = [
+            (
+                rendition,
+                self._build_output_path(
                     source_root=source_root,
                     input_file=input_file,
                     output_dir=output_dir,
-                    suffix_text=suffix_text,
-                )
-                output_file.parent.mkdir(parents=True, exist_ok=True)
-                duration = durations[index]
+                    suffix_text=rendition.suffix_text,
+                ),
+            )
+            for rendition in options.targets()
+        ]
+        if manifest is None:
+            return outputs
+        return [
+            (rendition, output_file)
+            for rendition, output_file in outputs
+            if not manifest.is_up_to_date(input_file, output_file, options.manifest_params(rendition))
+        ]
 
-                self._update_job(
-                    job_id,
-                    current_file=str(input_file),
-                    message=f"正在转换 ({index + 1}/{len(files)}): {input_file.name}",
-                )
+    def _resolve_auto_preset(
+        self,
+        job_id: str,
+        files: list[Path],
+        ffmpeg_path: Path,
+        ffprobe_path: Path,
+        options: EncodeOptions,
+        threads: int | None,
+    ) -> EncodeOptions:
+        self._update_job(job_id, message="正在试编码以选择预设")
+        step = max(1, len(files) // AUTO_PRESET_SAMPLE_FILES)
+        samples: list[TrialSample] = []
+        for input_file in files[::step][:AUTO_PRESET_SAMPLE_FILES]:
+            sample = self._trial_sample(input_file, self._probe_media(ffprobe_path, input_file))
+            if sample is not None:
+                samples.append(sample)
+
+        measurements: dict[str, dict] = {}
+        if samples:
+            preset, measurements = self._preset_tuner.select_preset(
+                ffmpeg_path,
+                samples,
+                height=options.height,
+                crf=options.crf,
+                threads=threads,
+                concurrency=options.concurrency,
+                target_speed=options.target_speed,
+                profile=options.speed_profile,
+                runner=self._trial_runner(job_id),
+            )
+        else:
+            preset = AUTO_PRESET_FALLBACK
+            self._logger.warning("No trial samples for auto preset, fallback. job_id=%s preset=%s", job_id, preset)
+        if self._is_stopping(job_id):
+            raise JobCancelledError("任务已取消")
+
+        self._update_job(job_id, selected_preset=preset, preset_measurements=measurements, message="正在转换")
+        return replace(options, preset=preset)
+
+    def _trial_sample(self, input_file: Path, media: MediaInfo | None) -> TrialSample | None:
+        if media is None or media.duration is None:
+            return None
+        seconds = min(TRIAL_SECONDS, media.duration)
+        return TrialSample(
+            input_file=input_file,
+            start=max(0.0, media.duration / 2 - seconds / 2),
+            seconds=seconds,
+            source_height=media.height,
+        )
+
+    async def _convert_job_file(
+        self,
+        job_id: str,
+        index: int,
+        input_file: Path,
+        outputs: list[tuple[Rendition, Path]],
+        media: MediaInfo | None,
+        ffmpeg_path: Path,
+        ffprobe_path: Path,
+        options: EncodeOptions,
+        threads: int | None,
+        tracker: _JobProgress,
+        manifest: ConversionManifest | None,
+        stop_event: threading.Event,
+        resume_event: threading.Event,
+        stager: OutputStager,
+        commit_pool: ThreadPoolExecutor,
+        dedup: SourceDeduplicator | None,
+    ) -> Future | None:
+        """在进程引擎的事件循环上转换一个文件；阻塞的文件操作交给工作线程，等待 ffmpeg 时不占用线程。"""
+        while not resume_event.is_set():
+            await asyncio.sleep(RESUME_POLL_INTERVAL)
+        if self._work_queue is None:
+            # Remote encodes run on other machines, so only local ones wait for this host to calm down.
+            await self._resources.wait_for_capacity_async(stop_event, self._active_encode_count)
+        if stop_event.is_set():
+            raise JobCancelledError("任务已停止")
+        if media is None and not await asyncio.to_thread(input_file.exists):
+            # Removed after discovery: only this file fails, the rest of the job goes on.
+            self._logger.warning("Source vanished, file failed. job_id=%s input=%s", job_id, input_file)
+            self._metrics.count_file("failed")
+            completed, progress = tracker.finish(index)
+            with self._lock:
+                job = self._job_store.peek(job_id)
+                if job is not None:
+                    job.failed_files += 1
+            self._publish_progress(
+                job_id,
+                tracker,
+                processed_files=completed,
+                total_files=tracker.total,
+                progress=progress,
+            )
+            if dedup is not None:
+                # Copies waiting on it find no outputs to link and fail the same way.
+                return commit_pool.submit(self._run_deferred, dedup.mark_done(input_file))
+            return None
+
+        rendition, output_file = outputs[0]
+        await asyncio.to_thread(output_file.parent.mkdir, parents=True, exist_ok=True)
+        # Each output folder is checked for partials left by a crash the first time this job writes there.
+        await asyncio.to_thread(stager.sweep, output_file.parent)
+        # A single target keeps the per-file paths below; several targets share one decode.
+        options = replace(options, height=rendition.height, crf=rendition.crf)
+        copy_plans, segmented, mode = self._plan_file(media, options, [item for item, _ in outputs])
+        self._record_stream_mode(job_id, input_file, mode)
+        self._logger.info("Stream plan. job_id=%s input=%s mode=%s media=%s", job_id, input_file, mode, media)
+
+        # Remote workers stage their own outputs; locally the encode writes to a partial file first.
+        use_scratch = False
+        scratch_bytes = 0
+        staged_outputs = outputs
+        if self._work_queue is None:
+            reserved = await self._use_scratch(job_id, stager, input_file, len(outputs), commit_pool)
+            use_scratch = reserved is not None
+            scratch_bytes = reserved or 0
+            staged_outputs = [(item, stager.staging_path(path, use_scratch)) for item, path in outputs]
+
+        started = tracker.start(index, str(input_file))
+        self._update_job(
+            job_id,
+            current_file=str(input_file),
+            active_files=tracker.active_files(),
+            message=f"正在转换 ({started}/{tracker.total}): {input_file.name}",
+        )
+
+        encoded_seconds = 0.0
+
+        def on_progress(telemetry: EncodeTelemetry) -> None:
+            nonlocal encoded_seconds
+            self._metrics.add_encoded_seconds(telemetry.out_seconds - encoded_seconds)
+            encoded_seconds = max(encoded_seconds, telemetry.out_seconds)
+            progress = tracker.update(index, float("inf") if telemetry.done else telemetry.out_seconds, telemetry)
+            if progress is not None:
+                self._publish_progress(job_id, tracker, progress=progress)
 
-                def on_progress(current_seconds: float) -> None:
-                    if has_all_duration and duration and total_duration > 0:
-                        file_ratio = min(current_seconds / duration, 1.0)
-                        value = (processed_duration + duration * file_ratio) / total_duration
-                    elif len(files) > 0 and duration and duration > 0:
-                        file_ratio = min(current_seconds / duration, 1.0)
-                        value = (index + file_ratio) / len(files)
-                    elif len(files) > 0:
-                        value = index / len(files)
-                    else:
-                        value = 0.0
-                    self._update_job(job_id, progress=max(0.0, min(value, 1.0)))
-
-                self._convert_single_file(
+        try:
+            if self._work_queue is not None:
+                await self._encode_remote(
+                    job_id=job_id,
+                    index=index,
+                    input_file=input_file,
+                    outputs=outputs,
+                    media=media,
+                    options=options,
+                    copy_plans=copy_plans,
+                    segmented=segmented,
+                    stop_event=stop_event,
+                    on_progress=on_progress,
+                )
+            else:
+                pause_marker = self._pause_marker(job_id)
+                encode_started = time.perf_counter()
+                await self._encode_file(
                     job_id=job_id,
                     ffmpeg_path=ffmpeg_path,
+                    ffprobe_path=ffprobe_path,
                     input_file=input_file,
-                    output_file=output_file,
-                    height=height,
-                    crf=crf,
-                    preset=preset,
-                    audio_bitrate=audio_bitrate,
+                    outputs=staged_outputs,
+                    media=media,
+                    options=options,
+                    copy_plans=copy_plans,
+                    segmented=segmented,
+                    threads=threads,
                     on_progress=on_progress,
                 )
+                # A pause during the encode would count as encode time.
+                if self._pause_marker(job_id) == pause_marker:
+                    encode_seconds = time.perf_counter() - encode_started
+                    await asyncio.to_thread(
+                        self._record_history, media, staged_outputs, options, threads, mode, encode_seconds
+                    )
+        except BaseException as exc:
+            # Only the partial files go; an output from an earlier run stays intact.
+            if staged_outputs is not outputs:
+                for _, path in staged_outputs:
+                    stager.discard(path)
+            if use_scratch:
+                stager.release_scratch(scratch_bytes)
+            self._metrics.count_file("cancelled" if isinstance(exc, JobCancelledError) else "failed")
+            raise
 
-                if has_all_duration and duration:
-                    processed_duration += duration
-
-                completed = index + 1
-                self._update_job(job_id, processed_files=completed, progress=completed / len(files))
+        def commit() -> None:
+            try:
+                if staged_outputs is not outputs:
+                    for (_, staged), (_, path) in zip(staged_outputs, outputs):
+                        stager.commit(staged, path)
+            except BaseException:
+                for _, staged in staged_outputs:
+                    stager.discard(staged)
+                self._metrics.count_file("failed")
+                raise
+            finally:
+                if use_scratch:
+                    stager.release_scratch(scratch_bytes)
+            if manifest is not None:
+                for item, path in outputs:
+                    manifest.record(input_file, path, options.manifest_params(item))
 
-            self._update_job(
+            completed, progress = tracker.finish(index)
+            self._metrics.count_file("completed")
+            self._publish_progress(
                 job_id,
-                status="completed",
-                progress=1.0,
-                message="全部转换完成",
-                current_file=None,
+                tracker,
+                processed_files=completed,
+                total_files=tracker.total,
+                progress=progress,
+                active_files=tracker.active_files(),
             )
-            self._logger.info("Job completed. job_id=%s", job_id)
-        except Exception as exc:
-            error_message = f"{exc} (日志: {get_log_file_path()})"
-            self._update_job(
-                job_id,
-                status="failed",
-                message="转换失败",
-                error=error_message,
-                current_file=None,
+            if dedup is not None:
+                self._run_deferred(dedup.mark_done(input_file))
+
+        # Renames, moves from scratch and duplicate links leave the loop; a move overlaps with the next encode.
+        return commit_pool.submit(commit)
+
+    def _run_deferred(self, actions: list[Callable[[], None]]) -> None:
+        for action in actions:
+            action()
+
+    def _pause_marker(self, job_id: str) -> tuple[float, float | None]:
+        with self._lock:
+            job = self._job_store.peek(job_id)
+            return (0.0, None) if job is None else (job.paused_seconds, job.paused_at)
+
+    def _record_history(
+        self,
+        media: MediaInfo | None,
+        outputs: list[tuple[Rendition, Path]],
+        options: EncodeOptions,
+        threads: int | None,
+        mode: str,
+        encode_seconds: float,
+    ) -> None:
+        if media is None or media.duration is None:
+            return
+        try:
+            output_bytes = sum(path.stat().st_size for _, path in outputs)
+        except OSError:
+            return
+        key = history_key(
+            media.height,
+            [item.height for item, _ in outputs],
+            [item.crf for item, _ in outputs],
+            options.preset,
+            options.speed_profile.tag,
+            threads,
+            mode,
+        )
+        self._history.record(key, media.duration, encode_seconds, output_bytes)
+
+    def _link_duplicate(
+        self,
+        job_id: str,
+        index: int,
+        input_file: Path,
+        original: Path,
+        outputs: list[tuple[Rendition, Path]],
+        source_root: Path,
+        output_dir: Path,
+        options: EncodeOptions,
+        stager: OutputStager,
+        tracker: _JobProgress,
+        manifest: ConversionManifest | None,
+    ) -> None:
+        for rendition, output_file in outputs:
+            existing = self._build_output_path(
+                source_root=source_root,
+                input_file=original,
+                output_dir=output_dir,
+                suffix_text=rendition.suffix_text,
+            )
+            if existing != output_file:
+                stager.link(existing, output_file)
+            if manifest is not None:
+                manifest.record(input_file, output_file, options.manifest_params(rendition))
+
+        completed, progress = tracker.finish(index)
+        self._metrics.count_file("deduplicated")
+        with self._lock:
+            job = self._job_store.peek(job_id)
+            if job is None:
+                return
+            _remember(job.duplicates, str(input_file), str(original))
+            job.deduplicated_files += 1
+            job.processed_files = completed
+            job.total_files = max(job.total_files, tracker.total)
+            job.progress = progress
+            self._touch(job)
+        self._logger.info("Duplicate linked. job_id=%s input=%s original=%s", job_id, input_file, original)
+
+    async def _use_scratch(
+        self,
+        job_id: str,
+        stager: OutputStager,
+        input_file: Path,
+        output_count: int,
+        commit_pool: ThreadPoolExecutor,
+    ) -> int | None:
+        """在暂存目录为本次编码预留空间，返回预留的字节数；空间不足时返回 None，改为就地编码。"""
+        if stager.scratch_dir is None:
+            return None
+        # The source size is a cheap upper bound for a downscaled output.
+        try:
+            needed = input_file.stat().st_size * output_count
+        except OSError:
+            needed = 0
+        if stager.reserve_scratch(needed):
+            return needed
+        # Moves run in order on one thread, so a no-op returns once those in flight have freed their space.
+        await asyncio.wrap_future(commit_pool.submit(lambda: None))
+        if stager.reserve_scratch(needed):
+            return needed
+        self._logger.warning(
+            "Scratch space low, encode in place. job_id=%s input=%s needed=%s scratch=%s",
+            job_id,
+            input_file,
+            needed,
+            stager.scratch_dir,
+        )
+        return None
+
+    def _publish_progress(self, job_id: str, tracker: _JobProgress, **kwargs) -> None:
+        changed, summary, eta = tracker.telemetry()
+        with self._lock:
+            job = self._job_store.peek(job_id)
+            if job is None:
+                return
+            for key, value in kwargs.items():
+                setattr(job, key, value)
+            for name, telemetry in changed.items():
+                _remember(job.file_telemetry, name, telemetry)
+            job.telemetry = summary
+            job.eta_seconds = eta
+            self._touch(job)
+
+    async def _encode_file(
+        self,
+        job_id: str,
+        ffmpeg_path: Path,
+        ffprobe_path: Path,
+        input_file: Path,
+        outputs: list[tuple[Rendition, Path]],
+        media: MediaInfo | None,
+        options: EncodeOptions,
+        copy_plans: list[tuple[bool, bool]],
+        segmented: bool,
+        threads: int | None,
+        on_progress: Callable[[EncodeTelemetry], None],
+    ) -> None:
+        output_file = outputs[0][1]
+        copy_video, copy_audio = copy_plans[0]
+        if len(outputs) > 1:
+            await self._convert_renditions(
+                job_id=job_id,
+                ffmpeg_path=ffmpeg_path,
+                input_file=input_file,
+                outputs=outputs,
+                copy_videos=[plan[0] for plan in copy_plans],
+                copy_audio=copy_audio,
+                options=options,
+                threads=threads,
+                on_progress=on_progress,
+            )
+        elif segmented:
+            await self._convert_segmented(
+                job_id=job_id,
+                ffmpeg_path=ffmpeg_path,
+                ffprobe_path=ffprobe_path,
+                input_file=input_file,
+                output_file=output_file,
+                media=media,
+                options=options,
+                copy_audio=copy_audio,
+                threads=threads,
+                on_progress=on_progress,
+            )
+        else:
+            await self._convert_single_file(
+                job_id=job_id,
+                ffmpeg_path=ffmpeg_path,
+                input_file=input_file,
+                output_file=output_file,
+                height=options.height,
+                crf=options.crf,
+                preset=options.preset,
+                profile=options.speed_profile,
+                audio_bitrate=options.audio_bitrate,
+                copy_video=copy_video,
+                copy_audio=copy_audio,
+                threads=threads,
+                on_progress=on_progress,
+            )
+
+    async def _encode_remote(
+        self,
+        job_id: str,
+        index: int,
+        input_file: Path,
+        outputs: list[tuple[Rendition, Path]],
+        media: MediaInfo | None,
+        options: EncodeOptions,
+        copy_plans: list[tuple[bool, bool]],
+        segmented: bool,
+        stop_event: threading.Event,
+        on_progress: Callable[[EncodeTelemetry], None],
+    ) -> None:
+        # The plan is made here so that every worker encodes a file exactly as a local run would.
+        payload = {
+            "job_id": job_id,
+            "index": index,
+            "input_file": str(input_file),
+            "outputs": [{**rendition.to_dict(), "path": str(path)} for rendition, path in outputs],
+            "media": None if media is None else media.to_dict(),
+            "options": options.to_dict(),
+            "copy_plans": [list(plan) for plan in copy_plans],
+            "segmented": segmented,
+        }
+        item = self._work_queue.submit(job_id, payload, lambda data: on_progress(EncodeTelemetry.from_dict(data)))
+        with self._lock:
+            job = self._job_store.peek(job_id)
+            if job is not None and job.status == "paused":
+                self._work_queue.set_paused(job_id, True)
+        try:
+            while not item.finished.is_set():
+                await asyncio.sleep(WORK_POLL_INTERVAL)
+                if stop_event.is_set():
+                    raise JobCancelledError("任务已停止")
+                self._work_queue.requeue_expired()
+        finally:
+            self._work_queue.forget(item)
+        if item.error is not None:
+            raise RuntimeError(f"工作节点转换失败: {item.error}")
+
+    def _register_process(self, job_id: str, process: EngineProcess) -> None:
+        with self._lock:
+            self._processes.setdefault(job_id, set()).add(process)
+            stop_event = self._stop_events.get(job_id)
+            stopping = stop_event is not None and stop_event.is_set()
+            resume_event = self._resume_events.get(job_id)
+            paused = resume_event is not None and not resume_event.is_set()
+        if stopping:
+            process.kill()
+        elif paused:
+            self._suspend_process(process, suspend=True)
+
+    def _suspend_process(self, process: EngineProcess, suspend: bool) -> None:
+        if not process.running:
+            return
+        try:
+            if os.name == "nt":
+                ntdll = ctypes.WinDLL("ntdll")
+                action = ntdll.NtSuspendProcess if suspend else ntdll.NtResumeProcess
+                action(ctypes.c_void_p(int(process.popen._handle)))
+            else:
+                process.send_signal(signal.SIGSTOP if suspend else signal.SIGCONT)
+        except OSError:
+            self._logger.exception("Suspend/resume ffmpeg failed. pid=%s suspend=%s", process.pid, suspend)
+
+    def _elapsed_seconds(self, data: dict) -> float | None:
+        started_at = data["started_at"]
+        if started_at is None:
+            return None
+        end = data["finished_at"] or data["paused_at"] or time.time()
+        return max(0.0, end - started_at - data["paused_seconds"])
+
+    def _unregister_process(self, job_id: str, process: EngineProcess) -> None:
+        with self._lock:
+            self._processes.get(job_id, set()).discard(process)
+
+    def _kill_processes(self, job_id: str) -> None:
+        with self._lock:
+            processes = list(self._processes.get(job_id, ()))
+        for process in processes:
+            if process.running:
+                self._logger.info("Kill ffmpeg. job_id=%s pid=%s", job_id, process.pid)
+                process.kill()
+
+    def _stop_job(self, job_id: str) -> None:
+        with self._lock:
+            stop_event = self._stop_events.get(job_id)
+            if stop_event is not None:
+                stop_event.set()
+        self._kill_processes(job_id)
+
+    def _is_stopping(self, job_id: str) -> bool:
+        with self._lock:
+            stop_event = self._stop_events.get(job_id)
+            return stop_event is not None and stop_event.is_set()
+
+    def _plan_stream_copy(self, media: MediaInfo | None, options: EncodeOptions) -> tuple[bool, bool]:
+        if not options.stream_copy or media is None:
+            return False, False
+        copy_video = media.video_codec == "h264" and media.height is not None and media.height <= options.height
+        target_audio_bitrate = self._parse_bitrate(options.audio_bitrate)
+        if media.audio_codec is None:
+            copy_audio = True
+        else:
+            copy_audio = (
+                media.audio_codec == "aac"
+                and media.audio_bit_rate is not None
+                and target_audio_bitrate is not None
+                and media.audio_bit_rate <= target_audio_bitrate
             )
-            self._logger.exception("Job failed. job_id=%s error=%s", job_id, exc)
+        return copy_video, copy_audio
+
+    def _plan_file(
+        self,
+        media: MediaInfo | None,
+        options: EncodeOptions,
+        targets: list[Rendition],
+    ) -> tuple[list[tuple[bool, bool]], bool, str]:
+        """返回各输出的流复制计划、是否分段编码，以及记录用的模式名。"""
+        ladder = len(targets) > 1
+        copy_plans = [self._plan_stream_copy(media, replace(options, height=item.height)) for item in targets]
+        copy_video, copy_audio = copy_plans[0]
+        mode = self._stream_mode_name(copy_video, copy_audio)
+        if ladder:
+            mode = "ladder:" + ",".join(self._stream_mode_name(*plan) for plan in copy_plans)
+        segmented = (
+            not ladder
+            and not copy_video
+            and options.segment_seconds > 0
+            and media is not None
+            and media.duration is not None
+            and media.duration >= 2 * options.segment_seconds
+        )
+        if segmented:
+            mode = f"{mode}:segmented"
+        return copy_plans, segmented, mode
+
+    def _stream_mode_name(self, copy_video: bool, copy_audio: bool) -> str:
+        if copy_video and copy_audio:
+            return "copy"
+        if copy_video:
+            return "copy_video"
+        if copy_audio:
+            return "copy_audio"
+        return "encode"
+
+    def _record_stream_mode(self, job_id: str, input_file: Path, mode: str) -> None:
+        with self._lock:
+            job = self._job_store.peek(job_id)
+            if job is None:
+                return
+            _remember(job.stream_modes, str(input_file), mode)
+            job.stream_mode_counts[mode] = job.stream_mode_counts.get(mode, 0) + 1
+            self._touch(job)
+
+    def _parse_bitrate(self, value: str) -> int | None:
+        text = value.strip().lower()
+        multiplier = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+        if multiplier != 1:
+            text = text[:-1]
+        try:
+            bitrate = float(text) * multiplier
+        except ValueError:
+            return None
+        return int(bitrate) if bitrate > 0 else None
+
+    def _raise_first_error(self, futures: set[Future]) -> None:
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            # Siblings killed because of a failure report JobCancelledError; surface the root cause.
+            raise next((exc for exc in errors if not isinstance(exc, JobCancelledError)), errors[0])
+
+    def _threads_per_process(self, concurrency: int) -> int:
+        return self._resources.policy.threads_for(concurrency)
+
+    def _active_encode_count(self) -> int:
+        with self._lock:
+            return sum(1 for processes in self._processes.values() for process in processes if process.running)
+
+    def _touch(self, job: JobState, now: float | None = None) -> None:
+        # Called with self._lock held.
+        job.touch(now)
+        self._change_sequence += 1
+        self._job_changed.notify_all()
 
     def _update_job(self, job_id: str, **kwargs) -> None:
         with self._lock:
-            job = self._jobs.get(job_id)
+            job = self._job_store.peek(job_id)
             if job is None:
                 return
             for key, value in kwargs.items():
                 setattr(job, key, value)
-            job.updated_at = time.time()
+            self._touch(job)
+            if "status" in kwargs:
+                self._job_store.save(job)
 
-    def _collect_source_files(self, source: Path) -> list[Path]:
+    def _iter_source_files(self, source: Path) -> Iterator[Path]:
         if source.is_file():
-            return [source]
-        return sorted(path for path in source.rglob("*") if path.is_file() and path.suffix.lower() in VIDEO_EXTENSIONS)
+            yield source
+            return
+        # Depth-first over per-directory sorted listings yields the same order as sorting all paths,
+        # while only the listings of the current ancestors are held in memory.
+        stack = [self._scan_sorted(source)]
+        while stack:
+            entries = stack[-1]
+            if not entries:
+                stack.pop()
+                continue
+            entry = entries.pop()
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(self._scan_sorted(Path(entry.path)))
+                elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in VIDEO_EXTENSIONS:
+                    yield Path(entry.path)
+            except OSError:
+                self._logger.warning("Skip unreadable entry. path=%s", entry.path)
+
+    def _scan_sorted(self, directory: Path) -> list[os.DirEntry]:
+        # Reversed so that pop() returns entries in name order; DirEntry keeps the type from the listing.
+        try:
+            with os.scandir(directory) as iterator:
+                entries = list(iterator)
+        except OSError:
+            self._logger.warning("Skip unreadable directory. path=%s", directory)
+            return []
+        entries.sort(key=lambda entry: os.path.normcase(entry.name), reverse=True)
+        return entries
 
     def _build_output_path(
         self,
@@ -277,72 +2052,138 @@ class VideoConvertService:
         return output_dir / relative.parent / output_name
 
     def _resolve_tool_path(self, tool_name: str) -> Path | None:
-        candidates: list[Path] = []
-        from_path = shutil.which(tool_name)
-        if from_path:
-            candidates.append(Path(from_path))
-
-        executable_dir = Path(sys.executable).resolve().parent
-        candidates.extend(
-            [
-                executable_dir / f"{tool_name}.exe",
-                Path(sys.prefix) / "Library" / "bin" / f"{tool_name}.exe",
-                Path(sys.prefix) / "Scripts" / f"{tool_name}.exe",
-            ]
-        )
+        return self._tools.resolve(tool_name)
 
-        checked = set()
-        for candidate in candidates:
-            candidate = candidate.resolve()
-            if candidate in checked:
-                continue
-            checked.add(candidate)
-            if not candidate.exists():
-                continue
-            if self._is_tool_usable(candidate):
-                return candidate
-            self._logger.warning("Tool exists but not usable. tool=%s path=%s", tool_name, candidate)
+    def _duration_of(self, media: MediaInfo | None) -> float | None:
+        return None if media is None else media.duration
 
-        self._logger.error("Tool not found or unusable. tool=%s candidates=%s", tool_name, candidates)
-        return None
-
-    def _is_tool_usable(self, executable: Path) -> bool:
+    def _probe_media(self, ffprobe_path: Path, video_file: Path) -> MediaInfo | None:
         try:
-            result = subprocess.run(
-                [str(executable), "-version"],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
-            )
-            return result.returncode == 0
-        except OSError:
-            return False
-        except Exception:
-            self._logger.exception("Tool check failed. executable=%s", executable)
-            return False
+            stat = video_file.stat()
+        except OSError as exc:
+            self._logger.warning("Source unreadable before probe. file=%s error=%s", video_file, exc)
+            return None
+        cached = self._media_cache.get(video_file, stat.st_size, stat.st_mtime_ns)
+        if cached is not None:
+            return cached
 
-    def _probe_duration(self, ffprobe_path: Path, video_file: Path) -> float | None:
         cmd = [
             str(ffprobe_path),
             "-v",
             "error",
             "-show_entries",
-            "format=duration",
+            "format=duration,bit_rate:stream=codec_type,codec_name,width,height,bit_rate",
             "-of",
-            "default=noprint_wrappers=1:nokey=1",
+            "json",
             str(video_file),
         ]
-        result = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8", errors="replace")
+        result = self._run_tool("ffprobe", cmd)
         if result.returncode != 0:
             self._logger.warning("ffprobe failed. file=%s returncode=%s stderr=%s", video_file, result.returncode, result.stderr)
             return None
         try:
-            duration = float(result.stdout.strip())
-            return duration if duration > 0 else None
-        except ValueError:
-            self._logger.warning("ffprobe duration parse failed. file=%s output=%s", video_file, result.stdout)
+            media = self._parse_probe_output(json.loads(result.stdout or "{}"))
+        except (ValueError, TypeError, AttributeError):
+            self._logger.warning("ffprobe output parse failed. file=%s output=%s", video_file, result.stdout)
             return None
 
+        self._media_cache.put(video_file, stat.st_size, stat.st_mtime_ns, media)
+        return media
+
+    def _parse_probe_output(self, data: dict) -> MediaInfo:
+        def to_number(value, cast):
+            try:
+                return cast(value)
+            except (TypeError, ValueError):
+                return None
+
+        streams = data.get("streams") or []
+        video = next((item for item in streams if item.get("codec_type") == "video"), {})
+        audio = next((item for item in streams if item.get("codec_type") == "audio"), {})
+        fmt = data.get("format") or {}
+        duration = to_number(fmt.get("duration"), float)
+        return MediaInfo(
+            duration=duration if duration is not None and duration > 0 else None,
+            format_bit_rate=to_number(fmt.get("bit_rate"), int),
+            video_codec=video.get("codec_name"),
+            width=to_number(video.get("width"), int),
+            height=to_number(video.get("height"), int),
+            video_bit_rate=to_number(video.get("bit_rate"), int),
+            audio_codec=audio.get("codec_name"),
+            audio_bit_rate=to_number(audio.get("bit_rate"), int),
+        )
+
+    def _run_process(
+        self,
+        tool: str,
+        cmd: list[str],
+        on_start: Callable[[EngineProcess], None] | None = None,
+        on_stdout_line: Callable[[bytes], None] | None = None,
+        capture_stdout: bool = False,
+    ) -> ProcessResult:
+        return self._engine.call(self._run_process_async(tool, cmd, on_start, on_stdout_line, capture_stdout))
+
+    async def _run_process_async(
+        self,
+        tool: str,
+        cmd: list[str],
+        on_start: Callable[[EngineProcess], None] | None = None,
+        on_stdout_line: Callable[[bytes], None] | None = None,
+        capture_stdout: bool = False,
+    ) -> ProcessResult:
+        # ffprobe calls are short; only the encoders run at lower priority and on the affinity set.
+        policy = self._resources.policy
+        encoder = tool == "ffmpeg"
+        started = time.perf_counter()
+
+        def on_spawned(process: EngineProcess) -> None:
+            self._metrics.observe_spawn(tool, time.perf_counter() - started)
+            if encoder:
+                policy.apply(process.popen)
+            if on_start is not None:
+                on_start(process)
+
+        return await self._engine.run_async(
+            policy.wrap_command(cmd) if encoder else cmd,
+            on_start=on_spawned,
+            on_stdout_line=on_stdout_line,
+            capture_stdout=capture_stdout,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0) | (policy.creationflags() if encoder else 0),
+        )
+
+    def _trial_runner(self, job_id: str | None) -> Callable[[list[str]], ProcessResult]:
+        """试编码的启动方式：与正式编码一样经过资源策略与启动指标；属于任务时可被取消和暂停。"""
+
+        def run(cmd: list[str]) -> ProcessResult:
+            while True:
+                marker = self._pause_marker(job_id) if job_id is not None else None
+                started: list[EngineProcess] = []
+
+                def on_start(process: EngineProcess) -> None:
+                    started.append(process)
+                    if job_id is not None:
+                        self._register_process(job_id, process)
+
+                try:
+                    result = self._run_process("ffmpeg", cmd, on_start=on_start, capture_stdout=True)
+                finally:
+                    if job_id is not None:
+                        for process in started:
+                            self._unregister_process(job_id, process)
+                if job_id is None or self._is_stopping(job_id) or self._pause_marker(job_id) == marker:
+                    return result
+                # A pause stretches the measured time; the trial runs again once the job is resumed.
+                resume_event = self._resume_events.get(job_id)
+                if resume_event is not None:
+                    resume_event.wait()
+                if self._is_stopping(job_id):
+                    return result
+
+        return run
+
+    def _run_tool(self, tool: str, cmd: list[str]) -> ProcessResult:
+        return self._run_process(tool, cmd, capture_stdout=True)
+
     def _format_exit_code(self, return_code: int) -> str:
         unsigned_code = return_code & 0xFFFFFFFF
         signed_code = unsigned_code if unsigned_code < 0x80000000 else unsigned_code - 0x100000000
@@ -354,7 +2195,7 @@ class VideoConvertService:
             )
         return f"ffmpeg 退出码: {signed_code} (0x{unsigned_code:08X})"
 
-    def _convert_single_file(
+    async def _convert_single_file(
         self,
         job_id: str,
         ffmpeg_path: Path,
@@ -363,69 +2204,329 @@ class VideoConvertService:
         height: int,
         crf: int,
         preset: str,
+        profile: SpeedProfile,
         audio_bitrate: str,
-        on_progress: Callable[[float], None],
+        copy_video: bool,
+        copy_audio: bool,
+        threads: int | None,
+        on_progress: Callable[[EncodeTelemetry], None],
+    ) -> None:
+        cmd = [str(ffmpeg_path), "-y"]
+        if threads is not None:
+            # Scaling runs in its own filter threads, which -threads alone does not bound.
+            cmd.extend(["-filter_threads", str(threads)])
+        cmd.extend(["-i", str(input_file)])
+        if copy_video:
+            cmd.extend(["-c:v", "copy"])
+        else:
+            cmd.extend(
+                [
+                    "-vf",
+                    profile.scale_filter(height),
+                    "-c:v",
+                    "libx264",
+                    "-crf",
+                    str(crf),
+                    "-preset",
+                    preset,
+                    *profile.encoder_args(),
+                ]
+            )
+        if copy_audio:
+            cmd.extend(["-c:a", "copy"])
+        else:
+            cmd.extend(["-c:a", "aac", "-b:a", audio_bitrate])
+        if threads is not None:
+            cmd.extend(["-threads", str(threads)])
+        cmd.extend(PROGRESS_ARGS)
+        cmd.append(str(output_file))
+        await self._run_ffmpeg(job_id, cmd, input_file, output_file, on_progress)
+
+    async def _convert_renditions(
+        self,
+        job_id: str,
+        ffmpeg_path: Path,
+        input_file: Path,
+        outputs: list[tuple[Rendition, Path]],
+        copy_videos: list[bool],
+        copy_audio: bool,
+        options: EncodeOptions,
+        threads: int | None,
+        on_progress: Callable[[EncodeTelemetry], None],
+    ) -> None:
+        # One decode feeds every encoded rendition through a split filter.
+        encoded = [(index, rendition) for index, (rendition, _) in enumerate(outputs) if not copy_videos[index]]
+        profile = options.speed_profile
+        cmd = [str(ffmpeg_path), "-y"]
+        if threads is not None:
+            cmd.extend(["-filter_complex_threads", str(threads)])
+        cmd.extend(["-i", str(input_file)])
+        if len(encoded) == 1:
+            index, rendition = encoded[0]
+            cmd.extend(["-filter_complex", f"[0:v:0]{profile.scale_filter(rendition.height)}[v{index}]"])
+        elif encoded:
+            graph = [f"[0:v:0]split={len(encoded)}" + "".join(f"[s{index}]" for index, _ in encoded)]
+            graph.extend(f"[s{index}]{profile.scale_filter(rendition.height)}[v{index}]" for index, rendition in encoded)
+            cmd.extend(["-filter_complex", ";".join(graph)])
+        cmd.extend(PROGRESS_ARGS)
+
+        for index, (rendition, output_file) in enumerate(outputs):
+            output_file.parent.mkdir(parents=True, exist_ok=True)
+            if copy_videos[index]:
+                cmd.extend(["-map", "0:v:0", "-c:v", "copy"])
+            else:
+                cmd.extend(
+                    [
+                        "-map",
+                        f"[v{index}]",
+                        "-c:v",
+                        "libx264",
+                        "-crf",
+                        str(rendition.crf),
+                        "-preset",
+                        options.preset,
+                        *profile.encoder_args(),
+                    ]
+                )
+            cmd.extend(["-map", "0:a:0?"])
+            if copy_audio:
+                cmd.extend(["-c:a", "copy"])
+            else:
+                cmd.extend(["-c:a", "aac", "-b:a", options.audio_bitrate])
+            if threads is not None:
+                cmd.extend(["-threads", str(threads)])
+            cmd.append(str(output_file))
+        await self._run_ffmpeg(job_id, cmd, input_file, outputs[0][1], on_progress)
+
+    async def _convert_segmented(
+        self,
+        job_id: str,
+        ffmpeg_path: Path,
+        ffprobe_path: Path,
+        input_file: Path,
+        output_file: Path,
+        media: MediaInfo,
+        options: EncodeOptions,
+        copy_audio: bool,
+        threads: int | None,
+        on_progress: Callable[[EncodeTelemetry], None],
     ) -> None:
+        boundaries = await asyncio.to_thread(
+            self._segment_boundaries, ffprobe_path, input_file, media.duration, options.segment_seconds
+        )
+        starts = [0.0, *boundaries]
+        ends: list[float | None] = [*boundaries, None]
+        segment_threads = max(1, (threads or self._resources.policy.core_budget) // options.segment_workers)
+        segment_telemetry = [EncodeTelemetry() for _ in starts]
+        progress_lock = threading.Lock()
+        # Named after the partial, so the stale sweep can tell whether its encode is still running.
+        work_dir = output_file.with_name(f"{output_file.name}.segments")
+        await asyncio.to_thread(work_dir.mkdir, parents=True)
+        self._logger.info(
+            "Segmented encode. job_id=%s input=%s segments=%s boundaries=%s",
+            job_id,
+            input_file,
+            len(starts),
+            boundaries,
+        )
+
+        def segment_progress(index: int) -> Callable[[EncodeTelemetry], None]:
+            length = (ends[index] if ends[index] is not None else media.duration) - starts[index]
+
+            def report(telemetry: EncodeTelemetry) -> None:
+                seconds = length if telemetry.done else min(telemetry.out_seconds, length)
+                with progress_lock:
+                    segment_telemetry[index] = replace(telemetry, out_seconds=seconds)
+                    combined = EncodeTelemetry.combine(segment_telemetry)
+                # The file is done only after the concat step.
+                on_progress(replace(combined, done=False))
+
+            return report
+
+        try:
+            segment_files = [work_dir / f"segment_{index:05d}.mp4" for index in range(len(starts))]
+            audio_file = work_dir / "audio.m4a" if media.audio_codec is not None else None
+
+            # At most segment_workers video segments run at once; the audio encode runs beside them.
+            slots = asyncio.Semaphore(options.segment_workers)
+
+            async def encode_segment(
+                cmd: list[str], segment_file: Path, report: Callable[[EncodeTelemetry], None]
+            ) -> None:
+                async with slots:
+                    await self._run_ffmpeg(job_id, cmd, input_file, segment_file, report)
+
+            tasks: list[asyncio.Task] = []
+            if audio_file is not None:
+                # Audio is encoded in one piece so the joins have no gaps or priming samples.
+                audio_cmd = [str(ffmpeg_path), "-y", "-i", str(input_file), "-map", "0:a:0", "-vn", "-sn"]
+                if copy_audio:
+                    audio_cmd.extend(["-c:a", "copy"])
+                else:
+                    audio_cmd.extend(["-c:a", "aac", "-b:a", options.audio_bitrate])
+                audio_cmd.extend([*PROGRESS_ARGS, str(audio_file)])
+                tasks.append(asyncio.create_task(self._run_ffmpeg(job_id, audio_cmd, input_file, audio_file)))
+
+            for index, segment_file in enumerate(segment_files):
+                cmd = [str(ffmpeg_path), "-y", "-ss", f"{starts[index]:.6f}", "-i", str(input_file)]
+                if ends[index] is not None:
+                    cmd.extend(["-t", f"{ends[index] - starts[index]:.6f}"])
+                cmd.extend(
+                    [
+                        "-map",
+                        "0:v:0",
+                        "-an",
+                        "-sn",
+                        "-vf",
+                        options.speed_profile.scale_filter(options.height),
+                        "-c:v",
+                        "libx264",
+                        "-crf",
+                        str(options.crf),
+                        "-preset",
+                        options.preset,
+                        *options.speed_profile.encoder_args(),
+                        "-threads",
+                        str(segment_threads),
+                        *PROGRESS_ARGS,
+                        str(segment_file),
+                    ]
+                )
+                tasks.append(asyncio.create_task(encode_segment(cmd, segment_file, segment_progress(index))))
+
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            if any(task.exception() is not None for task in done):
+                self._stop_job(job_id)
+                # The others fail fast once their ffmpeg is killed; the work directory goes only after they exit.
+                await asyncio.wait(tasks)
+                self._raise_first_error(done)
+
+            list_file = work_dir / "segments.txt"
+            list_file.write_text(
+                "".join(f"file '{segment_file.name}'\n" for segment_file in segment_files),
+                encoding="utf-8",
+            )
+            concat_cmd = [str(ffmpeg_path), "-y", "-f", "concat", "-safe", "0", "-i", str(list_file)]
+            if audio_file is not None:
+                concat_cmd.extend(["-i", str(audio_file), "-map", "0:v:0", "-map", "1:a:0"])
+            concat_cmd.extend(["-c", "copy", "-movflags", "+faststart", *PROGRESS_ARGS, str(output_file)])
+            await self._run_ffmpeg(job_id, concat_cmd, input_file, output_file)
+        finally:
+            await asyncio.to_thread(shutil.rmtree, work_dir, ignore_errors=True)
+
+    def _segment_boundaries(
+        self,
+        ffprobe_path: Path,
+        input_file: Path,
+        duration: float,
+        segment_seconds: int,
+    ) -> list[float]:
+        """返回各分段的起点，为相对文件起始时间的偏移，可直接用作 -ss。"""
+        # Packet times are absolute, while -ss counts from the container's start time.
+        origin = self._start_time(ffprobe_path, input_file)
+        boundaries: list[float] = []
+        target = float(segment_seconds)
+        while duration - target >= segment_seconds / 2:
+            keyframe = self._find_keyframe_after(ffprobe_path, input_file, origin + target)
+            if keyframe is not None:
+                offset = keyframe - origin
+                if offset < duration and (not boundaries or offset > boundaries[-1]):
+                    boundaries.append(offset)
+            target += segment_seconds
+        return boundaries
+
+    def _start_time(self, ffprobe_path: Path, input_file: Path) -> float:
+        cmd = [str(ffprobe_path), "-v", "error", "-show_entries", "format=start_time", "-of", "csv=p=0", str(input_file)]
+        result = self._run_tool("ffprobe", cmd)
+        try:
+            return float(result.stdout.strip()) if result.returncode == 0 else 0.0
+        except ValueError:
+            # "N/A" when the container has no start time; the packets then start at zero.
+            return 0.0
+
+    def _find_keyframe_after(self, ffprobe_path: Path, input_file: Path, target: float) -> float | None:
         cmd = [
-            str(ffmpeg_path),
-            "-y",
-            "-i",
-            str(input_file),
-            "-vf",
-            f"scale=-2:{height}",
-            "-c:v",
-            "libx264",
-            "-crf",
-            str(crf),
-            "-preset",
-            preset,
-            "-c:a",
-            "aac",
-            "-b:a",
-            audio_bitrate,
-            "-progress",
-            "pipe:1",
-            "-nostats",
-            "-loglevel",
+            str(ffprobe_path),
+            "-v",
             "error",
-            str(output_file),
+            "-select_streams",
+            "v:0",
+            "-read_intervals",
+            f"{target:.3f}%+{KEYFRAME_SEARCH_SECONDS}",
+            "-show_entries",
+            "packet=pts_time,flags",
+            "-of",
+            "csv=p=0",
+            str(input_file),
         ]
+        result = self._run_tool("ffprobe", cmd)
+        if result.returncode != 0:
+            self._logger.warning("Keyframe probe failed. file=%s target=%s stderr=%s", input_file, target, result.stderr)
+            return None
+        keyframes = []
+        for line in result.stdout.splitlines():
+            pts_text, _, flags = line.partition(",")
+            try:
+                pts = float(pts_text)
+            except ValueError:
+                continue
+            if "K" in flags and pts >= target:
+                keyframes.append(pts)
+        return min(keyframes) if keyframes else None
 
+    async def _run_ffmpeg(
+        self,
+        job_id: str,
+        cmd: list[str],
+        input_file: Path,
+        output_file: Path,
+        on_progress: Callable[[EncodeTelemetry], None] | None = None,
+    ) -> None:
         self._logger.info("Run ffmpeg. job_id=%s input=%s output=%s cmd=%s", job_id, input_file, output_file, cmd)
 
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding="utf-8",
-            errors="replace",
-            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
-        )
+        started: list[EngineProcess] = []
+        block: dict[str, str] = {}
+
+        def on_start(process: EngineProcess) -> None:
+            started.append(process)
+            self._register_process(job_id, process)
+
+        def on_line(line: bytes) -> None:
+            nonlocal block
+            key, sep, value = line.strip().partition(b"=")
+            if not sep:
+                return
+            if key != b"progress":
+                block[key.decode("ascii", errors="replace")] = value.decode("utf-8", errors="replace")
+                return
+            # One callback per -progress block instead of one per out_time line.
+            on_progress(EncodeTelemetry.from_progress_block(block, done=value == b"end"))
+            block = {}
 
         try:
-            while True:
-                line = process.stdout.readline() if process.stdout else ""
-                if line == "" and process.poll() is not None:
-                    break
-                if "=" not in line:
-                    continue
-                key, value = line.strip().split("=", 1)
-                if key in {"out_time_ms", "out_time_us"}:
-                    try:
-                        on_progress(float(value) / 1_000_000.0)
-                    except ValueError:
-                        continue
-                elif key == "progress" and value == "end":
-                    on_progress(float("inf"))
+            result = await self._run_process_async(
+                "ffmpeg",
+                cmd,
+                on_start=on_start,
+                on_stdout_line=on_line if on_progress is not None else None,
+            )
         finally:
-            return_code = process.wait()
-            stderr_text = process.stderr.read() if process.stderr else ""
+            for process in started:
+                self._unregister_process(job_id, process)
+        return_code = result.returncode
+        stderr_text = result.stderr
 
+        if return_code != 0 and self._is_stopping(job_id):
+            raise JobCancelledError(f"ffmpeg 已终止: {input_file}")
         if return_code != 0:
             msg = self._format_exit_code(return_code)
             if stderr_text.strip():
-                self._logger.error("ffmpeg failed. job_id=%s stderr=%s", job_id, stderr_text.strip())
+                self._logger.error(
+                    "ffmpeg failed. job_id=%s stderr_dropped_bytes=%s stderr=%s",
+                    job_id,
+                    result.stderr_dropped,
+                    stderr_text.strip(),
+                )
             self._logger.error(
                 "ffmpeg failed. job_id=%s returncode=%s hex=0x%08X input=%s output=%s",
                 job_id,
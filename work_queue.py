@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable
+
+from app_logging import get_logger
+
+DEFAULT_LEASE_SECONDS = 30.0
+DEFAULT_MAX_ATTEMPTS = 3
+WORKER_STALE_SECONDS = 120.0
+
+
+@dataclass
+class WorkItem:
+    item_id: str
+    job_id: str
+    payload: dict
+    on_progress: Callable[[dict], None] | None = field(default=None, repr=False)
+    attempts: int = 0
+    worker_id: str | None = None
+    lease_expires: float | None = None
+    paused: bool = False
+    succeeded: bool = False
+    error: str | None = None
+    finished: threading.Event = field(default_factory=threading.Event, repr=False)
+
+
+@dataclass
+class _Worker:
+    worker_id: str
+    first_seen: float
+    last_seen: float
+    items: set[str] = field(default_factory=set)
+    completed: int = 0
+    failed: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "items": sorted(self.items),
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+class WorkQueue:
+    """分布式模式下的文件级工作队列：工作节点租用条目、定期续租并上报进度。
+
+    租约过期（工作节点失联）的条目重新排到队首，超过最大尝试次数后判定失败。
+    """
+
+    def __init__(
+        self,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ) -> None:
+        self._logger = get_logger("vediozip.work_queue")
+        self._lease_seconds = lease_seconds
+        self._max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._pending: deque[str] = deque()
+        self._items: dict[str, WorkItem] = {}
+        self._workers: dict[str, _Worker] = {}
+
+    @property
+    def lease_seconds(self) -> float:
+        return self._lease_seconds
+
+    def submit(self, job_id: str, payload: dict, on_progress: Callable[[dict], None] | None = None) -> WorkItem:
+        item = WorkItem(item_id=uuid.uuid4().hex, job_id=job_id, payload=payload, on_progress=on_progress)
+        with self._lock:
+            self._items[item.item_id] = item
+            self._pending.append(item.item_id)
+        return item
+
+    def lease(self, worker_id: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            self._touch_worker(worker_id, now)
+            self._requeue_expired(now)
+            for _ in range(len(self._pending)):
+                item = self._items.get(self._pending.popleft())
+                if item is None or item.finished.is_set():
+                    continue
+                if item.paused:
+                    self._pending.append(item.item_id)
+                    continue
+                item.attempts += 1
+                item.worker_id = worker_id
+                item.lease_expires = now + self._lease_seconds
+                self._workers[worker_id].items.add(item.item_id)
+                break
+            else:
+                return None
+        self._logger.info(
+            "Work leased. item_id=%s job_id=%s worker=%s attempt=%s",
+            item.item_id,
+            item.job_id,
+            worker_id,
+            item.attempts,
+        )
+        return {"item_id": item.item_id, "lease_seconds": self._lease_seconds, **item.payload}
+
+    def heartbeat(self, item_id: str, worker_id: str, telemetry: dict | None = None) -> str:
+        """续租并上报进度；返回 run 或 pause。条目已被撤回或改派时抛出 ValueError，工作节点应停止。"""
+        now = time.time()
+        with self._lock:
+            self._touch_worker(worker_id, now)
+            item = self._leased_item(item_id, worker_id)
+            item.lease_expires = now + self._lease_seconds
+            on_progress = item.on_progress
+            state = "pause" if item.paused else "run"
+        if telemetry and on_progress is not None:
+            on_progress(telemetry)
+        return state
+
+    def complete(self, item_id: str, worker_id: str) -> None:
+        with self._lock:
+            item = self._leased_item(item_id, worker_id)
+            self._release(item, worker_id)
+            self._workers[worker_id].completed += 1
+            item.succeeded = True
+            item.finished.set()
+        self._logger.info("Work completed. item_id=%s job_id=%s worker=%s", item_id, item.job_id, worker_id)
+
+    def fail(self, item_id: str, worker_id: str, error: str) -> None:
+        with self._lock:
+            item = self._leased_item(item_id, worker_id)
+            self._release(item, worker_id)
+            self._workers[worker_id].failed += 1
+            retry = item.attempts < self._max_attempts
+            if retry:
+                self._pending.appendleft(item_id)
+            else:
+                item.error = error
+                item.finished.set()
+        self._logger.warning(
+            "Work failed. item_id=%s job_id=%s worker=%s attempt=%s retry=%s error=%s",
+            item_id,
+            item.job_id,
+            worker_id,
+            item.attempts,
+            retry,
+            error,
+        )
+
+    def payload(self, item_id: str, worker_id: str) -> dict:
+        with self._lock:
+            return self._leased_item(item_id, worker_id).payload
+
+    def set_paused(self, job_id: str, paused: bool) -> None:
+        with self._lock:
+            for item in self._items.values():
+                if item.job_id == job_id:
+                    item.paused = paused
+
+    def forget(self, item: WorkItem) -> None:
+        # Withdrawn items make the next heartbeat of their worker fail, which stops the encode.
+        with self._lock:
+            self._items.pop(item.item_id, None)
+            if item.worker_id in self._workers:
+                self._workers[item.worker_id].items.discard(item.item_id)
+
+    def requeue_expired(self) -> None:
+        with self._lock:
+            self._requeue_expired(time.time())
+
+    def workers(self) -> list[dict]:
+        now = time.time()
+        with self._lock:
+            for worker_id in [key for key, worker in self._workers.items() if now - worker.last_seen > WORKER_STALE_SECONDS]:
+                if not self._workers[worker_id].items:
+                    del self._workers[worker_id]
+            return [worker.to_dict() for worker in self._workers.values()]
+
+    def counts(self) -> dict[str, float]:
+        with self._lock:
+            leased = sum(1 for item in self._items.values() if item.lease_expires is not None)
+            return {"pending": len(self._pending), "leased": leased}
+
+    def _leased_item(self, item_id: str, worker_id: str) -> WorkItem:
+        item = self._items.get(item_id)
+        if item is None or item.finished.is_set() or item.worker_id != worker_id or item.lease_expires is None:
+            raise ValueError("租约已失效，条目可能已被重新分配。")
+        return item
+
+    def _release(self, item: WorkItem, worker_id: str) -> None:
+        item.worker_id = None
+        item.lease_expires = None
+        worker = self._workers.get(worker_id)
+        if worker is not None:
+            worker.items.discard(item.item_id)
+
+    def _requeue_expired(self, now: float) -> None:
+        for item in self._items.values():
+            if item.lease_expires is None or item.lease_expires > now or item.finished.is_set():
+                continue
+            worker_id = item.worker_id
+            self._release(item, worker_id)
+            if item.attempts >= self._max_attempts:
+                item.error = f"工作节点失联（已尝试 {item.attempts} 次）"
+                item.finished.set()
+            else:
+                self._pending.appendleft(item.item_id)
+            self._logger.warning(
+                "Work lease expired. item_id=%s job_id=%s worker=%s attempt=%s requeued=%s",
+                item.item_id,
+                item.job_id,
+                worker_id,
+                item.attempts,
+                not item.finished.is_set(),
+            )
+
+    def _touch_worker(self, worker_id: str, now: float) -> None:
+        worker = self._workers.get(worker_id)
+        if worker is None:
+            worker = self._workers[worker_id] = _Worker(worker_id=worker_id, first_seen=now, last_seen=now)
+            self._logger.info("Worker joined. worker=%s", worker_id)
+        worker.last_seen = now